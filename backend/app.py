@@ -4,11 +4,15 @@
 文件管理系统后端主应用
 """
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, g, request
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from datetime import datetime
 import os
+import time
+import uuid
+import logging
+from urllib.parse import urlencode
 from dotenv import load_dotenv
 from database import db, init_db, create_tables
 
@@ -27,20 +31,44 @@ app.config['JWT_ACCESS_TOKEN_EXPIRES'] = int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES
 app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 104857600))
 
-# 配置日志
-import logging
-logging.basicConfig(level=logging.DEBUG)
-app.logger.setLevel(logging.DEBUG)
+# 配置日志（异步写出，见 app_logging.py）
+from app_logging import configure_logging
+configure_logging(app)
+access_logger = logging.getLogger('access')
 
 # 初始化扩展
 jwt = JWTManager(app)
 CORS(app)
 
-# 添加请求日志中间件
+# 请求日志中隐去的凭据参数（EventSource 和下载链接通过 ?token= 传递 JWT，签名链接带 sig）
+REDACTED_PARAMS = ('token', 'sig')
+
+def _loggable_path():
+    """请求路径和查询参数，凭据参数的值替换为 ***"""
+    if not any(name in request.args for name in REDACTED_PARAMS):
+        return request.full_path.rstrip('?')
+    query = urlencode([(name, '***' if name in REDACTED_PARAMS else value)
+                       for name, value in request.args.items(multi=True)], safe='*')
+    return f'{request.path}?{query}'
+
+# 请求日志：记录请求编号，响应后输出状态码和耗时
 @app.before_request
 def log_request_info():
-    from flask import request
-    app.logger.info(f"收到请求: {request.method} {request.url}")
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def log_response_info(response):
+    started = g.get('request_started')
+    if started is not None:
+        access_logger.info('%s %s %s %.1fms', request.method, _loggable_path(),
+                           response.status_code, (time.perf_counter() - started) * 1000)
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+# 请求指标（/metrics）
+import request_metrics
+request_metrics.init_app(app)
 
 # JWT错误处理
 @jwt.expired_token_loader
@@ -57,6 +85,14 @@ def invalid_token_callback(error):
         'error': 'Token无效'
     }), 401
 
+@jwt.revoked_token_loader
+def revoked_token_callback(jwt_header, jwt_payload):
+    import token_revocation
+    return jsonify({
+        'success': False,
+        'error': 'Token已注销' if token_revocation.is_revoked(jwt_payload['jti']) else 'Token已失效'
+    }), 401
+
 @jwt.unauthorized_loader
 def missing_token_callback(error):
     return jsonify({
@@ -64,6 +100,15 @@ def missing_token_callback(error):
         'error': '缺少认证Token'
     }), 401
 
+# 已注销令牌（布隆过滤器，见 token_revocation.py）和修改密码/角色前签发的旧版本令牌
+# （见 identity_cache.py）在这里统一拒绝，所有 @jwt_required() 接口都会检查
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    import token_revocation
+    import identity_cache
+    return token_revocation.is_revoked(jwt_payload['jti']) or \
+        identity_cache.is_outdated(jwt_payload['sub'], jwt_payload)
+
 # 确保上传目录存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
@@ -71,6 +116,10 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 init_db(app)
 create_tables(app)
 
+# SQL 统计、N+1 检测与慢查询日志（在建表之后启用）
+import sql_profiler
+sql_profiler.init_app(app)
+
 # 注册蓝图
 from routes.auth import auth_bp
 from routes.folders import folders_bp
@@ -83,6 +132,7 @@ from routes.chat import chat_bp
 from routes.friend_shares import friend_shares_bp
 from routes.settings import settings_bp
 from routes.shares import shares_bp
+from routes.events import events_bp
 
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(folders_bp, url_prefix='/api/folders')
@@ -95,6 +145,15 @@ app.register_blueprint(chat_bp, url_prefix='/api/chat')
 app.register_blueprint(friend_shares_bp, url_prefix='/api/friend-shares')
 app.register_blueprint(settings_bp, url_prefix='/api/settings')
 app.register_blueprint(shares_bp, url_prefix='/api/shares')
+app.register_blueprint(events_bp, url_prefix='/api/events')
+
+# 实时推送（跨进程传输见 push.py）
+import push
+push.init_app(app)
+
+# 按配置启动磁盘占用后台校对
+import storage
+storage.start_reconciler(app)
 
 # 错误处理
 @app.errorhandler(404)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志管道
+
+请求线程只把日志记录放入队列（QueueHandler），由 QueueListener 的后台线程
+负责格式化和写出，磁盘 I/O 不会阻塞请求：
+- 控制台：便于开发时查看的文本格式
+- 日志文件：每行一条 JSON，按大小轮转（LOG_DIR 为空时不写文件）
+- 内存环形缓冲区：保留最近 LOG_BUFFER_SIZE 条，按级别和模块建立索引，
+  供 /api/system/logs 查询
+"""
+
+import os
+import json
+import copy
+import queue
+import atexit
+import heapq
+import threading
+import logging
+from collections import deque
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# 日志文件目录
+LOG_DIR = os.getenv('LOG_DIR', 'logs')
+# 单个日志文件的最大字节数和保留的轮转文件数
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+# 内存中保留的日志条数
+LOG_BUFFER_SIZE = int(os.getenv('LOG_BUFFER_SIZE', 5000))
+
+TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+
+def record_to_dict(record):
+    """把日志记录转换为可序列化的字典"""
+    entry = {
+        'timestamp': datetime.fromtimestamp(record.created).isoformat(),
+        'level': record.levelname,
+        'module': record.name,
+        'message': record.getMessage()
+    }
+    for field in ('request_id', 'method', 'path'):
+        value = getattr(record, field, None)
+        if value is not None:
+            entry[field] = value
+    if record.exc_text:
+        entry['exception'] = record.exc_text
+    return entry
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出为一行 JSON"""
+
+    def format(self, record):
+        return json.dumps(record_to_dict(record), ensure_ascii=False)
+
+class RequestContextFilter(logging.Filter):
+    """在请求线程中为记录附加请求信息（入队前执行）"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+        return True
+
+class _QueueHandler(QueueHandler):
+    """只在入队前合并消息参数和异常堆栈，格式化留给后台线程"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class RingBufferHandler(logging.Handler):
+    """固定容量的内存日志，按级别和模块索引，支持游标分页"""
+
+    def __init__(self, capacity=LOG_BUFFER_SIZE):
+        super().__init__()
+        self.capacity = capacity
+        self.entries = {}          # 序号 -> 记录，按序号递增
+        self.by_level = {}         # 级别 -> 序号 deque
+        self.by_module = {}        # 模块 -> 序号 deque
+        self.next_id = 1
+        self.buffer_lock = threading.Lock()
+
+    def emit(self, record):
+        entry = record_to_dict(record)
+        entry['created'] = record.created
+        with self.buffer_lock:
+            entry['id'] = self.next_id
+            self.next_id += 1
+            self.entries[entry['id']] = entry
+            self._index(self.by_level, entry['level']).append(entry['id'])
+            self._index(self.by_module, entry['module']).append(entry['id'])
+            while len(self.entries) > self.capacity:
+                self._evict()
+
+    @staticmethod
+    def _index(index, key):
+        if key not in index:
+            index[key] = deque()
+        return index[key]
+
+    def _evict(self):
+        oldest = self.entries.pop(next(iter(self.entries)))
+        for index, key in ((self.by_level, oldest['level']), (self.by_module, oldest['module'])):
+            ids = index[key]
+            ids.popleft()
+            if not ids:
+                del index[key]
+
+    def _candidates(self, levels, module):
+        """按索引返回候选序号（从新到旧）
+
+        只按级别过滤时合并各级别的序号；指定模块时合并匹配模块的序号，
+        再在遍历时检查级别。
+        """
+        if module:
+            prefix = module + '.'
+            lists = [ids for name, ids in self.by_module.items() if name == module or name.startswith(prefix)]
+        else:
+            lists = [self.by_level[level] for level in levels if level in self.by_level]
+        merged = heapq.merge(*(reversed(ids) for ids in lists), reverse=True)
+        if module and levels:
+            return (entry_id for entry_id in merged if self.entries[entry_id]['level'] in levels)
+        return merged
+
+    def query(self, levels=None, module=None, start=None, end=None, before=None, limit=100):
+        """返回 (从新到旧的记录列表, 下一页游标)
+
+        levels 为级别列表，module 匹配模块名及其子模块，start/end 为时间戳，
+        before 为上一页返回的游标。
+        """
+        with self.buffer_lock:
+            if levels or module:
+                candidates = self._candidates(levels, module)
+            else:
+                candidates = reversed(list(self.entries))
+            results = []
+            for entry_id in candidates:
+                if before is not None and entry_id >= before:
+                    continue
+                entry = self.entries[entry_id]
+                if end is not None and entry['created'] > end:
+                    continue
+                if start is not None and entry['created'] < start:
+                    break
+                results.append(entry)
+                if len(results) > limit:
+                    break
+
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            next_cursor = results[-1]['id']
+        return [{key: value for key, value in entry.items() if key != 'created'} for entry in results], next_cursor
+
+ring_buffer = RingBufferHandler()
+_listener = None
+
+def configure_logging(app):
+    """把根日志器接到异步队列上，并启动后台写出线程"""
+    global _listener
+    if _listener is not None:
+        return ring_buffer
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handlers = [console, ring_buffer]
+    if LOG_DIR:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        file_handler = RotatingFileHandler(os.path.join(LOG_DIR, 'app.log'), maxBytes=LOG_MAX_BYTES,
+                                           backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    # Flask 自带的处理器会同步写 stderr，改为交给根日志器
+    from flask.logging import default_handler
+    app.logger.removeHandler(default_handler)
+    app.logger.setLevel(logging.NOTSET)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return ring_buffer
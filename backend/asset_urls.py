@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+签名资源链接
+
+图片网格中的每个缩略图原本都要带 ?token=<JWT> 请求，服务端先尝试请求头认证失败，
+再解码一次 JWT 并查询用户。文件列表改为直接返回签名链接：
+
+    /api/files/<id>/thumbnail?exp=<过期时间戳>&t=<用户ID.令牌版本.令牌JTI>&sig=<签名>
+
+签名是对「路径 + 过期时间 + 签发时的令牌」做 HMAC-SHA256，只对该路径有效。
+校验时按 t 取回签发链接的用户：令牌已注销（退出登录）或版本号已过期（修改密码/角色）
+时链接随之失效，接口仍只返回该用户自己的文件；用户身份和注销检查都走内存缓存。
+过期时间按 ASSET_URL_BUCKET 秒向上取整，同一时间段内多次列出文件得到的链接相同，
+浏览器可以按链接缓存（响应带 Cache-Control: private, max-age=<剩余有效期>）。
+
+只有文件列表、详情和搜索这些只返回自己文件的接口会签发链接（File.to_dict(signed_urls=True)），
+好友分享、聊天消息等嵌套的文件信息不带签名链接。
+
+密钥默认由 JWT_SECRET_KEY 派生，也可以通过 ASSET_URL_SECRET 单独设置；
+更换密钥会让已发出的链接全部失效。
+"""
+
+import os
+import hmac
+import time
+import base64
+import hashlib
+from flask import current_app, g, has_request_context
+
+# 链接有效期（秒）
+TTL = int(os.getenv('ASSET_URL_TTL', 3600))
+# 过期时间的取整粒度（秒），同一时间段内签出的链接相同
+BUCKET = int(os.getenv('ASSET_URL_BUCKET', 600))
+SECRET = os.getenv('ASSET_URL_SECRET', '')
+
+# 配置中的密钥 -> 派生出的签名密钥
+_keys = {}
+
+def _key():
+    secret = SECRET or current_app.config['JWT_SECRET_KEY']
+    key = _keys.get(secret)
+    if key is None:
+        key = _keys[secret] = hmac.new(secret.encode('utf-8'), b'asset-urls', hashlib.sha256).digest()
+    return key
+
+def _signature(path, expires, grant):
+    digest = hmac.new(_key(), f'{path}\n{expires}\n{grant}'.encode('utf-8'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode('ascii')
+
+def sign(path, now=None):
+    """返回带签名的链接
+
+    链接绑定到当前请求的令牌（jwt_required_with_user 记录在 g.jwt_claims 中）；
+    不在请求中或请求未经认证时返回原路径，由接口按 JWT 认证。
+    """
+    claims = g.get('jwt_claims') if has_request_context() else None
+    if not claims:
+        return path
+    grant = f"{claims['sub']}.{claims.get('ver', 0)}.{claims['jti']}"
+    now = int(now if now is not None else time.time())
+    expires = -(-(now + TTL) // BUCKET) * BUCKET
+    return f'{path}?exp={expires}&t={grant}&sig={_signature(path, expires, grant)}'
+
+def verify(path, args, now=None):
+    """校验链接签名
+
+    返回 (剩余有效秒数, 签发时的令牌声明 {'sub', 'ver', 'jti'})；签名无效或已过期时返回 None。
+    令牌是否已注销、版本号是否过期由调用方检查。
+    """
+    try:
+        expires = int(args.get('exp', ''))
+        user_id, version, jti = args.get('t', '').split('.')
+        version = int(version)
+    except ValueError:
+        return None
+    remaining = expires - int(now if now is not None else time.time())
+    if remaining <= 0:
+        return None
+    if not hmac.compare_digest(_signature(path, expires, args.get('t', '')), args.get('sig', '')):
+        return None
+    return remaining, {'sub': user_id, 'ver': version, 'jti': jti}
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+活动统计回填脚本
+根据现有 files / folders 数据重新生成 activity_rollups 汇总表
+
+用法: python backfill_rollups.py [用户ID]
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db
+import rollups
+
+def backfill_rollups(user_id=None):
+    """重建活动统计汇总"""
+    with app.app_context():
+        try:
+            db.create_all()
+            target = f"用户 {user_id}" if user_id else "全部用户"
+            print(f"正在重建{target}的活动统计...")
+            count = rollups.rebuild_rollups(user_id)
+            print(f"✓ 写入 {count} 个时间桶")
+            print("\n活动统计回填完成！")
+            return True
+        except Exception as e:
+            print(f"回填失败: {str(e)}")
+            db.session.rollback()
+            return False
+
+if __name__ == '__main__':
+    backfill_rollups(sys.argv[1] if len(sys.argv) > 1 else None)
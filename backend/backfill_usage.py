@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户用量回填脚本
+根据现有 files / folders 数据重新生成 user_usage 物化表，
+也可定期运行以校正增量更新可能产生的偏差
+
+用法: python backfill_usage.py [用户ID]
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db
+import usage
+
+def backfill_usage(user_id=None):
+    """重建用户用量"""
+    with app.app_context():
+        try:
+            db.create_all()
+            target = f"用户 {user_id}" if user_id else "全部用户"
+            print(f"正在重建{target}的存储用量...")
+            count = usage.rebuild_usage(user_id)
+            print(f"✓ 写入 {count} 个用户")
+            print("\n用户用量回填完成！")
+            return True
+        except Exception as e:
+            print(f"回填失败: {str(e)}")
+            db.session.rollback()
+            return False
+
+if __name__ == '__main__':
+    backfill_usage(sys.argv[1] if len(sys.argv) > 1 else None)
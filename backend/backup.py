@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库与上传文件备份
+
+每次备份生成一个还原点：
+- 数据库通过 SQLite 在线备份 API 按页分批复制，每批之间释放锁，
+  备份期间写入只会被短暂阻塞
+- 上传文件按内容的 SHA-256 存入 blobs/ 目录，同一内容只保存一份；
+  还原点的 manifest.json 记录每个路径对应的哈希。大小和修改时间与上一个
+  还原点一致的文件直接沿用上次的哈希，不再读取内容
+
+目录结构（BACKUP_DIR）：
+    blobs/<哈希前两位>/<哈希>
+    points/<还原点>/database.db, manifest.json
+    archives/<还原点>.tar       # target='tar' 时生成，包含数据库、清单和全部文件
+
+超过 BACKUP_RETENTION 个的旧还原点会被删除，随后清理不再被引用的 blob。
+备份和清理持有 BACKUP_DIR/.lock 文件锁，定时任务和后台接口（包括多个工作进程）同时只运行一个。
+复制和哈希按 BACKUP_MAX_BYTES_PER_SEC 限速，避免影响在线请求。
+"""
+
+import os
+import io
+import json
+import time
+import shutil
+import sqlite3
+import tarfile
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+try:
+    import fcntl
+except ImportError:  # Windows 上只在进程内互斥
+    fcntl = None
+from models import db, MaintenanceJob
+import jobs
+
+JOB_TYPE = 'backup'
+TARGETS = ('dir', 'tar')
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+# 保留的还原点数量
+RETENTION = int(os.getenv('BACKUP_RETENTION', 30))
+# 读写限速（字节/秒），0 表示不限速
+MAX_BYTES_PER_SEC = int(os.getenv('BACKUP_MAX_BYTES_PER_SEC', 20 * 1024 * 1024))
+# SQLite 在线备份每批复制的页数及批间停顿（秒）
+DB_PAGES_PER_STEP = 256
+DB_STEP_SLEEP = 0.01
+CHUNK_SIZE = 1024 * 1024
+
+# 同时只运行一个备份，避免清理 blob 时误删另一个备份刚复制、尚未写入清单的文件；
+# 线程锁负责进程内，BACKUP_DIR 下的文件锁负责进程之间（定时任务与各工作进程）
+_backup_lock = threading.Lock()
+LOCK_FILE = '.lock'
+
+class Throttle:
+    """按字节数限速"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.consumed = 0
+
+    def consume(self, size):
+        if self.rate <= 0:
+            return
+        self.consumed += size
+        ahead = self.consumed / self.rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+def _points_dir():
+    return os.path.join(BACKUP_DIR, 'points')
+
+def _blob_path(digest):
+    return os.path.join(BACKUP_DIR, 'blobs', digest[:2], digest)
+
+def _archive_path(name):
+    return os.path.join(BACKUP_DIR, 'archives', name + '.tar')
+
+def _database_path():
+    """返回 SQLite 数据库文件路径，其它数据库返回 None"""
+    url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        return None
+    return url.database
+
+def snapshot_database(dest):
+    """用 SQLite 在线备份 API 把数据库复制到 dest"""
+    source_path = _database_path()
+    if source_path is None:
+        raise RuntimeError('仅支持 SQLite 数据库的在线备份')
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(dest)
+    try:
+        # 分批复制页，批间休眠让出写锁
+        source.backup(target, pages=DB_PAGES_PER_STEP, sleep=DB_STEP_SLEEP)
+    finally:
+        target.close()
+        source.close()
+
+def _blob_paths(database):
+    """从数据库快照中读取需要备份的文件路径（含缩略图）"""
+    conn = sqlite3.connect(database)
+    try:
+        paths = []
+        for path, thumbnail_path in conn.execute('SELECT path, thumbnail_path FROM files'):
+            paths.append(os.path.normpath(path))
+            if thumbnail_path:
+                paths.append(os.path.normpath(os.path.join(os.path.dirname(path), thumbnail_path)))
+        return paths
+    finally:
+        conn.close()
+
+def _hash_file(path, throttle):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            throttle.consume(len(chunk))
+    return digest.hexdigest()
+
+def _copy_file(src, dst, throttle):
+    """限速复制，先写临时文件再重命名，避免留下不完整的 blob"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    partial = dst + '.partial'
+    with open(src, 'rb') as reader, open(partial, 'wb') as writer:
+        while True:
+            chunk = reader.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+            throttle.consume(len(chunk))
+    os.replace(partial, dst)
+
+def list_restore_points():
+    """按时间倒序列出还原点"""
+    points = []
+    if not os.path.isdir(_points_dir()):
+        return points
+    for name in sorted(os.listdir(_points_dir()), reverse=True):
+        manifest_path = os.path.join(_points_dir(), name, 'manifest.json')
+        if name.startswith('.') or not os.path.exists(manifest_path):
+            continue
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        archive = _archive_path(name)
+        points.append({
+            'name': name,
+            'createdAt': manifest['createdAt'],
+            'files': len(manifest['blobs']),
+            'size': sum(entry['size'] for entry in manifest['blobs'].values()),
+            'databaseSize': manifest.get('databaseSize', 0),
+            'archive': archive if os.path.exists(archive) else None
+        })
+    return points
+
+def _load_manifest(name):
+    with open(os.path.join(_points_dir(), name, 'manifest.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_archive(name, point_dir, manifest, throttle):
+    """把还原点打包为单个 tar 文件，文件按原路径存放"""
+    path = _archive_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + '.partial'
+    with tarfile.open(partial, 'w') as tar:
+        tar.add(os.path.join(point_dir, 'database.db'), arcname='database.db')
+        data = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+        info = tarfile.TarInfo('manifest.json')
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+        for blob_path, entry in manifest['blobs'].items():
+            tar.add(_blob_path(entry['sha256']), arcname=os.path.join('files', blob_path))
+            throttle.consume(entry['size'])
+    os.replace(partial, path)
+    return path
+
+@contextmanager
+def _exclusive():
+    """独占备份目录，已有备份或清理在进行时抛出 RuntimeError"""
+    if not _backup_lock.acquire(blocking=False):
+        raise RuntimeError('已有备份正在进行')
+    try:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        with open(os.path.join(BACKUP_DIR, LOCK_FILE), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise RuntimeError('已有备份正在进行')
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    finally:
+        _backup_lock.release()
+
+def apply_retention(keep=None):
+    """只保留最近 keep 个还原点，并删除不再被引用的 blob，返回删除的还原点数"""
+    with _exclusive():
+        return _apply_retention(keep)
+
+def _apply_retention(keep):
+    keep = RETENTION if keep is None else keep
+    points = [point['name'] for point in list_restore_points()]
+    expired = points[keep:] if keep > 0 else []
+    for name in expired:
+        shutil.rmtree(os.path.join(_points_dir(), name), ignore_errors=True)
+        if os.path.exists(_archive_path(name)):
+            os.remove(_archive_path(name))
+
+    if expired:
+        referenced = set()
+        for name in points[:keep]:
+            referenced.update(entry['sha256'] for entry in _load_manifest(name)['blobs'].values())
+        blobs_root = os.path.join(BACKUP_DIR, 'blobs')
+        for prefix in os.listdir(blobs_root) if os.path.isdir(blobs_root) else []:
+            with os.scandir(os.path.join(blobs_root, prefix)) as entries:
+                for entry in entries:
+                    if entry.name not in referenced:
+                        os.remove(entry.path)
+    return len(expired)
+
+def create_restore_point(target='dir', progress=None):
+    """创建还原点，返回备份报告
+
+    progress(done, total) 在每个文件处理后回调，用于更新任务进度。
+    """
+    with _exclusive():
+        return _create_restore_point(target, progress)
+
+def _create_restore_point(target, progress):
+    throttle = Throttle(MAX_BYTES_PER_SEC)
+    name = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    point_dir = os.path.join(_points_dir(), name)
+    # 写入过程中使用隐藏目录，完成后再改名，列表中不会出现不完整的还原点
+    work_dir = os.path.join(_points_dir(), '.' + name)
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        database = os.path.join(work_dir, 'database.db')
+        snapshot_database(database)
+
+        previous = list_restore_points()
+        previous_blobs = _load_manifest(previous[0]['name'])['blobs'] if previous else {}
+
+        paths = _blob_paths(database)
+        blobs = {}
+        missing = []
+        copied = copied_bytes = reused = 0
+        for done, path in enumerate(paths, 1):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                missing.append(path)
+                continue
+
+            entry = previous_blobs.get(path)
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                digest = entry['sha256']
+                reused += 1
+            else:
+                digest = _hash_file(path, throttle)
+
+            if not os.path.exists(_blob_path(digest)):
+                _copy_file(path, _blob_path(digest), throttle)
+                copied += 1
+                copied_bytes += stat.st_size
+            blobs[path] = {'sha256': digest, 'size': stat.st_size, 'mtime': stat.st_mtime}
+            if progress:
+                progress(done, len(paths))
+
+        manifest = {
+            'createdAt': datetime.now().isoformat(),
+            'database': 'database.db',
+            'databaseSize': os.path.getsize(database),
+            'blobs': blobs
+        }
+        with open(os.path.join(work_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(work_dir, point_dir)
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    archive = _write_archive(name, point_dir, manifest, throttle) if target == 'tar' else None
+    removed = _apply_retention(None)
+    return {
+        'restorePoint': name,
+        'target': target,
+        'archive': archive,
+        'files': len(blobs),
+        'copiedFiles': copied,
+        'copiedBytes': copied_bytes,
+        'reusedHashes': reused,
+        'missingFiles': missing[:100],
+        'databaseSize': manifest['databaseSize'],
+        'expiredRestorePoints': removed
+    }
+
+def create_job(target='dir', created_by=None):
+    """创建备份任务"""
+    job = MaintenanceJob(job_type=JOB_TYPE, options={'target': target if target in TARGETS else 'dir'},
+                         created_by=created_by)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def run_job(job_id):
+    """执行备份任务"""
+    job = db.session.get(MaintenanceJob, job_id)
+    if job is None:
+        return None
+    last_update = [0.0]
+
+    def progress(done, total):
+        # 每秒最多提交一次进度
+        now = time.monotonic()
+        if now - last_update[0] >= 1 or done == total:
+            last_update[0] = now
+            job.total = total
+            job.processed = done
+            db.session.commit()
+
+    try:
+        job.status = 'running'
+        db.session.commit()
+        job.report = create_restore_point(job.options['target'], progress)
+        job.total = job.processed = job.report['files']
+        job.status = 'completed'
+        job.finished_at = datetime.now()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(MaintenanceJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = datetime.now()
+        db.session.commit()
+    return job
+
+def prepare_resume(job):
+    """把中断或失败的备份任务恢复为待执行（重新生成一个还原点），任务正在本进程运行或已完成时返回 False"""
+    if jobs.is_running(job.id) or job.status == 'completed':
+        return False
+    job.status = 'pending'
+    job.error = None
+    job.report = None
+    job.finished_at = None
+    db.session.commit()
+    return True
+
+def start_job(app, job_id):
+    """在后台线程中执行备份"""
+    return jobs.start(app, job_id, run_job)
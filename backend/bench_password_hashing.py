@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+登录吞吐与并发下载延迟基准
+
+在临时目录中启动多线程的开发服务器，先测量空闲时的下载延迟，再让若干线程持续登录，
+同时测量下载延迟，输出每秒成功登录数、503 次数和下载延迟分位数。
+对比密码哈希在请求线程中计算和交给进程池的效果：
+
+    PASSWORD_HASH_WORKERS=0 python bench_password_hashing.py
+    python bench_password_hashing.py
+
+用法: python bench_password_hashing.py [--logins 并发登录线程数] [--seconds 持续秒数]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+
+# 必须在导入 app 之前切换到临时数据库和上传目录
+WORK_DIR = tempfile.mkdtemp(prefix='fm_bench_hashing_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORK_DIR, 'bench.db')
+os.environ['UPLOAD_FOLDER'] = os.path.join(WORK_DIR, 'uploads')
+os.environ['LOG_DIR'] = ''
+os.environ['METRICS_DIR'] = ''
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+os.chdir(WORK_DIR)
+
+from werkzeug.serving import make_server
+from flask_jwt_extended import create_access_token
+from app import app
+import password_hashing
+logging.disable(logging.WARNING)
+from models import db, User, Folder, File
+
+PASSWORD = 'bench-password'
+DOWNLOAD_SIZE = 256 * 1024
+
+def seed():
+    """创建登录用户和一个待下载的文件，返回 (访问令牌, 文件ID)"""
+    user = User(username='bench', email='bench@example.com', user_code='BENCH001',
+                password_hash=password_hashing.hash_password(PASSWORD))
+    db.session.add(user)
+    db.session.flush()
+    folder = Folder(name='bench', user_id=user.id, is_parent=False)
+    db.session.add(folder)
+    db.session.flush()
+
+    path = os.path.join(WORK_DIR, 'download.bin')
+    with open(path, 'wb') as f:
+        f.write(os.urandom(DOWNLOAD_SIZE))
+    file = File(name='download.bin', original_name='download.bin', filename='download.bin',
+                size=DOWNLOAD_SIZE, type='other', mime_type='application/octet-stream',
+                folder_id=folder.id, user_id=user.id, path=path)
+    db.session.add(file)
+    db.session.commit()
+    return create_access_token(identity=user.id), file.id
+
+def request(url, data=None, headers=None):
+    """发送请求，返回 (状态码, 耗时秒)"""
+    body = json.dumps(data).encode('utf-8') if data is not None else None
+    req = urllib.request.Request(url, data=body, headers=dict(headers or {}, **{'Content-Type': 'application/json'}))
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - started
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def measure_downloads(url, token, stop, latencies):
+    while not stop.is_set():
+        status, elapsed = request(url, headers={'Authorization': f'Bearer {token}'})
+        if status == 200:
+            latencies.append(elapsed)
+
+def hammer_logins(url, stop, results):
+    while not stop.is_set():
+        status, _ = request(url, {'email': 'bench@example.com', 'password': PASSWORD})
+        results.append(status)
+        if status == 503:
+            time.sleep(0.05)
+
+def run(base, token, file_id, logins, seconds):
+    download_url = f'{base}/api/files/{file_id}/download'
+    stop = threading.Event()
+    latencies, results = [], []
+    threads = [threading.Thread(target=measure_downloads, args=(download_url, token, stop, latencies))]
+    threads += [threading.Thread(target=hammer_logins, args=(f'{base}/api/auth/login', stop, results))
+                for _ in range(logins)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, results
+
+def report(title, latencies, results, seconds):
+    line = (f'{title}: 下载 {len(latencies)} 次，p50 {percentile(latencies, 50) * 1000:.1f}ms，'
+            f'p95 {percentile(latencies, 95) * 1000:.1f}ms，p99 {percentile(latencies, 99) * 1000:.1f}ms')
+    if results:
+        ok = results.count(200)
+        line += f'；登录成功 {ok / seconds:.1f} 次/秒，503 {results.count(503)} 次'
+    print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='登录吞吐与并发下载延迟基准')
+    parser.add_argument('--logins', type=int, default=16, help='并发登录线程数')
+    parser.add_argument('--seconds', type=float, default=10, help='每轮持续秒数')
+    args = parser.parse_args()
+
+    with app.app_context():
+        token, file_id = seed()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    print(f'密码哈希: {password_hashing.METHOD}，进程池 {password_hashing.WORKERS} 个进程'
+          f'（0 表示在请求线程中计算），排队上限 {password_hashing.QUEUE_SIZE}')
+    try:
+        latencies, _ = run(base, token, file_id, 0, args.seconds)
+        report('空闲时', latencies, [], args.seconds)
+        latencies, results = run(base, token, file_id, args.logins, args.seconds)
+        report(f'{args.logins} 个线程持续登录时', latencies, results, args.seconds)
+    finally:
+        server.shutdown()
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
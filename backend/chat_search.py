@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天记录全文搜索
+
+SQLite FTS5 虚拟表 chat_messages_fts 为每条消息保存一行：消息正文、所附文件的文件名和消息ID
+（不参与索引的列），搜索时按消息ID关联回消息表并限定到当前用户（或某个会话）。
+chat_messages 的主键是字符串，隐式 rowid 在 VACUUM 时可能改变，因此不用 rowid 关联。
+使用 trigram 分词器，中文和英文都按子串匹配；结果按 bm25 相关度排序，命中片段用 <mark> 标出。
+
+发送消息时在同一事务内写入索引，文件重命名时由 on_flush 钩子同步文件名。
+新数据库随 chat_messages 表一起建立索引表，已有数据库需运行 migrate_chat_search.py（之后重启服务），
+按旧结构（以 rowid 关联）建立的索引表也由该脚本重建。
+搜索词不足 3 个字符（trigram 无法匹配）或数据库不支持 FTS5 时，退化为在该用户的消息中做 LIKE 匹配，
+按时间倒序返回。
+"""
+
+import base64
+import html
+import json
+from datetime import datetime
+from sqlalchemy import and_, column, func, literal_column, or_, select, table, text, tuple_
+from hooks import on_flush
+from models import db, ChatMessage, File
+
+TABLE = 'chat_messages_fts'
+# trigram 分词器只能匹配不少于 3 个字符的词
+MIN_TERM_LENGTH = 3
+
+_fts = table(TABLE, column('content'), column('file_name'), column('message_id'))
+# 片段标记：先用控制字符标出命中位置，转义 HTML 之后再替换为 <mark>
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+# 进程内缓存索引表是否存在（None 表示尚未检查）
+_available = None
+
+def create_index(conn):
+    """建立 FTS5 索引表"""
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(content, file_name, message_id UNINDEXED, tokenize='trigram')"
+    ))
+
+def available(conn):
+    """索引表是否可用（非 SQLite 数据库或尚未迁移时为 False）"""
+    global _available
+    if _available is None:
+        _available = conn.dialect.name == 'sqlite' and conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': TABLE}
+        ).first() is not None
+    return _available
+
+def index_message(conn, message_id):
+    """把已 flush 的消息（及所附文件的文件名）写入索引"""
+    if not available(conn):
+        return
+    conn.execute(text(
+        f"INSERT INTO {TABLE} (content, file_name, message_id) "
+        "SELECT chat_messages.content, COALESCE(files.name, ''), chat_messages.id "
+        "FROM chat_messages LEFT JOIN files ON files.id = chat_messages.file_id "
+        "WHERE chat_messages.id = :message_id"
+    ), {'message_id': message_id})
+
+def rebuild(conn):
+    """根据 chat_messages 重建整个索引（连同索引表结构），返回索引的消息数"""
+    conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    create_index(conn)
+    return conn.execute(text(
+        f"INSERT INTO {TABLE} (content, file_name, message_id) "
+        "SELECT chat_messages.content, COALESCE(files.name, ''), chat_messages.id "
+        "FROM chat_messages LEFT JOIN files ON files.id = chat_messages.file_id"
+    )).rowcount
+
+@on_flush
+def _sync_file_names(session, changes):
+    """文件重命名后更新引用该文件的消息的索引"""
+    renamed = [change for change in changes
+               if change.kind == 'file' and change.action == 'update' and 'name' in change.changed]
+    if not renamed:
+        return
+    conn = session.connection()
+    if not available(conn):
+        return
+    for change in renamed:
+        # message_id 不参与索引，更新时需扫描索引表，先排除没有被消息引用的文件
+        message_ids = conn.execute(
+            select(ChatMessage.id).where(ChatMessage.file_id == change.id)
+        ).scalars().all()
+        if not message_ids:
+            continue
+        conn.execute(
+            _fts.update().where(_fts.c.message_id.in_(message_ids)).values(file_name=change.data['name'])
+        )
+
+def encode_cursor(key, message_id):
+    return base64.urlsafe_b64encode(json.dumps([key, message_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    """解析游标，无效时抛出 ValueError"""
+    try:
+        key, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if isinstance(key, str):
+            datetime.fromisoformat(key)
+    except Exception:
+        raise ValueError('游标无效')
+    return key, message_id
+
+def render_highlight(value):
+    """转义 HTML 并把命中标记替换为 <mark>，没有命中时返回 None"""
+    if not value or _MARK_START not in value:
+        return None
+    return html.escape(value).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+def _mark_terms(value, terms):
+    """在 Python 中标出命中的词（LIKE 退化路径使用），不区分大小写"""
+    if not value:
+        return value
+    lower = value.lower()
+    marked = [False] * len(value)
+    for term in terms:
+        start = lower.find(term)
+        while start != -1:
+            for i in range(start, start + len(term)):
+                marked[i] = True
+            start = lower.find(term, start + 1)
+    result = []
+    for i, char in enumerate(value):
+        if marked[i] and (i == 0 or not marked[i - 1]):
+            result.append(_MARK_START)
+        result.append(char)
+        if marked[i] and (i == len(value) - 1 or not marked[i + 1]):
+            result.append(_MARK_END)
+    return ''.join(result)
+
+def _scope(user_id, friend_id):
+    """限定为用户参与的消息，指定好友时只限该会话"""
+    if friend_id:
+        return or_(
+            and_(ChatMessage.sender_id == user_id, ChatMessage.receiver_id == friend_id),
+            and_(ChatMessage.sender_id == friend_id, ChatMessage.receiver_id == user_id)
+        )
+    return or_(ChatMessage.sender_id == user_id, ChatMessage.receiver_id == user_id)
+
+def search(user_id, query, friend_id=None, limit=20, cursor=None):
+    """搜索用户的聊天记录
+
+    返回 (结果列表, 下一页游标)，结果为 (消息, 相关度, 正文片段, 文件名片段)；
+    片段中的命中位置用控制字符标出，由 render_highlight 转为 HTML。游标无效时抛出 ValueError。
+    """
+    terms = [term.lower() for term in (query or '').split()]
+    if not terms:
+        return [], None
+    after = decode_cursor(cursor) if cursor else None
+    conn = db.session.connection()
+
+    if available(conn) and all(len(term) >= MIN_TERM_LENGTH for term in terms):
+        rows = _search_fts(user_id, terms, friend_id, limit + 1, after)
+        next_key = lambda row: row[1]
+    else:
+        rows = _search_like(user_id, terms, friend_id, limit + 1, after)
+        next_key = lambda row: row[0].created_at.isoformat()
+
+    next_cursor = encode_cursor(next_key(rows[limit - 1]), rows[limit - 1][0].id) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def _search_fts(user_id, terms, friend_id, limit, after):
+    """FTS5 路径：按 bm25 升序（越小越相关），同分按消息ID排序"""
+    # 每个词作为一个短语，双引号转义，多个词之间为 AND
+    match = ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+    score = func.bm25(literal_column(TABLE))
+    statement = select(
+        ChatMessage,
+        score,
+        func.highlight(literal_column(TABLE), 0, _MARK_START, _MARK_END),
+        func.highlight(literal_column(TABLE), 1, _MARK_START, _MARK_END)
+    ).select_from(_fts).join(
+        ChatMessage, ChatMessage.id == _fts.c.message_id
+    ).where(
+        literal_column(TABLE).op('MATCH')(match),
+        _scope(user_id, friend_id)
+    )
+    if after is not None:
+        statement = statement.where(tuple_(score, ChatMessage.id) > tuple_(*after))
+    return db.session.execute(statement.order_by(score, ChatMessage.id).limit(limit)).all()
+
+def _search_like(user_id, terms, friend_id, limit, after):
+    """LIKE 路径：正文或文件名包含全部词，按时间倒序"""
+    def contains(expression, term):
+        escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return expression.ilike(f'%{escaped}%', escape='\\')
+
+    statement = select(ChatMessage, File.name).outerjoin(File, File.id == ChatMessage.file_id).where(
+        _scope(user_id, friend_id),
+        *[or_(contains(ChatMessage.content, term), contains(File.name, term)) for term in terms]
+    )
+    if after is not None:
+        key, message_id = after
+        statement = statement.where(
+            tuple_(ChatMessage.created_at, ChatMessage.id) < tuple_(datetime.fromisoformat(key), message_id)
+        )
+    rows = db.session.execute(
+        statement.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit)
+    ).all()
+    return [(message, None, _mark_terms(message.content, terms), _mark_terms(file_name, terms))
+            for message, file_name in rows]
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询计划回归检查
+
+在临时数据库中写入一批种子数据，依次调用各个接口并记录其执行的 SQL，
+对每条语句执行 EXPLAIN QUERY PLAN。只要有语句对业务表做了全表扫描
+（且不在白名单内），或者接口执行的语句数超过其上限（通常意味着新增了
+N+1 查询），脚本即以非零状态退出，可直接接入 CI。
+同样的检查也可以通过 pytest 运行（test_query_plans.py，每个接口一个用例）。
+
+用法: python check_query_plans.py [-v]
+"""
+
+import os
+import re
+import logging
+import sys
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+# 必须在导入 app 之前切换到临时数据库和上传目录
+WORK_DIR = tempfile.mkdtemp(prefix='fm_query_plans_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORK_DIR, 'query_plans.db')
+os.environ['UPLOAD_FOLDER'] = os.path.join(WORK_DIR, 'uploads')
+os.environ['LOG_DIR'] = ''
+os.environ['METRICS_DIR'] = ''
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+os.chdir(WORK_DIR)
+
+from flask_jwt_extended import create_access_token
+from app import app
+import sql_profiler
+import token_revocation
+import identity_cache
+import conversation_state
+import chat_search
+logging.disable(logging.INFO)
+from models import (db, User, Folder, File, TrashItem, Friendship, ChatMessage,
+                    PublicShare, FriendFileShare)
+
+USERS = 4
+FOLDERS_PER_USER = 30
+FILES_PER_FOLDER = 10
+MESSAGES_PER_PAIR = 40
+
+# 扫描 EXPLAIN QUERY PLAN 输出中的全表扫描，例如 "SCAN files" / "SCAN TABLE files"
+_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+def seed():
+    """写入种子数据，返回 (普通用户, 管理员, 若干对象 ID)"""
+    now = datetime.now()
+    users = []
+    for i in range(USERS):
+        user = User(username=f'plan_user_{i}', email=f'plan_user_{i}@example.com',
+                    password_hash='x', user_code=f'PLAN{i:04d}')
+        db.session.add(user)
+        users.append(user)
+    db.session.flush()
+
+    ids = {}
+    for u, user in enumerate(users):
+        root = Folder(name='root', user_id=user.id, is_parent=True)
+        db.session.add(root)
+        db.session.flush()
+        for f in range(FOLDERS_PER_USER):
+            folder = Folder(name=f'folder_{f}', user_id=user.id, parent_id=root.id,
+                            created_at=now - timedelta(days=f))
+            db.session.add(folder)
+            db.session.flush()
+            for n in range(FILES_PER_FOLDER):
+                stored = f'{user.id}_{f}_{n}.txt'
+                file = File(name=f'report_{f}_{n}.txt', original_name=f'report_{f}_{n}.txt',
+                            filename=stored, size=1024 * (n + 1), type='text', mime_type='text/plain',
+                            folder_id=folder.id, user_id=user.id,
+                            path=os.path.join('uploads', user.id, stored),
+                            uploaded_at=now - timedelta(hours=f * FILES_PER_FOLDER + n))
+                db.session.add(file)
+            db.session.add(TrashItem(item_type='file', item_id=f'gone_{f}', name=f'gone_{f}.txt',
+                                     original_path=f'/root/gone_{f}.txt', user_id=user.id))
+        db.session.flush()
+        if u == 0:
+            ids['folder_id'] = folder.id
+            ids['parent_folder_id'] = root.id
+            ids['file_id'] = file.id
+    db.session.flush()
+
+    for a in range(USERS):
+        for b in range(a + 1, USERS):
+            db.session.add(Friendship(user_id=users[a].id, friend_id=users[b].id, status='accepted'))
+            for m in range(MESSAGES_PER_PAIR):
+                sender, receiver = (users[a], users[b]) if m % 2 else (users[b], users[a])
+                db.session.add(ChatMessage(sender_id=sender.id, receiver_id=receiver.id,
+                                           content=f'message {m}', is_read=m < MESSAGES_PER_PAIR // 2,
+                                           created_at=now - timedelta(minutes=MESSAGES_PER_PAIR - m)))
+
+    files = File.query.filter_by(user_id=users[0].id).limit(5).all()
+    for i, file in enumerate(files):
+        share = PublicShare(file_id=file.id, user_id=users[0].id, token=f'plan-token-{i}')
+        db.session.add(share)
+        db.session.add(FriendFileShare(file_id=file.id, sender_id=users[0].id,
+                                       receiver_id=users[1].id, status='pending'))
+    db.session.commit()
+    conversation_state.backfill(db.session.connection())
+    chat_search.rebuild(db.session.connection())
+    db.session.commit()
+
+    ids['share_token'] = 'plan-token-0'
+    ids['friend_id'] = users[1].id
+    ids['message_id'] = ChatMessage.query.filter_by(sender_id=users[1].id, receiver_id=users[0].id).order_by(
+        ChatMessage.created_at).first().id
+    admin = User.query.filter_by(role='admin').first()
+    return users[0], admin, ids
+
+def endpoints(ids):
+    """待检查的接口：(名称, 方法, URL, 请求体, 是否管理员, 允许全表扫描的表, 语句数上限)
+
+    语句数上限按当前实现和种子数据设定，用于发现新增的 N+1 查询；
+    优化接口后应同步调低。
+    """
+    return [
+        ('列出文件', 'GET', f"/api/files?folderId={ids['folder_id']}", None, False, (), 3),
+        ('文件详情', 'GET', f"/api/files/{ids['file_id']}", None, False, (), 3),
+        ('搜索文件', 'GET', '/api/files/search?query=report&sortBy=name', None, False, (), 4),
+        ('按标签搜索', 'GET', '/api/files/search?tags=work', None, False, (), 3),
+        ('标签云', 'GET', '/api/files/tags', None, False, (), 2),
+        # 重命名同时更新引用该文件的聊天消息的全文索引
+        ('重命名文件', 'PUT', f"/api/files/{ids['file_id']}/rename", {'name': 'renamed.txt'}, False, (), 9),
+        ('文件夹列表', 'GET', '/api/folders', None, False, (), 2),
+        ('文件夹详情', 'GET', f"/api/folders/{ids['parent_folder_id']}", None, False, (), 3),
+        ('创建文件夹', 'POST', '/api/folders', {'name': 'new_folder', 'parentId': ids['parent_folder_id']}, False, (), 8),
+        ('统计', 'GET', '/api/statistics', None, False, (), 11),
+        ('存储', 'GET', '/api/statistics/storage', None, False, (), 1),
+        ('类型分布', 'GET', '/api/statistics/file-types', None, False, (), 1),
+        ('上传趋势', 'GET', '/api/statistics/upload-trend', None, False, (), 1),
+        ('最近文件', 'GET', '/api/statistics/recent-files', None, False, (), 2),
+        ('热门类型', 'GET', '/api/statistics/popular-types', None, False, (), 1),
+        ('文件夹统计', 'GET', '/api/statistics/folder-stats', None, False, (), 1),
+        ('活动统计', 'GET', '/api/statistics/activity', None, False, (), 1),
+        ('统计摘要', 'GET', '/api/statistics/summary', None, False, (), 1),
+        ('统计面板', 'GET', '/api/statistics/dashboard?days=7', None, False, (), 11),
+        ('回收站', 'GET', '/api/trash/', None, False, (), 1),
+        ('好友列表', 'GET', '/api/friends', None, False, (), 5),
+        ('好友请求', 'GET', '/api/friends/requests', None, False, (), 3),
+        ('会话列表', 'GET', '/api/chat/conversations', None, False, (), 2),
+        ('会话列表（旧格式）', 'GET', '/api/chat/conversations?format=full', None, False, (), 2),
+        # 消息引用的用户和文件由两条 IN 查询加载，与消息条数无关
+        # 游标分页：两个方向各一次索引范围扫描，不需要 COUNT
+        ('聊天记录', 'GET', f"/api/chat/messages/{ids['friend_id']}", None, False, (), 5),
+        ('聊天记录（旧格式）', 'GET', f"/api/chat/messages/{ids['friend_id']}?format=full", None, False, (), 5),
+        ('聊天记录（更早）', 'GET', f"/api/chat/messages/{ids['friend_id']}?before={ids['message_id']}", None, False, (), 6),
+        ('聊天记录（新消息）', 'GET', f"/api/chat/messages/{ids['friend_id']}?after={ids['message_id']}", None, False, (), 6),
+        ('聊天记录（页码）', 'GET', f"/api/chat/messages/{ids['friend_id']}?page=2", None, False, (), 6),
+        ('未读数', 'GET', '/api/chat/unread-count', None, False, (), 1),
+        # 全文搜索从 FTS5 索引出发按消息ID回表；不足 3 个字符的词退化为 LIKE，只扫描该用户的消息
+        ('搜索聊天记录', 'GET', '/api/chat/search?q=message', None, False, (), 3),
+        ('搜索会话', 'GET', f"/api/chat/search?q=message&friendId={ids['friend_id']}", None, False, (), 3),
+        ('搜索聊天记录（短词）', 'GET', '/api/chat/search?q=me', None, False, (), 3),
+        # 发送消息同时累加接收者的未读数并写入全文索引
+        ('发送消息', 'POST', '/api/chat/send', {'receiverId': ids['friend_id'], 'content': 'hi'}, False, (), 8),
+        ('我的分享', 'GET', '/api/shares', None, False, (), 13),
+        ('文件分享', 'GET', f"/api/shares/file/{ids['file_id']}", None, False, (), 4),
+        ('公开分享', 'GET', f"/api/shares/{ids['share_token']}", None, False, (), 9),
+        ('发出的好友分享', 'GET', '/api/friend-shares/sent', None, False, (), 14),
+        # 管理员统计按用户遍历用量表，与文件数无关
+        ('系统统计', 'GET', '/api/system/stats?sortBy=fileCount&page=1', None, True, ('users', 'user_usage'), 4),
+    ]
+
+def _count_statements(statements):
+    counts = {}
+    for statement, _, _ in statements:
+        entry = counts.setdefault(sql_profiler.fingerprint(statement), [0, 0.0])
+        entry[0] += 1
+    return counts
+
+def explain(conn, statement, parameters):
+    """返回语句中被全表扫描的业务表"""
+    tables = set(db.metadata.tables)
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    scanned = []
+    for row in rows:
+        match = _SCAN_RE.match(row[-1])
+        if match and match.group(1) in tables:
+            scanned.append((match.group(1), row[-1]))
+    return scanned
+
+def prepare():
+    """写入种子数据并预热进程内缓存，返回 (测试客户端, {是否管理员: 令牌}, 对象 ID)"""
+    with app.app_context():
+        # 不执行 ANALYZE：规划器按大表的默认估计选择计划，才能反映生产环境的情况
+        user, admin, ids = seed()
+        tokens = {
+            False: create_access_token(identity=user.id),
+            True: create_access_token(identity=admin.id),
+        }
+        # 注销令牌的布隆过滤器每个进程只全量构建一次（周期性重建），不计入接口的语句数
+        token_revocation.sync()
+        # 令牌版本号在 token_in_blocklist_loader 中检查，身份缓存命中后不再查询（TTL 内）
+        identity_cache.get(user.id)
+        identity_cache.get(admin.id)
+    return app.test_client(), tokens, ids
+
+def engine():
+    with app.app_context():
+        return db.engine
+
+def call(client, tokens, method, url, body, as_admin):
+    return client.open(url, method=method, json=body,
+                       headers={'Authorization': f'Bearer {tokens[as_admin]}'})
+
+def full_scans(statements, allowed=()):
+    """对捕获的语句执行 EXPLAIN QUERY PLAN，返回不在白名单内的全表扫描 [(计划, 语句)]"""
+    scans = []
+    with app.app_context():
+        with db.engine.connect() as conn:
+            for statement, parameters, executemany in statements:
+                if executemany or not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'WITH')):
+                    continue
+                for table, detail in explain(conn, statement, parameters):
+                    if table not in allowed and (detail, statement) not in scans:
+                        scans.append((detail, statement))
+    return scans
+
+def cleanup():
+    """释放数据库连接并删除临时目录"""
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    os.chdir(BACKEND_DIR)
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+def main():
+    verbose = '-v' in sys.argv
+    failures = []
+    client, tokens, ids = prepare()
+    bind = engine()
+
+    for name, method, url, body, as_admin, allowed, budget in endpoints(ids):
+        with sql_profiler.capture(bind) as statements:
+            response = call(client, tokens, method, url, body, as_admin)
+        if response.status_code >= 500:
+            failures.append(f'{name} {method} {url}: HTTP {response.status_code}')
+            continue
+
+        repeated = sql_profiler.repeated_statements(_count_statements(statements))
+        if len(statements) > budget:
+            detail = f'，重复执行 {repeated[0][1]} 次: {repeated[0][0][:200]}' if repeated else ''
+            failures.append(f'{name} {method} {url}: 执行 {len(statements)} 条语句，超过上限 {budget}{detail}')
+        for detail, statement in full_scans(statements, allowed):
+            failures.append(f'{name} {method} {url}: {detail}\n    {" ".join(statement.split())}')
+        if verbose:
+            print(f'{name}: {len(statements)} 条语句' + (f'，重复语句 {[count for _, count in repeated]}' if repeated else ''))
+
+    cleanup()
+
+    if failures:
+        print(f'发现 {len(failures)} 处问题（全表扫描或语句数超限）:')
+        for failure in failures:
+            print('  ✗ ' + failure)
+        return 1
+    print('✓ 所有接口查询均命中索引')
+    print('✓ 所有接口语句数均在上限内')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
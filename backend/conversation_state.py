@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话已读状态
+
+每个用户在与每个好友的会话中有一行 conversation_states：
+- last_read_at / last_read_message_id：已读水位，对方在此之前发来的消息都视为已读
+- unread_count：水位之后收到的消息数，发送消息时在同一事务内加一（消息在水位之前的不计）
+
+打开会话只需把水位推进到当前时间并按水位重新统计未读数（一行 upsert），不再逐条更新消息；
+未读总数是该用户各会话未读数之和。已有数据库需运行 migrate_conversation_states.py
+根据 chat_messages.is_read 生成初始状态。
+"""
+
+from datetime import datetime
+from sqlalchemy import and_, case, func, or_, select
+from database import upsert
+from models import db, ChatMessage, ConversationState
+
+# 回填时每条语句写入的行数（SQLite 单条语句的参数个数有上限）
+BACKFILL_BATCH = 1000
+
+def record_message(conn, sender_id, receiver_id, created_at):
+    """新消息：接收者在该会话中的未读数加一
+
+    消息提交前接收者可能已把水位推进到 created_at 之后，这时消息已按水位视为已读，不再计数。
+    """
+    upsert(conn, ConversationState.__table__, [{
+        'user_id': receiver_id, 'peer_id': sender_id, 'unread_count': 1
+    }], ['user_id', 'peer_id'], lambda old, new: {'unread_count': old.unread_count + case(
+        (or_(old.last_read_at.is_(None), old.last_read_at < created_at), 1), else_=0
+    )})
+
+def mark_read(conn, user_id, peer_id, message_id=None, read_at=None):
+    """把水位推进到 read_at（默认当前时间），未读数重新统计为水位之后对方发来的消息数
+
+    未读数在同一条语句中统计，read_at 之后已提交的消息不会被清零。
+    """
+    read_at = read_at or datetime.now()
+    unread = select(func.count()).select_from(ChatMessage.__table__).where(
+        ChatMessage.sender_id == peer_id,
+        ChatMessage.receiver_id == user_id,
+        ChatMessage.created_at > read_at
+    ).scalar_subquery()
+    upsert(conn, ConversationState.__table__, [{
+        'user_id': user_id, 'peer_id': peer_id, 'last_read_at': read_at,
+        'last_read_message_id': message_id, 'unread_count': unread
+    }], ['user_id', 'peer_id'], lambda old, new: {
+        'last_read_at': new.last_read_at,
+        'last_read_message_id': func.coalesce(new.last_read_message_id, old.last_read_message_id),
+        'unread_count': new.unread_count
+    })
+
+def mark_read_until(conn, message):
+    """把接收者的水位推进到指定消息（不会后退），并重新统计水位之后的未读数"""
+    state = db.session.get(ConversationState, (message.receiver_id, message.sender_id))
+    if state is not None and state.last_read_at is not None and state.last_read_at >= message.created_at:
+        return
+    unread = conn.execute(select(func.count()).select_from(ChatMessage.__table__).where(
+        ChatMessage.sender_id == message.sender_id,
+        ChatMessage.receiver_id == message.receiver_id,
+        ChatMessage.created_at > message.created_at
+    )).scalar()
+    upsert(conn, ConversationState.__table__, [{
+        'user_id': message.receiver_id, 'peer_id': message.sender_id, 'last_read_at': message.created_at,
+        'last_read_message_id': message.id, 'unread_count': unread
+    }], ['user_id', 'peer_id'], lambda old, new: {
+        'last_read_at': new.last_read_at,
+        'last_read_message_id': new.last_read_message_id,
+        'unread_count': new.unread_count
+    })
+
+def read_watermarks(user_id, peer_id):
+    """返回会话双方的已读水位 {接收者ID: last_read_at}"""
+    rows = db.session.execute(select(ConversationState.user_id, ConversationState.last_read_at).where(or_(
+        and_(ConversationState.user_id == user_id, ConversationState.peer_id == peer_id),
+        and_(ConversationState.user_id == peer_id, ConversationState.peer_id == user_id)
+    ))).all()
+    return {receiver_id: last_read_at for receiver_id, last_read_at in rows}
+
+def total_unread(user_id):
+    return db.session.execute(
+        select(func.coalesce(func.sum(ConversationState.unread_count), 0))
+        .where(ConversationState.user_id == user_id)
+    ).scalar()
+
+def backfill(conn):
+    """根据 chat_messages.is_read 生成（覆盖）所有会话的状态"""
+    messages = ChatMessage.__table__
+    rows = [{
+        'user_id': receiver_id, 'peer_id': sender_id, 'last_read_at': last_read_at,
+        'last_read_message_id': None, 'unread_count': unread or 0
+    } for receiver_id, sender_id, last_read_at, unread in conn.execute(select(
+        messages.c.receiver_id,
+        messages.c.sender_id,
+        func.max(case((messages.c.is_read == True, messages.c.created_at))),
+        func.sum(case((messages.c.is_read == False, 1), else_=0))
+    ).group_by(messages.c.receiver_id, messages.c.sender_id))]
+    for start in range(0, len(rows), BACKFILL_BATCH):
+        upsert(conn, ConversationState.__table__, rows[start:start + BACKFILL_BATCH], ['user_id', 'peer_id'],
+               lambda old, new: {'last_read_at': new.last_read_at, 'unread_count': new.unread_count})
+    return len(rows)
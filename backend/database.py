@@ -4,11 +4,44 @@
 数据库配置和初始化
 """
 
+from types import SimpleNamespace
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, literal
+from sqlalchemy.sql import ClauseElement
+from sqlalchemy.dialects import sqlite, postgresql
 
 # 创建SQLAlchemy实例
 db = SQLAlchemy()
 
+def upsert(conn, table, rows, index_elements, merge):
+    """批量插入，键冲突时改为更新
+
+    merge(old, new) 返回需要更新的列及其表达式，old 为表中已有的列，
+    new 为待插入的行，两者都可以像列一样参与运算。行中的值也可以是 SQL 表达式（如标量子查询）。
+    """
+    if not rows:
+        return
+    dialects = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+    insert = dialects.get(conn.dialect.name)
+    if insert:
+        stmt = insert(table).values(rows)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_=merge(table.c, stmt.excluded)
+        ))
+        return
+
+    # 其它数据库：先更新，不存在再插入
+    for row in rows:
+        new = SimpleNamespace(**{
+            name: value if isinstance(value, ClauseElement) else literal(value, table.c[name].type)
+            for name, value in row.items()
+        })
+        key = and_(*(table.c[name] == row[name] for name in index_elements))
+        result = conn.execute(table.update().where(key).values(**merge(table.c, new)))
+        if result.rowcount == 0:
+            conn.execute(table.insert().values(**row))
+
 def init_db(app):
     """初始化数据库"""
     db.init_app(app)
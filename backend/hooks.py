@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型变更钩子
+
+在 flush 时收集 File / Folder 的新增、修改和删除，提交成功后统一回调。
+各个子系统（搜索索引、统计缓存等）通过 on_flush / on_commit 注册处理函数，
+路由代码无需逐个调用。
+"""
+
+from collections import namedtuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+import logging
+
+logger = logging.getLogger(__name__)
+
+# action: 'insert' / 'update' / 'delete'
+# kind: 'file' / 'folder'
+# data: 变更时刻的字段快照；changed: 本次被修改的字段名集合
+Change = namedtuple('Change', ['action', 'kind', 'id', 'user_id', 'data', 'changed'])
+
+_TRACKED_FIELDS = {
+    'file': ('name', 'folder_id', 'size', 'type', 'filename', 'uploaded_at'),
+    'folder': ('name', 'parent_id', 'is_parent', 'created_at'),
+}
+
+_flush_handlers = []
+_commit_handlers = []
+
+def on_flush(func):
+    """注册在同一事务内执行的处理函数 func(session, changes)"""
+    _flush_handlers.append(func)
+    return func
+
+def on_commit(func):
+    """注册在事务提交成功后执行的处理函数 func(changes)"""
+    _commit_handlers.append(func)
+    return func
+
+def _kind_of(obj):
+    """返回受跟踪模型的类型名，其它模型返回 None"""
+    table = getattr(obj, '__tablename__', None)
+    if table == 'files':
+        return 'file'
+    if table == 'folders':
+        return 'folder'
+    return None
+
+def _snapshot(obj, kind):
+    """记录对象当前字段值"""
+    return {field: getattr(obj, field, None) for field in _TRACKED_FIELDS[kind]}
+
+def _changed_fields(obj, kind):
+    """返回本次 flush 中真正发生变化的字段"""
+    state = inspect(obj)
+    return {
+        field for field in _TRACKED_FIELDS[kind]
+        if state.attrs[field].history.has_changes()
+    }
+
+def _previous_values(obj, changed):
+    """返回被修改字段在修改前的值"""
+    state = inspect(obj)
+    previous = {}
+    for field in changed:
+        deleted = state.attrs[field].history.deleted
+        previous[field] = deleted[0] if deleted else None
+    return previous
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    """收集本次 flush 的变更，并执行事务内处理函数"""
+    changes = []
+    for action, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            kind = _kind_of(obj)
+            if not kind:
+                continue
+            data = _snapshot(obj, kind)
+            changed = set()
+            if action == 'update':
+                changed = _changed_fields(obj, kind)
+                if not changed:
+                    continue
+                data['previous'] = _previous_values(obj, changed)
+            changes.append(Change(action, kind, obj.id, obj.user_id, data, changed))
+
+    if not changes:
+        return
+
+    session.info.setdefault('tracked_changes', []).extend(changes)
+    for handler in _flush_handlers:
+        handler(session, changes)
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_changes(session):
+    """事务提交后分发变更"""
+    changes = session.info.pop('tracked_changes', None)
+    if not changes:
+        return
+    for handler in _commit_handlers:
+        try:
+            handler(changes)
+        except Exception as e:
+            logger.exception("变更回调执行失败: %s", e)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    """事务回滚后丢弃已收集的变更"""
+    session.info.pop('tracked_changes', None)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+主机性能采样
+
+后台线程每隔 METRICS_INTERVAL 秒采集一次 CPU、内存、磁盘、网络和本进程的
+资源使用情况，保存在固定长度的环形缓冲区中。健康检查和性能接口直接返回
+最近一次采样，不再在请求线程里阻塞等待 CPU 使用率。
+
+采样线程在首次读取时按进程启动，多进程部署时每个工作进程各自采样。
+"""
+
+import os
+import time
+import threading
+from collections import deque
+import psutil
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 采样间隔（秒）
+SAMPLE_INTERVAL = float(os.getenv('METRICS_INTERVAL', 5))
+# 环形缓冲区保留的采样数，默认保留一小时
+HISTORY_SIZE = int(os.getenv('METRICS_HISTORY', 720))
+# 磁盘使用率统计的路径
+DISK_PATH = '.'
+
+_samples = deque(maxlen=HISTORY_SIZE)
+_lock = threading.Lock()
+_sampler_pid = None
+_process = psutil.Process()
+
+def _take_sample(previous=None):
+    """采集一次主机和进程指标"""
+    now = time.time()
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage(DISK_PATH)
+    network = psutil.net_io_counters()
+
+    # 与上一次采样比较得到网络速率
+    sent_rate = recv_rate = 0.0
+    if previous:
+        elapsed = now - previous['timestamp']
+        if elapsed > 0:
+            sent_rate = max(network.bytes_sent - previous['network']['bytes_sent'], 0) / elapsed
+            recv_rate = max(network.bytes_recv - previous['network']['bytes_recv'], 0) / elapsed
+
+    with _process.oneshot():
+        process = {
+            'pid': _process.pid,
+            'cpu_percent': _process.cpu_percent(interval=None),
+            'memory_rss': _process.memory_info().rss,
+            'threads': _process.num_threads(),
+            'open_files': _process.num_fds() if hasattr(_process, 'num_fds') else None
+        }
+
+    return {
+        'timestamp': now,
+        'cpu': {
+            # interval=None 返回距上次调用以来的使用率，不阻塞
+            'usage': psutil.cpu_percent(interval=None),
+            'cores': psutil.cpu_count()
+        },
+        'memory': {
+            'total': memory.total,
+            'available': memory.available,
+            'used': memory.used,
+            'percent': memory.percent
+        },
+        'disk': {
+            'total': disk.total,
+            'used': disk.used,
+            'free': disk.free,
+            'percent': (disk.used / disk.total) * 100 if disk.total else 0
+        },
+        'network': {
+            'bytes_sent': network.bytes_sent,
+            'bytes_recv': network.bytes_recv,
+            'packets_sent': network.packets_sent,
+            'packets_recv': network.packets_recv,
+            'sent_per_sec': round(sent_rate, 2),
+            'recv_per_sec': round(recv_rate, 2)
+        },
+        'process': process
+    }
+
+def _sample_loop():
+    while True:
+        time.sleep(SAMPLE_INTERVAL)
+        try:
+            with _lock:
+                previous = _samples[-1] if _samples else None
+            sample = _take_sample(previous)
+            with _lock:
+                _samples.append(sample)
+        except Exception as e:
+            logger.exception("性能采样失败: %s", e)
+
+def ensure_started():
+    """当前进程中尚未启动采样线程时启动（fork 后的子进程需要重新启动）"""
+    global _sampler_pid, _process
+    pid = os.getpid()
+    if _sampler_pid == pid:
+        return
+    with _lock:
+        if _sampler_pid == pid:
+            return
+        _samples.clear()
+        _process = psutil.Process()
+        # 第一次调用只用于建立基准，之后的调用才返回有意义的使用率，
+        # 稍等片刻后立即采集第一条，保证接口总能读到数据
+        psutil.cpu_percent(interval=None)
+        _process.cpu_percent(interval=None)
+        time.sleep(0.1)
+        _samples.append(_take_sample())
+        _sampler_pid = pid
+    threading.Thread(target=_sample_loop, daemon=True).start()
+
+def latest():
+    """返回最近一次采样"""
+    ensure_started()
+    with _lock:
+        return _samples[-1]
+
+def history(window=None, step=1):
+    """返回最近 window 秒内的采样，step 大于 1 时每隔 step 个取一个"""
+    ensure_started()
+    with _lock:
+        samples = list(_samples)
+    if window:
+        since = time.time() - window
+        samples = [sample for sample in samples if sample['timestamp'] >= since]
+    if step > 1:
+        # 保证最新的采样一定在结果中
+        samples = samples[::-1][::step][::-1]
+    return samples
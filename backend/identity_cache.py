@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+认证用户缓存
+
+jwt_required_with_user / admin_required 每个请求都要根据令牌中的用户ID取得用户，
+这里把用户的身份信息（ID、用户名、角色、用户代码等）缓存在进程内存中：
+- 最多 IDENTITY_CACHE_SIZE 个用户，按最近使用淘汰；每项 IDENTITY_CACHE_TTL 秒后过期
+- 本进程提交对 users 表的修改后立即失效；其它工作进程最迟在 TTL 后读到新值
+
+签发的令牌带有 role 和 ver（令牌版本号）两个声明。修改密码或角色时在同一事务内
+递增 user_token_versions 中的版本号，版本号小于当前值的令牌会被拒绝
+（在 token_in_blocklist_loader 中统一检查，对所有 @jwt_required() 接口生效）。
+设置 JWT_TRUST_CLAIMS=1 后直接信任令牌中的角色，只用到ID和角色的接口不再加载用户，
+只按主键读取令牌版本号并同样缓存 TTL 秒；其它字段在第一次读取时才加载。
+本进程中修改密码或角色后立即失效，其它工作进程最迟在 TTL 后拒绝旧令牌。
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from database import upsert
+from models import db, User, UserTokenVersion
+
+# 缓存有效期（秒）和最大用户数
+TTL = float(os.getenv('IDENTITY_CACHE_TTL', 60))
+MAX_ENTRIES = int(os.getenv('IDENTITY_CACHE_SIZE', 10000))
+# 是否直接信任令牌中的角色声明
+TRUST_CLAIMS = os.getenv('JWT_TRUST_CLAIMS', '').lower() in ('1', 'true', 'yes')
+
+# 修改后需要让旧令牌失效的字段
+_REVOKING_FIELDS = ('password_hash', 'role')
+
+_lock = threading.Lock()
+# 用户ID -> (过期时间, Identity)
+_cache = OrderedDict()
+# 用户ID -> (过期时间, 令牌版本号)，JWT_TRUST_CLAIMS 模式下身份未缓存时使用
+_versions = OrderedDict()
+
+class Identity:
+    """用户身份快照，路由通过它读取当前用户的ID、角色等信息"""
+
+    __slots__ = ('id', 'username', 'email', 'role', 'user_code', 'avatar', 'token_version')
+
+    def __init__(self, user, token_version):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.role = user.role
+        self.user_code = user.user_code
+        self.avatar = user.avatar
+        self.token_version = token_version
+
+class TokenUser:
+    """直接由令牌声明构造的用户，访问ID和角色以外的字段时才加载身份信息"""
+
+    def __init__(self, user_id, claims):
+        self.id = user_id
+        self.role = claims['role']
+        self.token_version = claims['ver']
+        self._identity = None
+
+    def __getattr__(self, name):
+        if self._identity is None:
+            self._identity = get(self.id)
+        if self._identity is None:
+            raise AttributeError(name)
+        return getattr(self._identity, name)
+
+def token_version(user_id):
+    row = db.session.get(UserTokenVersion, user_id)
+    return row.version if row else 0
+
+def token_claims(user):
+    """签发令牌时附加的声明"""
+    return {'role': user.role, 'ver': token_version(user.id)}
+
+def bump_token_versions(conn, user_ids):
+    """把一组用户的令牌版本号加一"""
+    if not user_ids:
+        return
+    rows = [{'user_id': user_id, 'version': 1} for user_id in sorted(user_ids)]
+    upsert(conn, UserTokenVersion.__table__, rows, ['user_id'], lambda old, new: {'version': old.version + 1})
+
+def get(user_id):
+    """返回用户身份，用户不存在时返回 None"""
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(user_id)
+        if entry and entry[0] > now:
+            _cache.move_to_end(user_id)
+            return entry[1]
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    identity = Identity(user, token_version(user_id))
+    with _lock:
+        _cache[user_id] = (now + TTL, identity)
+        _cache.move_to_end(user_id)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return identity
+
+def peek(user_id):
+    """只读取缓存，不访问数据库"""
+    with _lock:
+        entry = _cache.get(user_id)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+def current_version(user_id):
+    """当前令牌版本号：身份已缓存时直接读取，否则只查询版本号并缓存"""
+    identity = peek(user_id)
+    if identity is not None:
+        return identity.token_version
+    now = time.monotonic()
+    with _lock:
+        entry = _versions.get(user_id)
+        if entry and entry[0] > now:
+            _versions.move_to_end(user_id)
+            return entry[1]
+
+    version = token_version(user_id)
+    with _lock:
+        _versions[user_id] = (now + TTL, version)
+        _versions.move_to_end(user_id)
+        while len(_versions) > MAX_ENTRIES:
+            _versions.popitem(last=False)
+    return version
+
+def invalidate(user_ids):
+    with _lock:
+        for user_id in user_ids:
+            _cache.pop(user_id, None)
+            _versions.pop(user_id, None)
+
+def resolve(user_id, claims):
+    """根据令牌取得当前用户，返回 (用户, 错误信息)"""
+    version = claims.get('ver', 0)
+    if TRUST_CLAIMS and 'role' in claims and 'ver' in claims:
+        if version < current_version(user_id):
+            return None, 'Token已失效'
+        return TokenUser(user_id, claims), None
+
+    identity = get(user_id)
+    if identity is None:
+        return None, '用户不存在'
+    if version < identity.token_version:
+        return None, 'Token已失效'
+    return identity, None
+
+def is_outdated(user_id, claims):
+    """令牌版本号是否已过期（修改过密码或角色），用户不存在时同样视为失效
+
+    由 app.py 的 token_in_blocklist_loader 调用，所有 @jwt_required() 接口都会检查。
+    JWT_TRUST_CLAIMS 模式下只比较版本号（见 current_version），不加载用户。
+    """
+    version = claims.get('ver', 0)
+    if TRUST_CLAIMS and 'role' in claims and 'ver' in claims:
+        return version < current_version(user_id)
+    identity = get(user_id)
+    return identity is None or version < identity.token_version
+
+@event.listens_for(Session, 'after_flush')
+def _collect_user_changes(session, flush_context):
+    """记录被修改或删除的用户；修改密码或角色时在同一事务内递增令牌版本号"""
+    changed = {obj.id for obj in session.deleted if isinstance(obj, User)}
+    revoked = set()
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        changed.add(obj.id)
+        state = inspect(obj)
+        if any(state.attrs[field].history.has_changes() for field in _REVOKING_FIELDS):
+            revoked.add(obj.id)
+    if not changed:
+        return
+    session.info.setdefault('identity_changes', set()).update(changed)
+    bump_token_versions(session.connection(), revoked)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    invalidate(session.info.pop('identity_changes', ()))
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_user_changes(session):
+    session.info.pop('identity_changes', None)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台维护任务执行
+
+任务状态保存在 maintenance_jobs 表中，这里只负责在后台线程里执行，
+并记录本进程中正在运行的任务，防止同一任务被重复启动。
+"""
+
+import threading
+
+_active = set()
+_active_lock = threading.Lock()
+
+def is_running(job_id):
+    """任务是否正在本进程中运行"""
+    with _active_lock:
+        return job_id in _active
+
+def _run(app, job_id, runner):
+    try:
+        with app.app_context():
+            runner(job_id)
+    finally:
+        with _active_lock:
+            _active.discard(job_id)
+
+def start(app, job_id, runner):
+    """在后台线程中执行 runner(job_id)，任务已在本进程中运行时返回 False"""
+    with _active_lock:
+        if job_id in _active:
+            return False
+        _active.add(job_id)
+    threading.Thread(target=_run, args=(app, job_id, runner), daemon=True).start()
+    return True
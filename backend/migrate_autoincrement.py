@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自增ID迁移脚本
+各工作进程按自增ID增量同步的表必须使用 SQLite 的 AUTOINCREMENT，
+否则删除最新的记录后ID会被复用，其它进程会漏掉新记录。
+db.create_all 不会修改已有的表，这里按新定义重建表并保留数据。
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db, RevokedToken, PushEvent
+from sqlalchemy import text
+
+# 需要 AUTOINCREMENT 的表
+TABLES = [RevokedToken.__table__, PushEvent.__table__]
+
+def _rebuild(conn, table):
+    """按模型定义重建表，复制原有数据"""
+    old_name = f'{table.name}_old'
+    for index in table.indexes:
+        conn.execute(text(f'DROP INDEX IF EXISTS "{index.name}"'))
+    conn.execute(text(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"'))
+    table.create(bind=conn)
+    columns = ', '.join(f'"{column.name}"' for column in table.columns)
+    conn.execute(text(f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{old_name}"'))
+    conn.execute(text(f'DROP TABLE "{old_name}"'))
+
+def migrate_autoincrement():
+    """为已有的表补上 AUTOINCREMENT"""
+    with app.app_context():
+        try:
+            if db.engine.dialect.name != 'sqlite':
+                print("当前数据库不是 SQLite，无需迁移")
+                return True
+            
+            db.create_all()
+            rebuilt = 0
+            with db.engine.begin() as conn:
+                for table in TABLES:
+                    sql = conn.execute(text(
+                        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+                    ), {'name': table.name}).scalar() or ''
+                    if 'AUTOINCREMENT' in sql.upper():
+                        continue
+                    print(f"正在重建 {table.name}...")
+                    _rebuild(conn, table)
+                    rebuilt += 1
+            
+            print(f"✓ 共重建 {rebuilt} 个表")
+            print("\n自增ID迁移完成！")
+            return True
+            
+        except Exception as e:
+            print(f"迁移失败: {str(e)}")
+            return False
+
+if __name__ == '__main__':
+    migrate_autoincrement()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天记录全文索引迁移脚本
+创建 chat_messages_fts（FTS5）索引表，并为已有的聊天消息建立索引
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db
+import chat_search
+
+def migrate_chat_search():
+    """创建全文索引表并重建索引"""
+    with app.app_context():
+        try:
+            if db.engine.dialect.name != 'sqlite':
+                print("当前数据库不是 SQLite，聊天记录搜索将使用 LIKE 匹配，无需迁移")
+                return True
+            
+            print("正在建立聊天记录全文索引...")
+            count = chat_search.rebuild(db.session.connection())
+            db.session.commit()
+            
+            print(f"✓ 已为 {count} 条消息建立索引")
+            print("\n全文索引迁移完成！请重启服务以启用索引。")
+            return True
+            
+        except Exception as e:
+            print(f"迁移失败: {str(e)}")
+            db.session.rollback()
+            return False
+
+if __name__ == '__main__':
+    migrate_chat_search()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话已读状态迁移脚本
+创建 conversation_states 表，并根据 chat_messages.is_read 生成每个会话的已读水位和未读数
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db
+import conversation_state
+
+def migrate_conversation_states():
+    """创建会话状态表并回填"""
+    with app.app_context():
+        try:
+            print("正在创建会话状态表...")
+            db.create_all()
+            print("✓ conversation_states 表已就绪")
+
+            count = conversation_state.backfill(db.session.connection())
+            db.session.commit()
+
+            print(f"✓ 已生成 {count} 个会话的已读状态")
+            print("\n会话状态迁移完成！")
+            return True
+
+        except Exception as e:
+            print(f"迁移失败: {str(e)}")
+            db.session.rollback()
+            return False
+
+if __name__ == '__main__':
+    migrate_conversation_states()
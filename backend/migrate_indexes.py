@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库索引迁移脚本
+为已有数据库补建 models.py 中声明的复合索引
+（db.create_all 只会为新建的表创建索引）
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db
+from sqlalchemy import inspect, text
+
+# 已被新索引取代的旧索引 {表名: [索引名]}
+OBSOLETE_INDEXES = {
+    'chat_messages': ['idx_chat_messages_pair_created'],  # 由 idx_chat_messages_pair_created_id 取代
+}
+
+def migrate_indexes():
+    """补建缺失的索引"""
+    with app.app_context():
+        try:
+            # 确保新增的表已存在
+            db.create_all()
+            
+            inspector = inspect(db.engine)
+            existing_tables = set(inspector.get_table_names())
+            created = 0
+            dropped = 0
+            
+            for table in db.metadata.sorted_tables:
+                if table.name not in existing_tables:
+                    continue
+                existing = {index['name'] for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name in existing:
+                        continue
+                    print(f"正在创建索引 {index.name} ON {table.name}...")
+                    index.create(bind=db.engine, checkfirst=True)
+                    created += 1
+                
+                for name in OBSOLETE_INDEXES.get(table.name, []):
+                    if name not in existing:
+                        continue
+                    print(f"正在删除旧索引 {name} ON {table.name}...")
+                    with db.engine.begin() as conn:
+                        conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+                    dropped += 1
+            
+            # 更新 SQLite 查询规划器的统计信息
+            if db.engine.dialect.name == 'sqlite':
+                with db.engine.begin() as conn:
+                    conn.execute(text("ANALYZE"))
+            
+            print(f"✓ 共创建 {created} 个索引")
+            if dropped:
+                print(f"✓ 共删除 {dropped} 个旧索引")
+            print("\n索引迁移完成！")
+            return True
+            
+        except Exception as e:
+            print(f"迁移失败: {str(e)}")
+            return False
+
+if __name__ == '__main__':
+    migrate_indexes()
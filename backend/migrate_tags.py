@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+标签功能数据库迁移脚本
+创建 tags / file_tags 表，并从 files.tags 的 JSON 字段回填标签数据
+"""
+
+import sys
+import os
+import json
+import uuid
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db, Tag, file_tags, normalize_tags
+from sqlalchemy import text
+
+def migrate_tags():
+    """创建标签表并回填历史标签"""
+    with app.app_context():
+        try:
+            print("正在创建标签相关表...")
+            db.create_all()
+            print("✓ tags / file_tags 表已就绪")
+            
+            # 旧版本的 files 表才有 tags 字段
+            result = db.session.execute(text("PRAGMA table_info(files)"))
+            columns = [row[1] for row in result.fetchall()]
+            if 'tags' not in columns:
+                print("✓ files 表没有 tags 字段，无需回填")
+                return True
+            
+            rows = db.session.execute(text(
+                "SELECT id, user_id, tags FROM files WHERE tags IS NOT NULL AND tags != ''"
+            )).fetchall()
+            print(f"发现 {len(rows)} 个带标签的文件，开始回填...")
+            
+            # 预先加载已有标签，避免逐条查询
+            tag_ids = {(tag.user_id, tag.name): tag.id for tag in Tag.query.all()}
+            existing_links = {
+                (row.file_id, row.tag_id)
+                for row in db.session.execute(file_tags.select()).fetchall()
+            }
+            
+            new_tags = []
+            new_links = []
+            for file_id, user_id, raw_tags in rows:
+                try:
+                    names = normalize_tags(json.loads(raw_tags))
+                except (TypeError, ValueError):
+                    print(f"  跳过无法解析的标签: 文件 {file_id}")
+                    continue
+                
+                for name in names:
+                    key = (user_id, name)
+                    if key not in tag_ids:
+                        tag_ids[key] = str(uuid.uuid4())
+                        new_tags.append({
+                            'id': tag_ids[key],
+                            'user_id': user_id,
+                            'name': name,
+                            'created_at': datetime.now()
+                        })
+                    link = (file_id, tag_ids[key])
+                    if link not in existing_links:
+                        existing_links.add(link)
+                        new_links.append({'file_id': file_id, 'tag_id': tag_ids[key]})
+            
+            if new_tags:
+                db.session.execute(Tag.__table__.insert(), new_tags)
+            if new_links:
+                db.session.execute(file_tags.insert(), new_links)
+            db.session.commit()
+            
+            print(f"✓ 新建标签 {len(new_tags)} 个，关联 {len(new_links)} 条")
+            print("\n标签迁移完成！")
+            return True
+            
+        except Exception as e:
+            print(f"迁移失败: {str(e)}")
+            db.session.rollback()
+            return False
+
+if __name__ == '__main__':
+    migrate_tags()
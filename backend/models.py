@@ -2,12 +2,26 @@ from datetime import datetime
 import uuid
 import random
 import string
+from sqlalchemy import event, func
+from sqlalchemy.orm import aliased
 from database import db
+import asset_urls
 
 def generate_user_code():
     """生成8位用户代码"""
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
 
+def normalize_tags(tags_list):
+    """规范化标签列表：去除首尾空白、去重并保持顺序"""
+    names = []
+    for tag in tags_list or []:
+        if not isinstance(tag, str):
+            continue
+        name = tag.strip()[:64]
+        if name and name not in names:
+            names.append(name)
+    return names
+
 class User(db.Model):
     """用户模型"""
     __tablename__ = 'users'
@@ -53,6 +67,12 @@ class Folder(db.Model):
     parent = db.relationship('Folder', remote_side=[id], backref='children')
     files = db.relationship('File', backref='folder', lazy=True, cascade='all, delete-orphan')
     
+    # 索引：按用户+父目录列出/查重名，按父目录查子文件夹
+    __table_args__ = (
+        db.Index('idx_folders_user_parent_name', 'user_id', 'parent_id', 'name'),
+        db.Index('idx_folders_parent', 'parent_id'),
+    )
+    
     def to_dict(self, include_children=False):
         result = {
             'id': self.id,
@@ -70,17 +90,100 @@ class Folder(db.Model):
     
     def get_file_count(self):
         """获取文件夹中的文件数量（包括子文件夹）"""
-        count = len(self.files)
-        for child in self.children:
-            count += child.get_file_count()
-        return count
+        return self._subtree_totals()[0]
     
     def get_total_size(self):
         """获取文件夹总大小（包括子文件夹）"""
-        size = sum(file.size for file in self.files)
-        for child in self.children:
-            size += child.get_total_size()
-        return size
+        return self._subtree_totals()[1]
+    
+    def _subtree_totals(self):
+        """用递归 CTE 一次算出子树的文件数和总大小"""
+        tree = Folder.tree_cte(self.user_id, root_ids=[self.id])
+        row = db.session.query(
+            func.count(File.id),
+            func.coalesce(func.sum(File.size), 0)
+        ).join(tree, File.folder_id == tree.c.folder_id).one()
+        return row[0], row[1]
+    
+    @staticmethod
+    def tree_cte(user_id, root_ids=None):
+        """返回 (ancestor_id, folder_id) 的递归 CTE：每个文件夹与其自身及全部后代配对
+
+        root_ids 为空时以用户的所有文件夹为起点。
+        """
+        anchor = db.select(Folder.id.label('ancestor_id'), Folder.id.label('folder_id')).where(
+            Folder.user_id == user_id
+        )
+        if root_ids is not None:
+            anchor = anchor.where(Folder.id.in_(root_ids))
+        tree = anchor.cte('folder_tree', recursive=True)
+        child = aliased(Folder)
+        return tree.union_all(
+            db.select(tree.c.ancestor_id, child.id).where(child.parent_id == tree.c.folder_id)
+        )
+    
+    @staticmethod
+    def stats_query(user_id):
+        """每个文件夹的直接文件数/大小和含子文件夹的递归文件数/大小
+
+        直接统计来自一次 GROUP BY，递归统计由递归 CTE 汇总，查询次数与文件夹数量无关。
+        """
+        direct = db.select(
+            File.folder_id.label('folder_id'),
+            func.count(File.id).label('file_count'),
+            func.coalesce(func.sum(File.size), 0).label('total_size')
+        ).where(File.user_id == user_id).group_by(File.folder_id).subquery('direct')
+        
+        tree = Folder.tree_cte(user_id)
+        recursive = db.select(
+            tree.c.ancestor_id.label('folder_id'),
+            func.sum(direct.c.file_count).label('file_count'),
+            func.sum(direct.c.total_size).label('total_size')
+        ).select_from(
+            tree.join(direct, direct.c.folder_id == tree.c.folder_id)
+        ).group_by(tree.c.ancestor_id).subquery('recursive')
+        
+        return db.session.query(
+            Folder.id,
+            Folder.name,
+            Folder.is_parent,
+            Folder.parent_id,
+            func.coalesce(direct.c.file_count, 0).label('file_count'),
+            func.coalesce(direct.c.total_size, 0).label('total_size'),
+            func.coalesce(recursive.c.file_count, 0).label('recursive_file_count'),
+            func.coalesce(recursive.c.total_size, 0).label('recursive_size')
+        ).outerjoin(
+            direct, direct.c.folder_id == Folder.id
+        ).outerjoin(
+            recursive, recursive.c.folder_id == Folder.id
+        ).filter(Folder.user_id == user_id)
+
+# 文件与标签的多对多关联表
+file_tags = db.Table(
+    'file_tags',
+    db.Column('file_id', db.String(36), db.ForeignKey('files.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.String(36), db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('idx_file_tags_tag_file', 'tag_id', 'file_id')
+)
+
+class Tag(db.Model):
+    """标签模型"""
+    __tablename__ = 'tags'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    name = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    # 同一用户下标签名唯一，(user_id, name) 同时作为按标签筛选的索引
+    __table_args__ = (db.UniqueConstraint('user_id', 'name', name='unique_user_tag'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'createdAt': self.created_at.isoformat() if self.created_at else None
+        }
 
 class File(db.Model):
     """文件模型"""
@@ -97,14 +200,26 @@ class File(db.Model):
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     path = db.Column(db.String(500), nullable=False)  # 文件存储路径
     thumbnail_path = db.Column(db.String(500), nullable=True)  # 缩略图路径
-    tags = db.Column(db.Text, nullable=True)  # JSON格式的标签
     uploaded_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     
     # 关系
     shares = db.relationship('FileShare', backref='file', lazy=True, cascade='all, delete-orphan')
-    
-    def to_dict(self, include_url=True):
+    # 标签以 selectin 方式批量加载，文件列表只需一次额外的 IN 查询
+    tags = db.relationship('Tag', secondary=file_tags, lazy='selectin', order_by='Tag.name',
+                           backref=db.backref('files', lazy='dynamic'))
+    
+    # 索引：文件夹内列表/查重名、按上传时间排序、按类型统计、按文件夹加载
+    __table_args__ = (
+        db.Index('idx_files_user_folder_name', 'user_id', 'folder_id', 'name'),
+        db.Index('idx_files_user_uploaded', 'user_id', 'uploaded_at'),
+        db.Index('idx_files_user_type_size', 'user_id', 'type', 'size'),
+        db.Index('idx_files_folder', 'folder_id'),
+        db.Index('idx_files_filename', 'filename'),
+    )
+    
+    def to_dict(self, include_url=True, signed_urls=False):
+        """signed_urls 为 True 时返回签名链接（见 asset_urls.py），只用于列出自己文件的接口"""
         # 为前端提供统一的文件类型映射
         frontend_type = self.type
         if self.type in ['document', 'spreadsheet', 'presentation']:
@@ -132,7 +247,13 @@ class File(db.Model):
             'tags': self.get_tags()
         }
         
-        if include_url:
+        if include_url and signed_urls:
+            # 签名链接，前端可以直接用于 <img>/<video> 而不必在链接中附带 JWT
+            result['url'] = asset_urls.sign(f'/api/files/{self.id}/download')
+            result['previewUrl'] = asset_urls.sign(f'/api/files/{self.id}/preview')
+            if self.thumbnail_path:
+                result['thumbnailUrl'] = asset_urls.sign(f'/api/files/{self.id}/thumbnail')
+        elif include_url:
             result['url'] = f'/api/files/{self.id}/download'
             if self.thumbnail_path:
                 result['thumbnailUrl'] = f'/api/files/{self.id}/thumbnail'
@@ -141,18 +262,28 @@ class File(db.Model):
     
     def get_tags(self):
         """获取标签列表"""
-        if self.tags:
-            import json
-            try:
-                return json.loads(self.tags)
-            except:
-                return []
-        return []
+        return [tag.name for tag in self.tags]
     
     def set_tags(self, tags_list):
-        """设置标签列表"""
-        import json
-        self.tags = json.dumps(tags_list) if tags_list else None
+        """设置标签列表（不存在的标签会自动创建）"""
+        names = normalize_tags(tags_list)
+        if not names:
+            self.tags = []
+            return
+        
+        existing = {tag.name: tag for tag in Tag.query.filter(
+            Tag.user_id == self.user_id,
+            Tag.name.in_(names)
+        ).all()}
+        
+        tags = []
+        for name in names:
+            tag = existing.get(name)
+            if not tag:
+                tag = Tag(user_id=self.user_id, name=name)
+                db.session.add(tag)
+            tags.append(tag)
+        self.tags = tags
     
     @staticmethod
     def get_file_type(mime_type):
@@ -180,6 +311,188 @@ class File(db.Model):
         else:
             return 'other'
 
+class ActivityRollup(db.Model):
+    """按小时/按天预聚合的用户活动统计"""
+    __tablename__ = 'activity_rollups'
+    
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    period = db.Column(db.String(8), primary_key=True)  # 'hour' or 'day'
+    bucket = db.Column(db.DateTime, primary_key=True)  # 时间桶起点
+    uploads = db.Column(db.Integer, nullable=False, default=0)  # 上传文件数
+    upload_bytes = db.Column(db.BigInteger, nullable=False, default=0)  # 上传字节数
+    folders_created = db.Column(db.Integer, nullable=False, default=0)  # 新建文件夹数
+    
+    def to_dict(self):
+        return {
+            'period': self.period,
+            'bucket': self.bucket.isoformat() if self.bucket else None,
+            'uploads': self.uploads,
+            'uploadBytes': self.upload_bytes,
+            'foldersCreated': self.folders_created
+        }
+
+class StatsVersion(db.Model):
+    """用户统计数据版本号，文件/文件夹每次变更时递增，用于判断统计缓存是否过期"""
+    __tablename__ = 'stats_versions'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class UserTokenVersion(db.Model):
+    """用户令牌版本号，修改密码或角色时递增，签发时间更早（版本号更小）的令牌随之失效"""
+    __tablename__ = 'user_token_versions'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class RevokedToken(db.Model):
+    """已注销的令牌（按 JTI），令牌过期后即可删除"""
+    __tablename__ = 'revoked_tokens'
+
+    # 自增ID用于各工作进程增量同步新注销的令牌
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    jti = db.Column(db.String(64), nullable=False, unique=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.now)
+
+    # 各进程按ID增量同步，过期记录删除后ID不能被复用（SQLite 需要 AUTOINCREMENT）
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class UserUsage(db.Model):
+    """按用户物化的存储用量，随文件/文件夹变更增量更新"""
+    __tablename__ = 'user_usage'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    file_count = db.Column(db.Integer, nullable=False, default=0)  # 文件数
+    folder_count = db.Column(db.Integer, nullable=False, default=0)  # 文件夹数
+    storage_used = db.Column(db.BigInteger, nullable=False, default=0)  # 已用字节数
+    last_upload_at = db.Column(db.DateTime)  # 最近一次上传时间
+
+    __table_args__ = (
+        db.Index('idx_user_usage_storage', 'storage_used'),
+        db.Index('idx_user_usage_file_count', 'file_count'),
+        db.Index('idx_user_usage_folder_count', 'folder_count'),
+        db.Index('idx_user_usage_last_upload', 'last_upload_at'),
+    )
+
+@event.listens_for(User, 'after_insert')
+def _create_usage_row(mapper, connection, target):
+    """新用户写入一行全零的用量，排行榜按用量表内连接，不必 COALESCE"""
+    connection.execute(UserUsage.__table__.insert().values(user_id=target.id))
+
+class DiskUsage(db.Model):
+    """上传目录中每个子目录（分片）的磁盘占用，由存储层增量维护"""
+    __tablename__ = 'disk_usage'
+
+    shard = db.Column(db.String(255), primary_key=True)  # 相对上传根目录的子目录
+    user_id = db.Column(db.String(36), index=True)  # 分片所属用户（子目录名）
+    bytes = db.Column(db.BigInteger, nullable=False, default=0)  # 占用字节数
+    files = db.Column(db.Integer, nullable=False, default=0)  # 文件数
+    dir_mtime = db.Column(db.Float)  # 上次校对时目录的修改时间
+    reconciled_at = db.Column(db.DateTime)  # 上次校对时间
+
+class MaintenanceJob(db.Model):
+    """后台维护任务（例如存储校对），记录进度以便查询和中断后继续"""
+    __tablename__ = 'maintenance_jobs'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    job_type = db.Column(db.String(50), nullable=False)  # 'storage_reconcile' / 'backup'
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending/running/completed/failed，校对任务另有 scanning/deleting
+    options = db.Column(db.JSON)  # 任务参数
+    dry_run = db.Column(db.Boolean, default=False)
+    total = db.Column(db.Integer, default=0)  # 待处理项目数
+    processed = db.Column(db.Integer, default=0)  # 已处理项目数
+    freed_bytes = db.Column(db.BigInteger, default=0)  # 已释放字节数
+    report = db.Column(db.JSON)  # 扫描结果摘要
+    error = db.Column(db.Text)
+    created_by = db.Column(db.String(36), db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('idx_maintenance_jobs_type_created', 'job_type', 'created_at'),)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'jobType': self.job_type,
+            'status': self.status,
+            'options': self.options or {},
+            'dryRun': self.dry_run,
+            'total': self.total,
+            'processed': self.processed,
+            'progress': round(self.processed / self.total * 100, 2) if self.total else 100.0,
+            'freedBytes': self.freed_bytes,
+            'report': self.report,
+            'error': self.error,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'updatedAt': self.updated_at.isoformat() if self.updated_at else None,
+            'finishedAt': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class PushEvent(db.Model):
+    """推送事件，多进程部署时各工作进程通过该表交换事件，只保留最近一段时间"""
+    __tablename__ = 'push_events'
+
+    # 自增ID即事件序号，各进程按序号增量读取
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(36), nullable=False)  # 接收事件的用户
+    event_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON)
+    origin_pid = db.Column(db.Integer)  # 发布事件的进程（随机标识），该进程已直接投递
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
+
+    # 过期事件删除后ID不能被复用，否则已读到更大序号的进程会漏掉新事件（SQLite 需要 AUTOINCREMENT）
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class SlowQuery(db.Model):
+    """慢查询日志，每种语句（按指纹）一行，保存最近一次的执行计划"""
+    __tablename__ = 'slow_queries'
+
+    fingerprint = db.Column(db.String(40), primary_key=True)  # 规范化 SQL 的 SHA-1
+    statement = db.Column(db.Text, nullable=False)
+    param_shape = db.Column(db.JSON)  # 参数类型，不保存参数值
+    method = db.Column(db.String(10))
+    route = db.Column(db.String(255))  # 最近一次触发的路由模板，后台线程为空
+    count = db.Column(db.Integer, default=0)
+    total_duration = db.Column(db.Float, default=0)  # 毫秒
+    max_duration = db.Column(db.Float, default=0)  # 毫秒
+    plan = db.Column(db.JSON)  # EXPLAIN QUERY PLAN 的各行说明
+    first_seen = db.Column(db.DateTime, default=datetime.now)
+    last_seen = db.Column(db.DateTime, default=datetime.now, index=True)
+
+    def to_dict(self):
+        return {
+            'fingerprint': self.fingerprint,
+            'statement': self.statement,
+            'paramShape': self.param_shape or [],
+            'method': self.method,
+            'route': self.route,
+            'count': self.count,
+            'avgDuration': round(self.total_duration / self.count, 2) if self.count else 0,
+            'maxDuration': round(self.max_duration or 0, 2),
+            'plan': self.plan,
+            # 计划中对业务表的 SCAN 表示全表扫描（子查询、临时表的 SCAN 不算）
+            'fullScan': any(line.startswith('SCAN ') and line.replace('SCAN TABLE ', 'SCAN ').split()[1] in db.metadata.tables
+                            for line in self.plan or []),
+            'firstSeen': self.first_seen.isoformat() if self.first_seen else None,
+            'lastSeen': self.last_seen.isoformat() if self.last_seen else None
+        }
+
+class MaintenanceJobItem(db.Model):
+    """维护任务中待处理的单个项目"""
+    __tablename__ = 'maintenance_job_items'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    job_id = db.Column(db.String(36), db.ForeignKey('maintenance_jobs.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # 'orphan'（磁盘多余文件）或 'missing'（记录缺少文件）
+    ref = db.Column(db.String(500), nullable=False)  # 文件路径或文件记录ID
+    size = db.Column(db.BigInteger, default=0)
+    done = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (db.Index('idx_maintenance_job_items_job_done', 'job_id', 'done', 'id'),)
+
 class FileShare(db.Model):
     """文件分享模型"""
     __tablename__ = 'file_shares'
@@ -197,6 +510,8 @@ class FileShare(db.Model):
     # 关系
     user = db.relationship('User', backref='shares')
     
+    __table_args__ = (db.Index('idx_file_shares_file', 'file_id'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -231,6 +546,8 @@ class TrashItem(db.Model):
     # 关系
     user = db.relationship('User', backref='trash_items')
     
+    __table_args__ = (db.Index('idx_trash_items_user_deleted', 'user_id', 'deleted_at'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -256,8 +573,11 @@ class Friendship(db.Model):
     user = db.relationship('User', foreign_keys=[user_id], backref='sent_friend_requests')
     friend = db.relationship('User', foreign_keys=[friend_id], backref='received_friend_requests')
     
-    # 唯一约束
-    __table_args__ = (db.UniqueConstraint('user_id', 'friend_id', name='unique_friendship'),)
+    # 唯一约束（同时作为按 user_id 查询的索引），反向查询走 friend_id 索引
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'friend_id', name='unique_friendship'),
+        db.Index('idx_friendships_friend_status', 'friend_id', 'status'),
+    )
     
     def to_dict(self):
         return {
@@ -289,20 +609,53 @@ class ChatMessage(db.Model):
     receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_messages')
     file = db.relationship('File', backref='chat_messages')
     
-    def to_dict(self):
-        return {
+    # 索引：会话消息按 (created_at, id) 排序和游标分页，按接收者统计未读
+    __table_args__ = (
+        db.Index('idx_chat_messages_pair_created_id', 'sender_id', 'receiver_id', 'created_at', 'id'),
+        db.Index('idx_chat_messages_receiver_read', 'receiver_id', 'is_read', 'sender_id'),
+        db.Index('idx_chat_messages_file', 'file_id'),
+    )
+    
+    def to_dict(self, read_at=None, compact=False):
+        """read_at 为接收者在该会话中的已读水位，之前的消息视为已读
+
+        is_read 只在引入会话状态之前写入，此后已读状态由 conversation_states 中的水位决定。
+        compact 为 True 时只返回 senderId / receiverId / fileId，不内嵌用户和文件。
+        """
+        result = {
             'id': self.id,
             'senderId': self.sender_id,
             'receiverId': self.receiver_id,
             'messageType': self.message_type,
             'content': self.content,
             'fileId': self.file_id,
-            'isRead': self.is_read,
-            'sender': self.sender.to_dict() if self.sender else None,
-            'receiver': self.receiver.to_dict() if self.receiver else None,
-            'file': self.file.to_dict() if self.file else None,
+            'isRead': bool(self.is_read) or (read_at is not None and self.created_at is not None and self.created_at <= read_at),
             'createdAt': self.created_at.isoformat() if self.created_at else None
         }
+        
+        if not compact:
+            result['sender'] = self.sender.to_dict() if self.sender else None
+            result['receiver'] = self.receiver.to_dict() if self.receiver else None
+            result['file'] = self.file.to_dict() if self.file else None
+            
+        return result
+
+@event.listens_for(ChatMessage.__table__, 'after_create')
+def _create_chat_search_index(target, connection, **kw):
+    """新建 chat_messages 表时一并建立全文索引表（见 chat_search.py）"""
+    if connection.dialect.name == 'sqlite':
+        import chat_search
+        chat_search.create_index(connection)
+
+class ConversationState(db.Model):
+    """会话状态：用户在与某个好友的会话中的已读水位和未读消息数"""
+    __tablename__ = 'conversation_states'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    peer_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)  # 会话对方
+    last_read_at = db.Column(db.DateTime)  # 对方在此时间及之前发来的消息均已读
+    last_read_message_id = db.Column(db.String(36))
+    unread_count = db.Column(db.Integer, nullable=False, default=0)  # 水位之后收到的消息数
 
 class PublicShare(db.Model):
     """公共文件分享模型"""
@@ -328,6 +681,12 @@ class PublicShare(db.Model):
     file = db.relationship('File', backref='public_shares')
     user = db.relationship('User', backref='public_shares')
     
+    # token 已有唯一索引；这里补充按用户列出和按文件查找的索引
+    __table_args__ = (
+        db.Index('idx_public_shares_user_created', 'user_id', 'created_at'),
+        db.Index('idx_public_shares_file', 'file_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -379,6 +738,13 @@ class FriendFileShare(db.Model):
     receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_file_shares')
     saved_folder = db.relationship('Folder', backref='shared_files')
     
+    __table_args__ = (
+        db.Index('idx_friend_file_shares_receiver', 'receiver_id', 'status', 'created_at'),
+        db.Index('idx_friend_file_shares_sender', 'sender_id', 'created_at'),
+        db.Index('idx_friend_file_shares_file', 'file_id'),
+        db.Index('idx_friend_file_shares_folder', 'saved_folder_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
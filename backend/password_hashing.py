@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+密码哈希
+
+登录、注册和修改密码时的密码哈希与校验都是 CPU 密集的计算，直接在请求线程中执行时，
+集中登录会占满所有工作线程，下载等普通请求只能排队。这里把它们交给独立的进程池：
+- 进程池大小为 PASSWORD_HASH_WORKERS（0 表示在请求线程中直接计算）
+- 正在计算和排队的任务合计不超过 PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE 个，
+  超出时立即抛出 PasswordHashingBusy，接口返回 503 和 Retry-After，而不是让请求堆积
+- 哈希参数由 PASSWORD_HASH_METHOD 指定，登录成功时如果已保存的哈希使用的是旧参数，
+  按新参数重新计算（needs_rehash）
+
+进程池在当前进程第一次使用时创建（fork 后的子进程重新创建）。
+"""
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# 哈希方法和参数（werkzeug 格式），修改后旧哈希在用户下次登录时更新
+METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+# 进程池大小；不支持 fork 的平台默认在请求线程中计算
+_DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2) if hasattr(os, 'fork') else 0
+WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', _DEFAULT_WORKERS))
+# 除正在计算的任务外最多排队的任务数
+QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE', max(WORKERS, 1) * 4))
+# 等待计算结果的最长时间（秒）
+TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+# 繁忙时建议客户端重试的间隔（秒）
+RETRY_AFTER = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', 1))
+
+class PasswordHashingBusy(Exception):
+    """密码哈希任务已满"""
+
+_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(WORKERS, 1) + QUEUE_SIZE)
+_pool = None
+_pool_pid = None
+
+def _ensure_pool():
+    """当前进程中尚未创建进程池时创建（fork 后的子进程需要重新创建）"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool_pid == pid and _pool is not None:
+        return _pool
+    with _lock:
+        if _pool_pid != pid or _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context('fork'))
+            _pool_pid = pid
+    return _pool
+
+def _run(func, *args):
+    global _pool
+    if not _slots.acquire(blocking=False):
+        raise PasswordHashingBusy()
+    if WORKERS <= 0:
+        try:
+            return func(*args)
+        finally:
+            _slots.release()
+    pool = None
+    try:
+        try:
+            pool = _ensure_pool()
+            future = pool.submit(func, *args)
+        except BaseException:
+            _slots.release()
+            raise
+        # 名额在任务结束（完成、取消或失败）时才归还，等待超时后仍在计算的任务继续占用名额
+        future.add_done_callback(lambda _: _slots.release())
+        try:
+            return future.result(timeout=TIMEOUT)
+        except TimeoutError:
+            # 仍在排队的任务直接取消；已开始计算的无法中断，结束后归还名额
+            future.cancel()
+            raise PasswordHashingBusy()
+    except BrokenProcessPool:
+        # 子进程异常退出，下次调用时重新创建进程池
+        with _lock:
+            if _pool is pool:
+                _pool = None
+        raise
+
+def hash_password(password):
+    return _run(generate_password_hash, password, METHOD)
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    """已保存的哈希是否使用了与当前配置不同的方法或参数"""
+    return password_hash.split('$', 1)[0] != METHOD
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实时推送
+
+客户端通过 /api/events/stream（Server-Sent Events）保持一个长连接，服务端在发送聊天消息、
+好友请求、好友文件分享后调用 publish()，事件立即推送给接收者，页面不再需要轮询。
+
+- 进程内：每个连接对应一个有界队列，按用户ID登记；发布时直接放入本进程该用户的所有队列
+- 跨进程：由 PUSH_TRANSPORT 选择传输方式，把事件转发给其它工作进程
+  - local：只在本进程内投递（单进程开发服务器）
+  - database（默认）：写入 push_events 表，各进程的后台线程每隔 PUSH_POLL_INTERVAL 秒
+    按自增ID增量读取并投递，超过 PUSH_RETENTION 秒的事件被删除
+  - redis：通过 PUSH_REDIS_URL 指定的 Redis（或兼容服务）发布/订阅，需要安装 redis 包
+
+连接的队列满时（客户端长时间读不动）关闭该连接，客户端重连后重新加载数据。
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select
+from models import db, PushEvent
+
+logger = logging.getLogger(__name__)
+
+# 跨进程传输方式：local / database / redis
+TRANSPORT = os.getenv('PUSH_TRANSPORT', 'database')
+# database 传输的轮询间隔（秒）和事件保留时间（秒）
+POLL_INTERVAL = float(os.getenv('PUSH_POLL_INTERVAL', 0.25))
+RETENTION = float(os.getenv('PUSH_RETENTION', 60))
+REDIS_URL = os.getenv('PUSH_REDIS_URL', 'redis://localhost:6379/0')
+REDIS_CHANNEL = 'file-manager:push'
+# 每个连接最多积压的事件数
+QUEUE_SIZE = int(os.getenv('PUSH_QUEUE_SIZE', 100))
+# 没有事件时发送心跳的间隔（秒），用于发现已断开的连接
+HEARTBEAT = float(os.getenv('PUSH_HEARTBEAT', 15))
+# 每轮询多少次清理一次过期事件
+PRUNE_EVERY = 200
+
+class Subscription:
+    """一个推送连接"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def get(self, timeout):
+        """等待下一个事件，超时返回 None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+_lock = threading.Lock()
+# 用户ID -> 本进程中该用户的连接
+_subscribers = {}
+_transport = None
+_transport_pid = None
+_listening = False
+_app = None
+
+def deliver(user_id, event):
+    """投递给本进程中该用户的所有连接"""
+    with _lock:
+        subscriptions = list(_subscribers.get(user_id, ()))
+    for subscription in subscriptions:
+        try:
+            subscription.queue.put_nowait(event)
+        except queue.Full:
+            subscription.overflowed = True
+
+def subscribe(user_id):
+    _ensure_listening()
+    subscription = Subscription(user_id)
+    with _lock:
+        _subscribers.setdefault(user_id, set()).add(subscription)
+    return subscription
+
+def unsubscribe(subscription):
+    with _lock:
+        subscriptions = _subscribers.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del _subscribers[subscription.user_id]
+
+def connection_count():
+    with _lock:
+        return sum(len(subscriptions) for subscriptions in _subscribers.values())
+
+def publish(user_ids, event_type, data):
+    """向一组用户发布事件（在提交事务之后调用）；推送失败只记录日志，不影响接口结果"""
+    if isinstance(user_ids, str):
+        user_ids = [user_ids]
+    event = {'type': event_type, 'data': data}
+    for user_id in user_ids:
+        deliver(user_id, event)
+    try:
+        _ensure_transport().publish(user_ids, event)
+    except Exception as e:
+        logger.exception("发布推送事件失败: %s", e)
+
+def format_event(event):
+    """按 SSE 格式输出一个事件"""
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+class LocalTransport:
+    """只在本进程内投递"""
+
+    def publish(self, user_ids, event):
+        pass
+
+    def start(self):
+        pass
+
+class DatabaseTransport:
+    """通过 push_events 表在工作进程之间转发事件"""
+
+    def __init__(self):
+        self.last_id = None
+        # 本进程的随机标识（写入 origin_pid 列）；不同主机或容器中的进程号可能相同
+        self.origin = uuid.uuid4().int & 0x7FFFFFFF
+
+    def publish(self, user_ids, event):
+        rows = [{
+            'user_id': user_id, 'event_type': event['type'], 'payload': event['data'],
+            'origin_pid': self.origin, 'created_at': datetime.now()
+        } for user_id in user_ids]
+        with db.engine.begin() as conn:
+            conn.execute(insert(PushEvent.__table__), rows)
+
+    def _poll(self, conn):
+        rows = conn.execute(
+            select(PushEvent.id, PushEvent.user_id, PushEvent.event_type, PushEvent.payload, PushEvent.origin_pid)
+            .where(PushEvent.id > self.last_id).order_by(PushEvent.id)
+        ).all()
+        for row_id, user_id, event_type, payload, origin_pid in rows:
+            self.last_id = row_id
+            if origin_pid != self.origin:
+                deliver(user_id, {'type': event_type, 'data': payload})
+
+    def _prune(self, conn):
+        cutoff = datetime.now() - timedelta(seconds=RETENTION)
+        conn.execute(delete(PushEvent.__table__).where(PushEvent.created_at < cutoff))
+
+    def _loop(self):
+        polls = 0
+        with _app.app_context():
+            while True:
+                if not connection_count():
+                    # 本进程没有连接时不查询，有新连接后从当时的最新事件开始
+                    self.last_id = None
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                try:
+                    with db.engine.begin() as conn:
+                        if self.last_id is None:
+                            # 只投递订阅之后发布的事件
+                            self.last_id = conn.execute(select(func.coalesce(func.max(PushEvent.id), 0))).scalar()
+                        self._poll(conn)
+                        polls += 1
+                        if polls % PRUNE_EVERY == 0:
+                            self._prune(conn)
+                except Exception as e:
+                    logger.exception("读取推送事件失败: %s", e)
+                time.sleep(POLL_INTERVAL)
+
+    def start(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+class RedisTransport:
+    """通过 Redis（或兼容服务）的发布/订阅转发事件"""
+
+    def __init__(self):
+        import redis  # 可选依赖，只在使用该传输方式时需要
+        self.client = redis.Redis.from_url(REDIS_URL)
+        # 本进程的随机标识；共用一个 Redis 的不同主机或容器中进程号可能相同
+        self.origin = uuid.uuid4().hex
+
+    def publish(self, user_ids, event):
+        self.client.publish(REDIS_CHANNEL, json.dumps({
+            'userIds': list(user_ids), 'event': event, 'origin': self.origin
+        }, ensure_ascii=False))
+
+    def _loop(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REDIS_CHANNEL)
+                for message in pubsub.listen():
+                    data = json.loads(message['data'])
+                    if data['origin'] == self.origin:
+                        continue
+                    for user_id in data['userIds']:
+                        deliver(user_id, data['event'])
+            except Exception as e:
+                logger.exception("订阅推送事件失败: %s", e)
+                time.sleep(1)
+
+    def start(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+
+TRANSPORTS = {
+    'local': LocalTransport,
+    'database': DatabaseTransport,
+    'redis': RedisTransport
+}
+
+def _ensure_transport():
+    """当前进程中尚未创建传输时创建（fork 后的子进程需要重新创建）"""
+    global _transport, _transport_pid, _listening
+    pid = os.getpid()
+    if _transport_pid == pid:
+        return _transport
+    with _lock:
+        if _transport_pid != pid:
+            _transport, _transport_pid, _listening = TRANSPORTS[TRANSPORT](), pid, False
+    return _transport
+
+def _ensure_listening():
+    """本进程有连接后才开始接收其它进程的事件"""
+    global _listening
+    transport = _ensure_transport()
+    with _lock:
+        if _listening:
+            return
+        _listening = True
+    transport.start()
+
+def init_app(app):
+    global _app
+    if TRANSPORT not in TRANSPORTS:
+        raise ValueError(f'未知的 PUSH_TRANSPORT: {TRANSPORT}')
+    _app = app
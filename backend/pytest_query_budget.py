@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pytest 查询预算插件
+
+提供 query_budget 夹具，限制一段代码执行的 SQL 语句数，超过上限时测试失败，
+并给出重复次数最多的语句（通常就是新增的 N+1 查询）：
+
+    def test_list_files(client, query_budget):
+        with query_budget(5) as statements:
+            client.get('/api/files')
+
+statements 为块内执行的 [(语句, 参数, 是否 executemany)]。
+默认统计 db.engine 上的语句，也可以通过 engine 参数指定。
+在 conftest.py 中通过 pytest_plugins = ['pytest_query_budget'] 启用。
+"""
+
+from contextlib import contextmanager
+import pytest
+
+@pytest.fixture
+def query_budget():
+    # 延迟导入：测试模块需要先设置好数据库等环境变量
+    import sql_profiler
+    from models import db
+
+    @contextmanager
+    def budget(limit, engine=None):
+        with sql_profiler.capture(engine if engine is not None else db.engine) as statements:
+            yield statements
+        if len(statements) <= limit:
+            return
+        counts = {}
+        for statement, _, _ in statements:
+            entry = counts.setdefault(sql_profiler.fingerprint(statement), [0, 0.0])
+            entry[0] += 1
+        repeated = sql_profiler.repeated_statements(counts)
+        detail = f'，重复执行 {repeated[0][1]} 次: {repeated[0][0][:200]}' if repeated else ''
+        pytest.fail(f'执行 {len(statements)} 条语句，超过上限 {limit}{detail}', pytrace=False)
+
+    return budget
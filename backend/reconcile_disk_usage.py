@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+磁盘占用校对脚本
+按上传目录中的实际文件校对 disk_usage 分片计数，
+首次升级时运行一次即可生成计数，之后可定期运行修正偏差
+
+用法: python reconcile_disk_usage.py [--force]
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+from models import db
+import storage
+
+def reconcile_disk_usage(force=False):
+    """校对磁盘占用计数"""
+    with app.app_context():
+        try:
+            db.create_all()
+            print("正在校对上传目录磁盘占用...")
+            result = storage.reconcile(force=force)
+            print(f"✓ 统计 {result['scanned']} 个分片，跳过未变化的 {result['skipped']} 个，"
+                  f"移除 {result['removed']} 个")
+            totals = storage.disk_totals()
+            print(f"✓ 共 {totals['files']} 个文件，{totals['bytes']} 字节")
+            print("\n磁盘占用校对完成！")
+            return True
+        except Exception as e:
+            print(f"校对失败: {str(e)}")
+            db.session.rollback()
+            return False
+
+if __name__ == '__main__':
+    reconcile_disk_usage('--force' in sys.argv)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储校对
+
+比较数据库中的文件记录和上传目录中的实际文件，一次扫描同时找出：
+- 孤立文件：磁盘上存在但没有任何记录引用（包括缩略图）的文件
+- 缺失文件：记录存在但磁盘上找不到对应文件的记录
+
+数据库中的路径按批次流式读入集合，上传目录按用户子目录并行用 os.scandir
+扫描。先读数据库再扫描磁盘，并跳过最近 RECONCILE_GRACE_SECONDS 秒内写入
+的文件，避免把正在上传的文件误判为孤立文件。
+
+非试运行任务会把待处理项目写入 maintenance_job_items，按批删除并逐批
+提交进度；任务中断后可以从未完成的项目继续。
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import insert
+from models import db, File, MaintenanceJob, MaintenanceJobItem
+import storage
+import jobs
+
+JOB_TYPE = 'storage_reconcile'
+TYPES = ('orphaned_files', 'missing_files')
+# 并行扫描的线程数
+SCAN_WORKERS = int(os.getenv('RECONCILE_WORKERS', 4))
+# 每批读取/删除的数量
+BATCH_SIZE = int(os.getenv('RECONCILE_BATCH_SIZE', 500))
+# 修改时间在此秒数内的磁盘文件不视为孤立文件
+GRACE_SECONDS = int(os.getenv('RECONCILE_GRACE_SECONDS', 600))
+# 报告中列出的示例项目数
+SAMPLE_SIZE = 100
+THUMBNAIL_PREFIX = 'thumb_'
+
+def _norm(path):
+    return os.path.normpath(path)
+
+def load_references():
+    """流式读取全部文件记录，返回 (被引用的路径集合, {主文件路径: (记录ID, 大小)})"""
+    referenced = set()
+    primaries = {}
+    rows = db.session.query(File.id, File.path, File.thumbnail_path, File.size).execution_options(
+        yield_per=BATCH_SIZE
+    )
+    for file_id, path, thumbnail_path, size in rows:
+        path = _norm(path)
+        referenced.add(path)
+        primaries[path] = (file_id, size or 0)
+        if thumbnail_path:
+            referenced.add(_norm(os.path.join(os.path.dirname(path), thumbnail_path)))
+    return referenced, primaries
+
+def _walk(directory):
+    """递归扫描目录，返回 [(路径, 大小, 修改时间)]"""
+    found = []
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        found.append((_norm(entry.path), stat.st_size, stat.st_mtime))
+        except OSError:
+            continue
+    return found
+
+def scan_storage(root=None, workers=SCAN_WORKERS):
+    """按一级子目录并行扫描上传目录，返回 {路径: (大小, 修改时间)}"""
+    root = root or storage.UPLOAD_ROOT
+    on_disk = {}
+    subdirs = []
+    try:
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    on_disk[_norm(entry.path)] = (stat.st_size, stat.st_mtime)
+    except OSError:
+        return on_disk
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        for found in pool.map(_walk, subdirs):
+            for path, size, mtime in found:
+                on_disk[path] = (size, mtime)
+    return on_disk
+
+def find_differences(types=TYPES):
+    """一次扫描计算孤立文件和缺失文件，返回 (孤立文件列表, 缺失记录列表)
+
+    孤立文件为 [(路径, 大小)]，缺失记录为 [(记录ID, 大小)]。
+    """
+    # 必须先读数据库再扫描磁盘，见模块说明
+    referenced, primaries = load_references()
+    on_disk = scan_storage()
+
+    orphans = []
+    if 'orphaned_files' in types:
+        cutoff = time.time() - GRACE_SECONDS
+        orphans = [(path, size) for path, (size, mtime) in on_disk.items()
+                   if path not in referenced and mtime < cutoff]
+    missing = []
+    if 'missing_files' in types:
+        missing = [record for path, record in primaries.items() if path not in on_disk]
+    return orphans, missing
+
+def _report(orphans, missing):
+    return {
+        'orphanedFiles': {
+            'count': len(orphans),
+            'size': sum(size for _, size in orphans),
+            'sample': [path for path, _ in orphans[:SAMPLE_SIZE]]
+        },
+        'missingFiles': {
+            'count': len(missing),
+            'size': sum(size for _, size in missing),
+            'sample': [file_id for file_id, _ in missing[:SAMPLE_SIZE]]
+        }
+    }
+
+def create_job(types=TYPES, dry_run=False, created_by=None):
+    """创建校对任务"""
+    types = [t for t in types if t in TYPES] or list(TYPES)
+    job = MaintenanceJob(job_type=JOB_TYPE, options={'types': types}, dry_run=dry_run,
+                         created_by=created_by)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def _scan(job):
+    """扫描阶段：生成报告，非试运行时写入待处理项目"""
+    job.status = 'scanning'
+    db.session.commit()
+
+    orphans, missing = find_differences(job.options['types'])
+    job.report = _report(orphans, missing)
+    if job.dry_run:
+        return
+
+    # 重新扫描时丢弃上次写入的项目
+    MaintenanceJobItem.query.filter_by(job_id=job.id).delete(synchronize_session=False)
+    items = [{'job_id': job.id, 'kind': 'orphan', 'ref': path, 'size': size} for path, size in orphans]
+    items += [{'job_id': job.id, 'kind': 'missing', 'ref': file_id, 'size': size} for file_id, size in missing]
+    for start in range(0, len(items), BATCH_SIZE):
+        db.session.execute(insert(MaintenanceJobItem), items[start:start + BATCH_SIZE])
+    job.total = len(items)
+    job.processed = 0
+    job.status = 'deleting'
+    db.session.commit()
+
+def _delete_orphans(items):
+    """删除一批孤立文件，删除前再次确认没有记录引用，返回 (删除的文件数, 释放的字节数)"""
+    names = set()
+    for item in items:
+        name = os.path.basename(item.ref)
+        names.add(name)
+        if name.startswith(THUMBNAIL_PREFIX):
+            names.add(name[len(THUMBNAIL_PREFIX):])
+    in_use = {name for (name,) in db.session.query(File.filename).filter(File.filename.in_(names))}
+
+    deleted = freed = 0
+    for item in items:
+        name = os.path.basename(item.ref)
+        if name in in_use or (name.startswith(THUMBNAIL_PREFIX) and name[len(THUMBNAIL_PREFIX):] in in_use):
+            continue
+        size = storage.remove_blob(item.ref)
+        if size is not None:
+            deleted += 1
+            freed += size
+    return deleted, freed
+
+def _delete_missing(items):
+    """删除一批缺失文件的记录，删除前再次确认文件确实不存在，返回 (删除的记录数, 记录的字节数)"""
+    files = File.query.filter(File.id.in_([item.ref for item in items])).all()
+    deleted = size = 0
+    for file in files:
+        if not os.path.exists(file.path):
+            db.session.delete(file)
+            deleted += 1
+            size += file.size or 0
+    return deleted, size
+
+def _add_deleted(job, section, count, size):
+    """把实际删除的数量累加到报告中（JSON 列需要整体赋值才会保存）"""
+    report = dict(job.report or {})
+    entry = dict(report.get(section) or {})
+    entry['deleted'] = entry.get('deleted', 0) + count
+    entry['deletedSize'] = entry.get('deletedSize', 0) + size
+    report[section] = entry
+    job.report = report
+
+def _process_items(job):
+    """删除阶段：按批处理未完成的项目，每批提交一次"""
+    while True:
+        items = MaintenanceJobItem.query.filter_by(job_id=job.id, done=False).order_by(
+            MaintenanceJobItem.id
+        ).limit(BATCH_SIZE).all()
+        if not items:
+            break
+
+        orphans = [item for item in items if item.kind == 'orphan']
+        missing = [item for item in items if item.kind == 'missing']
+        if orphans:
+            deleted, freed = _delete_orphans(orphans)
+            job.freed_bytes = (job.freed_bytes or 0) + freed
+            _add_deleted(job, 'orphanedFiles', deleted, freed)
+        if missing:
+            _add_deleted(job, 'missingFiles', *_delete_missing(missing))
+
+        MaintenanceJobItem.query.filter(MaintenanceJobItem.id.in_([item.id for item in items])).update(
+            {'done': True}, synchronize_session=False
+        )
+        job.processed = (job.processed or 0) + len(items)
+        db.session.commit()
+
+def run_job(job_id):
+    """执行（或继续执行）校对任务"""
+    job = db.session.get(MaintenanceJob, job_id)
+    if job is None:
+        return None
+    try:
+        if job.status in ('pending', 'scanning'):
+            _scan(job)
+        if not job.dry_run:
+            _process_items(job)
+        job.status = 'completed'
+        job.finished_at = datetime.now()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(MaintenanceJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+        db.session.commit()
+    return job
+
+def start_job(app, job_id):
+    """在后台线程中执行任务，任务已在本进程中运行时返回 False"""
+    return jobs.start(app, job_id, run_job)
+
+def prepare_resume(job):
+    """把中断或失败的任务恢复到可继续执行的状态，任务正在本进程运行时返回 False"""
+    if jobs.is_running(job.id):
+        return False
+    if job.status == 'completed':
+        return False
+    has_items = db.session.query(MaintenanceJobItem.id).filter_by(job_id=job.id).first() is not None
+    job.status = 'deleting' if has_items and not job.dry_run else 'pending'
+    job.error = None
+    db.session.commit()
+    return True
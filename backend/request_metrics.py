@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求指标
+
+按蓝图、路由模板和方法统计请求数、状态码、耗时直方图、请求/响应字节数和
+进行中的请求数，以 Prometheus 文本格式从 /metrics 输出。
+
+多进程部署（gunicorn 多个工作进程）时，每个工作进程在内存中累加，由后台线程
+每隔 METRICS_FLUSH_INTERVAL 秒把本进程的数据写到 METRICS_DIR/worker_<pid>.json；
+抓取时合并目录中所有进程的文件。已退出进程的计数并入 archived.json 保持单调递增，
+它们的进行中请求数则直接丢弃。
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+import psutil
+from flask import Response, g, request
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只有单进程开发服务器，不需要文件锁
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 多进程共享指标的目录，为空时只输出本进程的指标
+METRICS_DIR = os.getenv('METRICS_DIR', 'metrics')
+# 工作进程把内存中的指标写入文件的间隔（秒）
+FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+# 设置后 /metrics 需要 Authorization: Bearer <METRICS_TOKEN>
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# 耗时直方图的桶上限（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ARCHIVE_FILE = 'archived.json'
+
+# 指标名 -> (类型, 说明)
+METRICS = {
+    'http_requests_total': ('counter', '请求数'),
+    'http_request_duration_seconds': ('histogram', '请求耗时（秒）'),
+    'http_request_size_bytes_total': ('counter', '请求体字节数'),
+    'http_response_size_bytes_total': ('counter', '响应体字节数'),
+    'http_requests_in_progress': ('gauge', '进行中的请求数')
+}
+
+_lock = threading.Lock()
+# (指标名, 标签元组) -> 数值；直方图的值为 [各桶计数..., 总和, 次数]
+_values = {}
+_dirty = False
+_flusher_pid = None
+
+def _labels():
+    rule = request.url_rule
+    return (
+        ('blueprint', request.blueprint or ''),
+        ('route', rule.rule if rule is not None else 'unmatched'),
+        ('method', request.method)
+    )
+
+def _add(name, labels, amount):
+    key = (name, labels)
+    _values[key] = _values.get(key, 0) + amount
+
+def _observe(labels, seconds):
+    key = ('http_request_duration_seconds', labels)
+    histogram = _values.get(key)
+    if histogram is None:
+        histogram = _values[key] = [0] * (len(BUCKETS) + 3)
+    for index, bound in enumerate(BUCKETS):
+        if seconds <= bound:
+            histogram[index] += 1
+            break
+    else:
+        histogram[len(BUCKETS)] += 1
+    histogram[-2] += seconds
+    histogram[-1] += 1
+
+def _before_request():
+    global _dirty
+    _ensure_flusher()
+    g.metrics_labels = _labels()
+    g.metrics_started = time.perf_counter()
+    with _lock:
+        _add('http_requests_in_progress', g.metrics_labels[:2], 1)
+        _dirty = True
+
+def _after_request(response):
+    global _dirty
+    labels = g.get('metrics_labels')
+    if labels is None:
+        return response
+    elapsed = time.perf_counter() - g.metrics_started
+    with _lock:
+        _add('http_requests_total', labels + (('status', str(response.status_code)),), 1)
+        _observe(labels, elapsed)
+        _add('http_request_size_bytes_total', labels, request.content_length or 0)
+        _add('http_response_size_bytes_total', labels, response.content_length or 0)
+        _dirty = True
+    return response
+
+def _teardown_request(error=None):
+    global _dirty
+    labels = g.pop('metrics_labels', None)
+    if labels is None:
+        return
+    with _lock:
+        _add('http_requests_in_progress', labels[:2], -1)
+        _dirty = True
+
+def _encode(values):
+    return [[name, list(map(list, labels)), value] for (name, labels), value in values.items()]
+
+def _decode(rows):
+    return {(name, tuple(map(tuple, labels))): value for name, labels, value in rows}
+
+def _write_json(path, data):
+    partial = f'{path}.{os.getpid()}.tmp'
+    with open(partial, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(partial, path)
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def flush():
+    """把本进程的指标写入文件"""
+    global _dirty
+    if not METRICS_DIR:
+        return
+    with _lock:
+        if not _dirty:
+            return
+        data = {'pid': os.getpid(), 'values': _encode(_values)}
+        _dirty = False
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _write_json(os.path.join(METRICS_DIR, f'worker_{os.getpid()}.json'), data)
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logger.exception("写入请求指标失败: %s", e)
+
+def _ensure_flusher():
+    """当前进程中尚未启动写入线程时启动（fork 后的子进程需要重新启动）"""
+    global _flusher_pid, _values, _dirty
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _lock:
+        if _flusher_pid == pid:
+            return
+        if _flusher_pid is not None:
+            # fork 继承了父进程的计数，子进程从零开始
+            _values = {}
+            _dirty = False
+        _flusher_pid = pid
+    if METRICS_DIR:
+        threading.Thread(target=_flush_loop, daemon=True).start()
+
+def _merge(total, values, include_gauges=True):
+    for (name, labels), value in values.items():
+        if name == 'http_request_duration_seconds':
+            merged = total.setdefault((name, labels), [0] * len(value))
+            for index, item in enumerate(value):
+                merged[index] += item
+        elif include_gauges or METRICS[name][0] != 'gauge':
+            total[(name, labels)] = total.get((name, labels), 0) + value
+
+def _archive_dead_workers():
+    """把已退出进程的计数并入归档文件并删除其文件（加文件锁，避免多个进程同时归档）"""
+    with open(os.path.join(METRICS_DIR, '.lock'), 'w') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        dead = []
+        for name in os.listdir(METRICS_DIR):
+            if name.startswith('worker_') and name.endswith('.json'):
+                pid = int(name[len('worker_'):-len('.json')])
+                if not psutil.pid_exists(pid):
+                    dead.append(os.path.join(METRICS_DIR, name))
+        if not dead:
+            return
+
+        archive_path = os.path.join(METRICS_DIR, ARCHIVE_FILE)
+        archived = _decode((_read_json(archive_path) or {}).get('values', []))
+        for path in dead:
+            data = _read_json(path)
+            if data:
+                _merge(archived, _decode(data['values']), include_gauges=False)
+        _write_json(archive_path, {'values': _encode(archived)})
+        for path in dead:
+            os.remove(path)
+
+def collect():
+    """合并所有工作进程的指标，本进程使用内存中的最新值"""
+    total = {}
+    with _lock:
+        _merge(total, _values)
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return total
+
+    _archive_dead_workers()
+    own_file = f'worker_{os.getpid()}.json'
+    for name in os.listdir(METRICS_DIR):
+        if name == own_file or not name.endswith('.json'):
+            continue
+        data = _read_json(os.path.join(METRICS_DIR, name))
+        if data:
+            _merge(total, _decode(data['values']))
+    return total
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + '}'
+
+def render(values):
+    """按 Prometheus 文本格式输出"""
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        samples = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in samples:
+            if metric_type == 'histogram':
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {value[-2]}')
+                lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(render(collect()), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def init_app(app):
+    """注册请求钩子和 /metrics 接口"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
+    atexit.register(flush)
@@ -1,11 +1,19 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt, get_jwt_identity
 import re
+from sqlalchemy import update
+from datetime import datetime
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models import db, User, generate_user_code
+import identity_cache
+import token_revocation
+import password_hashing
+from password_hashing import PasswordHashingBusy
+import logging
+
+logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -20,6 +28,13 @@ def validate_password(password):
         return False, "密码长度至少6位"
     return True, ""
 
+def busy_response():
+    """密码哈希任务已满时返回 503，提示客户端稍后重试"""
+    return jsonify({
+        'success': False,
+        'error': '服务器繁忙，请稍后重试'
+    }), 503, {'Retry-After': str(password_hashing.RETRY_AFTER)}
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """用户登录"""
@@ -41,14 +56,25 @@ def login():
         else:
             user = User.query.filter_by(username=username).first()
             
-        if not user or not check_password_hash(user.password_hash, password):
+        if not user or not password_hashing.verify_password(user.password_hash, password):
             return jsonify({
                 'success': False,
                 'error': '用户名或密码错误'
             }), 401
         
+        # 哈希参数调整后，用户登录时按新参数重新计算
+        if password_hashing.needs_rehash(user.password_hash):
+            try:
+                # 直接更新列，不经过 ORM 的修改记录，避免被当作修改密码而使该用户的其它令牌失效
+                db.session.execute(update(User).where(User.id == user.id).values(
+                    password_hash=password_hashing.hash_password(password)
+                ))
+                db.session.commit()
+            except PasswordHashingBusy:
+                pass
+        
         # 创建访问令牌
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(identity=user.id, additional_claims=identity_cache.token_claims(user))
         
         return jsonify({
             'success': True,
@@ -58,6 +84,8 @@ def login():
             }
         })
         
+    except PasswordHashingBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({
             'success': False,
@@ -117,7 +145,7 @@ def register():
         user = User(
             username=username,
             email=email,
-            password_hash=generate_password_hash(password),
+            password_hash=password_hashing.hash_password(password),
             user_code=user_code
         )
         
@@ -125,7 +153,7 @@ def register():
         db.session.commit()
         
         # 创建访问令牌
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(identity=user.id, additional_claims=identity_cache.token_claims(user))
         
         return jsonify({
             'success': True,
@@ -135,6 +163,29 @@ def register():
             }
         }), 201
         
+    except PasswordHashingBusy:
+        return busy_response()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    """退出登录：注销当前令牌"""
+    try:
+        claims = get_jwt()
+        token_revocation.revoke(claims['jti'], claims['sub'], datetime.fromtimestamp(claims['exp']))
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': '已退出登录'
+        })
+        
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -184,7 +235,7 @@ def get_current_user():
             }), 404
         
         user_data = user.to_dict()
-        print(f"[DEBUG] /api/auth/me 返回用户数据: {user_data}")
+        logger.debug("/api/auth/me 返回用户数据: %s", user_data)
         
         return jsonify({
             'success': True,
@@ -287,7 +338,7 @@ def change_password():
             }), 400
         
         # 验证旧密码
-        if not check_password_hash(user.password_hash, old_password):
+        if not password_hashing.verify_password(user.password_hash, old_password):
             return jsonify({
                 'success': False,
                 'error': '旧密码错误'
@@ -301,15 +352,20 @@ def change_password():
                 'error': error_msg
             }), 400
         
-        # 更新密码
-        user.password_hash = generate_password_hash(new_password)
+        # 更新密码（提交时令牌版本号递增，之前签发的令牌全部失效）
+        user.password_hash = password_hashing.hash_password(new_password)
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'message': '密码修改成功'
+            'message': '密码修改成功',
+            'data': {
+                'token': create_access_token(identity=user.id, additional_claims=identity_cache.token_claims(user))
+            }
         })
         
+    except PasswordHashingBusy:
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({
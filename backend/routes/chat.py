@@ -3,61 +3,155 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from models import db, User, Friendship, ChatMessage, File
+from models import db, User, Friendship, ChatMessage, ConversationState, File
 from utils import jwt_required_with_user
-from sqlalchemy import or_, and_, desc
+import push
+import conversation_state
+import chat_search
+from sqlalchemy import or_, and_, desc, case, func, select, tuple_, union, union_all
+from sqlalchemy.orm import aliased
+from datetime import datetime
 
 chat_bp = Blueprint('chat', __name__)
 
+# 消息列表的返回格式：compact 中消息只带用户和文件的 ID，响应另附去重后的 users / files 字典；
+# full 为旧格式，每条消息内嵌 sender / receiver / file。迁移期间可用 ?format=full 取得旧格式
+PAYLOAD_FORMAT = os.getenv('CHAT_PAYLOAD_FORMAT', 'compact')
+
+def _compact_payload():
+    return request.args.get('format', PAYLOAD_FORMAT) != 'full'
+
+def _side_load(messages):
+    """用两条 IN 查询加载消息引用的所有用户和文件，返回 ({用户ID: 用户}, {文件ID: 文件})
+
+    加载的对象进入会话的标识映射，旧格式中 message.sender / receiver / file 也不再逐条查询。
+    """
+    user_ids = {message.sender_id for message in messages} | {message.receiver_id for message in messages}
+    file_ids = {message.file_id for message in messages if message.file_id}
+    users = {user.id: user for user in User.query.filter(User.id.in_(user_ids))} if user_ids else {}
+    files = {file.id: file for file in File.query.filter(File.id.in_(file_ids))} if file_ids else {}
+    return users, files
+
+def _conversation_query(user_id):
+    """一次查询取得所有好友、与每个好友的最后一条消息（及其文件）、未读消息数和双方的已读水位"""
+    friends = union(
+        select(Friendship.friend_id.label('other_id')).where(
+            Friendship.user_id == user_id, Friendship.status == 'accepted'
+        ),
+        select(Friendship.user_id.label('other_id')).where(
+            Friendship.friend_id == user_id, Friendship.status == 'accepted'
+        )
+    ).subquery('friends')
+    
+    # 会话键为对方的用户ID，每个会话内按时间倒序编号，编号 1 即最后一条消息
+    other_id = case((ChatMessage.sender_id == user_id, ChatMessage.receiver_id), else_=ChatMessage.sender_id)
+    ranked = select(
+        ChatMessage,
+        other_id.label('other_id'),
+        func.row_number().over(
+            partition_by=other_id,
+            order_by=(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        ).label('rn')
+    ).where(
+        or_(ChatMessage.sender_id == user_id, ChatMessage.receiver_id == user_id)
+    ).subquery('ranked')
+    last_message = aliased(ChatMessage, ranked)
+    
+    # 自己的会话状态提供未读数和已读水位，对方的状态提供对方的已读水位
+    mine = aliased(ConversationState)
+    theirs = aliased(ConversationState)
+    
+    return select(
+        User, last_message, File, func.coalesce(mine.unread_count, 0), mine.last_read_at, theirs.last_read_at
+    ).select_from(friends).join(
+        User, User.id == friends.c.other_id
+    ).outerjoin(
+        last_message, and_(ranked.c.other_id == friends.c.other_id, ranked.c.rn == 1)
+    ).outerjoin(
+        File, File.id == last_message.file_id
+    ).outerjoin(
+        mine, and_(mine.user_id == user_id, mine.peer_id == friends.c.other_id)
+    ).outerjoin(
+        theirs, and_(theirs.user_id == friends.c.other_id, theirs.peer_id == user_id)
+    ).order_by(ranked.c.created_at.is_(None), ranked.c.created_at.desc())
+
+def _history_page(user_id, friend_id, cursor, newer, limit):
+    """按 (created_at, id) 游标取一页聊天记录，返回 (按时间倒序的消息列表, 是否还有更多)
+
+    newer 为 False 时取游标之前（更早）的消息，为 True 时取游标之后的消息；没有游标时取最新的消息。
+    会话的两个方向各自在 idx_chat_messages_pair_created_id 上做范围扫描并取 limit + 1 条，
+    UNION ALL 之后再排序截断，不需要 COUNT 和 OFFSET，新消息到达也不会使已加载的页错位。
+    """
+    order = (lambda column: column.asc()) if newer else (lambda column: column.desc())
+    
+    def direction(sender_id, receiver_id):
+        query = select(ChatMessage).where(
+            ChatMessage.sender_id == sender_id, ChatMessage.receiver_id == receiver_id
+        )
+        if cursor is not None:
+            position = tuple_(ChatMessage.created_at, ChatMessage.id)
+            bound = tuple_(cursor.created_at, cursor.id)
+            query = query.where(position > bound if newer else position < bound)
+        return select(query.order_by(order(ChatMessage.created_at), order(ChatMessage.id)).limit(limit + 1).subquery())
+    
+    combined = union_all(direction(user_id, friend_id), direction(friend_id, user_id)).subquery('history')
+    message = aliased(ChatMessage, combined)
+    messages = db.session.scalars(
+        select(message).order_by(order(combined.c.created_at), order(combined.c.id)).limit(limit + 1)
+    ).all()
+    
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if newer:
+        messages.reverse()
+    return messages, has_more
+
 @chat_bp.route('/conversations', methods=['GET'])
 @jwt_required_with_user
 def get_conversations(current_user):
-    """获取聊天会话列表"""
+    """获取聊天会话列表（按最后消息时间排序）
+
+    好友、最后一条消息、消息附带的文件和未读数由一次查询取得，语句数与好友数量无关。
+    消息的收发双方和文件都已在会话的标识映射中，序列化时不会再触发查询。
+    compact 格式下好友和文件放在 users / files 字典中，会话只引用其 ID。
+    """
     try:
-        # 获取所有好友
-        friendships = Friendship.query.filter(
-            or_(
-                and_(Friendship.user_id == current_user.id, Friendship.status == 'accepted'),
-                and_(Friendship.friend_id == current_user.id, Friendship.status == 'accepted')
-            )
-        ).all()
+        compact = _compact_payload()
+        me = db.session.get(User, current_user.id)
+        rows = db.session.execute(_conversation_query(current_user.id)).all()
         
         conversations = []
-        for friendship in friendships:
-            # 确定好友用户
-            if friendship.user_id == current_user.id:
-                friend_user = friendship.friend
-            else:
-                friend_user = friendship.user
-            
-            # 获取最后一条消息
-            last_message = ChatMessage.query.filter(
-                or_(
-                    and_(ChatMessage.sender_id == current_user.id, ChatMessage.receiver_id == friend_user.id),
-                    and_(ChatMessage.sender_id == friend_user.id, ChatMessage.receiver_id == current_user.id)
-                )
-            ).order_by(desc(ChatMessage.created_at)).first()
-            
-            # 获取未读消息数量
-            unread_count = ChatMessage.query.filter_by(
-                sender_id=friend_user.id,
-                receiver_id=current_user.id,
-                is_read=False
-            ).count()
-            
-            conversations.append({
+        users = {me.id: me.to_dict()}
+        files = {}
+        for friend_user, last_message, file, unread_count, my_read_at, their_read_at in rows:
+            if last_message is not None:
+                read_at = my_read_at if last_message.receiver_id == current_user.id else their_read_at
+            conversation = {
                 'friendId': friend_user.id,
-                'friend': friend_user.to_dict(),
-                'lastMessage': last_message.to_dict() if last_message else None,
+                'lastMessage': last_message.to_dict(read_at=read_at, compact=compact) if last_message else None,
                 'unreadCount': unread_count
-            })
+            }
+            if compact:
+                users[friend_user.id] = friend_user.to_dict()
+                if file is not None:
+                    files[file.id] = file.to_dict()
+            else:
+                conversation['friend'] = friend_user.to_dict()
+            conversations.append(conversation)
         
-        # 按最后消息时间排序
-        conversations.sort(key=lambda x: x['lastMessage']['createdAt'] if x['lastMessage'] else '', reverse=True)
+        if not compact:
+            return jsonify({
+                'success': True,
+                'data': conversations
+            })
         
         return jsonify({
             'success': True,
-            'data': conversations
+            'data': {
+                'conversations': conversations,
+                'users': users,
+                'files': files
+            }
         })
         
     except Exception as e:
@@ -69,7 +163,12 @@ def get_conversations(current_user):
 @chat_bp.route('/messages/<friend_id>', methods=['GET'])
 @jwt_required_with_user
 def get_messages(current_user, friend_id):
-    """获取与指定好友的聊天记录"""
+    """获取与指定好友的聊天记录（按时间倒序）
+
+    ?before=<消息ID> 加载该消息之前的更早消息，?after=<消息ID> 拉取该消息之后的新消息，
+    都不传时返回最新的一页；每页条数由 limit（或 per_page）指定。传 page 时仍按旧的页码分页。
+    compact 格式下消息只引用用户和文件的 ID，另附 users / files 字典（由 _side_load 批量加载）。
+    """
     try:
         # 验证是否为好友关系
         friendship = Friendship.query.filter(
@@ -86,40 +185,82 @@ def get_messages(current_user, friend_id):
                 'error': '非好友关系，无法查看聊天记录'
             }), 403
         
-        # 获取分页参数
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
+        # 已读水位取查询之前的时间，查询之后才到达的消息不会被标为已读
+        read_at = datetime.now()
         
-        # 获取聊天记录
-        messages = ChatMessage.query.filter(
-            or_(
-                and_(ChatMessage.sender_id == current_user.id, ChatMessage.receiver_id == friend_id),
-                and_(ChatMessage.sender_id == friend_id, ChatMessage.receiver_id == current_user.id)
+        # 传入 page 时按旧方式分页（带 COUNT 和 OFFSET），否则按游标分页
+        legacy = 'page' in request.args and not ('before' in request.args or 'after' in request.args)
+        per_page = min(max(request.args.get('limit', request.args.get('per_page', 50, type=int), type=int), 1), 200)
+        
+        if legacy:
+            page = request.args.get('page', 1, type=int)
+            result = ChatMessage.query.filter(
+                or_(
+                    and_(ChatMessage.sender_id == current_user.id, ChatMessage.receiver_id == friend_id),
+                    and_(ChatMessage.sender_id == friend_id, ChatMessage.receiver_id == current_user.id)
+                )
+            ).order_by(desc(ChatMessage.created_at), desc(ChatMessage.id)).paginate(
+                page=page, per_page=per_page, error_out=False
             )
-        ).order_by(desc(ChatMessage.created_at)).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+            messages = result.items
+            is_latest = page == 1
+            pagination = {
+                'page': result.page,
+                'pages': result.pages,
+                'per_page': result.per_page,
+                'total': result.total,
+                'has_next': result.has_next,
+                'has_prev': result.has_prev
+            }
+        else:
+            before_id = request.args.get('before')
+            after_id = request.args.get('after')
+            cursor = None
+            if before_id or after_id:
+                cursor = ChatMessage.query.filter(
+                    ChatMessage.id == (after_id or before_id),
+                    or_(
+                        and_(ChatMessage.sender_id == current_user.id, ChatMessage.receiver_id == friend_id),
+                        and_(ChatMessage.sender_id == friend_id, ChatMessage.receiver_id == current_user.id)
+                    )
+                ).first()
+                if not cursor:
+                    return jsonify({
+                        'success': False,
+                        'error': '游标消息不存在'
+                    }), 400
+            
+            messages, has_more = _history_page(current_user.id, friend_id, cursor, bool(after_id), per_page)
+            # 没有 before 游标时返回的是最新的消息（after 只返回游标之后的 per_page 条）
+            is_latest = not before_id
+            pagination = {
+                'per_page': per_page,
+                'has_more': has_more,
+                # 加载更早的消息时作为 before，拉取新消息时作为 after
+                'before': messages[-1].id if messages else before_id,
+                'after': messages[0].id if messages else after_id
+            }
         
-        # 标记消息为已读
-        ChatMessage.query.filter_by(
-            sender_id=friend_id,
-            receiver_id=current_user.id,
-            is_read=False
-        ).update({'is_read': True})
+        # 打开会话即已读：推进自己的已读水位并重新统计未读数（一行 upsert）
+        watermarks = conversation_state.read_watermarks(current_user.id, friend_id)
+        newest_id = messages[0].id if is_latest and messages else None
+        conversation_state.mark_read(db.session.connection(), current_user.id, friend_id, newest_id, read_at)
+        watermarks[current_user.id] = read_at
+        
+        compact = _compact_payload()
+        users, files = _side_load(messages)
+        items = [msg.to_dict(read_at=watermarks.get(msg.receiver_id), compact=compact) for msg in messages]
+        payload = {'messages': items}
+        if compact:
+            payload['users'] = {user_id: user.to_dict() for user_id, user in users.items()}
+            payload['files'] = {file_id: file.to_dict() for file_id, file in files.items()}
         db.session.commit()
         
         return jsonify({
             'success': True,
             'data': {
-                'messages': [msg.to_dict() for msg in messages.items],
-                'pagination': {
-                    'page': messages.page,
-                    'pages': messages.pages,
-                    'per_page': messages.per_page,
-                    'total': messages.total,
-                    'has_next': messages.has_next,
-                    'has_prev': messages.has_prev
-                }
+                **payload,
+                'pagination': pagination
             }
         })
         
@@ -181,11 +322,19 @@ def send_message(current_user):
         )
         
         db.session.add(message)
+        db.session.flush()
+        conversation_state.record_message(db.session.connection(), current_user.id, receiver_id,
+                                           message.created_at)
+        chat_search.index_message(db.session.connection(), message.id)
         db.session.commit()
         
+        data = message.to_dict()
+        # 推送给接收者，以及发送者在其它页面/设备上的连接
+        push.publish([receiver_id, current_user.id], 'chat_message', data)
+        
         return jsonify({
             'success': True,
-            'data': message.to_dict()
+            'data': data
         }), 201
         
     except Exception as e:
@@ -211,7 +360,7 @@ def mark_message_read(current_user, message_id):
                 'error': '消息不存在'
             }), 404
         
-        message.is_read = True
+        conversation_state.mark_read_until(db.session.connection(), message)
         db.session.commit()
         
         return jsonify({
@@ -231,10 +380,7 @@ def mark_message_read(current_user, message_id):
 def get_unread_count(current_user):
     """获取未读消息总数"""
     try:
-        unread_count = ChatMessage.query.filter_by(
-            receiver_id=current_user.id,
-            is_read=False
-        ).count()
+        unread_count = conversation_state.total_unread(current_user.id)
         
         return jsonify({
             'success': True,
@@ -247,4 +393,59 @@ def get_unread_count(current_user):
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@chat_bp.route('/search', methods=['GET'])
+@jwt_required_with_user
+def search_messages(current_user):
+    """全文搜索聊天记录
+
+    q 为搜索词（空白分隔的多个词须全部命中），friendId 限定为与某个好友的会话，
+    cursor 为上一页返回的 nextCursor。结果按相关度排序，highlight / fileNameHighlight
+    为转义后的 HTML，命中片段用 <mark> 标出。
+    """
+    try:
+        query_text = request.args.get('q', '').strip()
+        if not query_text:
+            return jsonify({
+                'success': False,
+                'error': '搜索词不能为空'
+            }), 400
+        
+        friend_id = request.args.get('friendId') or None
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+        try:
+            rows, next_cursor = chat_search.search(
+                current_user.id, query_text, friend_id, limit, request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        compact = _compact_payload()
+        messages = [row[0] for row in rows]
+        users, files = _side_load(messages)
+        results = [{
+            'message': message.to_dict(compact=compact),
+            'score': -score if score is not None else None,
+            'highlight': chat_search.render_highlight(content_highlight),
+            'fileNameHighlight': chat_search.render_highlight(file_name_highlight)
+        } for message, score, content_highlight, file_name_highlight in rows]
+        payload = {'results': results}
+        if compact:
+            payload['users'] = {user_id: user.to_dict() for user_id, user in users.items()}
+            payload['files'] = {file_id: file.to_dict() for file_id, file in files.items()}
+        
+        return jsonify({
+            'success': True,
+            'data': payload,
+            'nextCursor': next_cursor
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
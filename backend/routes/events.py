@@ -0,0 +1,61 @@
+from flask import Blueprint, Response, g, stream_with_context
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models import db
+from utils import jwt_required_with_user
+import push
+import identity_cache
+import token_revocation
+
+events_bp = Blueprint('events', __name__)
+
+@events_bp.route('/stream', methods=['GET'])
+@jwt_required_with_user
+def stream_events(current_user):
+    """推送事件流（Server-Sent Events）
+
+    EventSource 不能设置请求头，令牌通过 ?token= 传入。连接建立后释放数据库会话，
+    避免长连接占用连接池；每次心跳时重新检查令牌是否已注销或版本号已过期，
+    令牌过期时关闭连接，之后客户端需要用新令牌重新连接。
+    """
+    user_id = current_user.id
+    claims = g.jwt_claims
+    expires_at = claims.get('exp')
+    db.session.remove()
+
+    def token_valid():
+        """令牌仍然有效（检查可能访问数据库，检查后释放会话）"""
+        try:
+            return not (token_revocation.is_revoked(claims['jti'])
+                        or identity_cache.is_outdated(user_id, claims))
+        finally:
+            db.session.remove()
+
+    def generate():
+        subscription = push.subscribe(user_id)
+        try:
+            # 断线后客户端 3 秒后重连
+            yield 'retry: 3000\n\n'
+            next_heartbeat = time.time() + push.HEARTBEAT
+            while not subscription.overflowed:
+                deadline = next_heartbeat if expires_at is None else min(next_heartbeat, expires_at)
+                event = subscription.get(timeout=max(deadline - time.time(), 0))
+                if event is not None:
+                    yield push.format_event(event)
+                now = time.time()
+                if expires_at is not None and now >= expires_at:
+                    break
+                if now >= next_heartbeat:
+                    if not token_valid():
+                        break
+                    yield ': ping\n\n'
+                    next_heartbeat = now + push.HEARTBEAT
+        finally:
+            push.unsubscribe(subscription)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
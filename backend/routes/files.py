@@ -10,10 +10,13 @@ import io
 import base64
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from models import db, File, Folder, TrashItem
-from utils import (jwt_required_with_user, allowed_file, get_file_type, 
+from sqlalchemy import func, select, exists, and_
+from models import db, File, Folder, TrashItem, Tag, file_tags, normalize_tags
+from utils import (jwt_required_with_user, signed_url_or_jwt, allowed_file, get_file_type, 
                    get_file_size_str, generate_file_hash, create_thumbnail, 
                    validate_folder_path, safe_filename, get_mime_type)
+import search_index
+import storage
 
 files_bp = Blueprint('files', __name__)
 
@@ -61,6 +64,10 @@ def create_thumbnail(file_path, thumbnail_path, size=(200, 200)):
     except Exception:
         return False
 
+def _find_file(current_user, file_id):
+    """按ID查找当前用户的文件（通过签名链接访问时 current_user 为签发链接的用户）"""
+    return File.query.filter_by(id=file_id, user_id=current_user.id).first()
+
 @files_bp.route('', methods=['GET'])
 @jwt_required_with_user
 def get_files(current_user):
@@ -86,7 +93,7 @@ def get_files(current_user):
         
         return jsonify({
             'success': True,
-            'data': [file.to_dict() for file in files]
+            'data': [file.to_dict(signed_urls=True) for file in files]
         })
         
     except Exception as e:
@@ -111,7 +118,7 @@ def get_file(current_user, file_id):
         
         return jsonify({
             'success': True,
-            'data': file.to_dict()
+            'data': file.to_dict(signed_urls=True)
         })
         
     except Exception as e:
@@ -188,16 +195,12 @@ def upload_file(current_user):
         file_extension = os.path.splitext(original_filename)[1]
         safe_filename = str(uuid.uuid4()) + file_extension
         
-        # 确保上传目录存在
+        # 保存文件（存储层负责创建目录并登记磁盘占用）
         upload_dir = os.path.join('uploads', user_id)
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # 保存文件
         file_path = os.path.join(upload_dir, safe_filename)
-        file.save(file_path)
+        file_size = storage.save_upload(file, file_path)
         
         # 获取文件信息
-        file_size = os.path.getsize(file_path)
         mime_type, _ = mimetypes.guess_type(original_filename)
         if not mime_type:
             mime_type = 'application/octet-stream'
@@ -210,6 +213,7 @@ def upload_file(current_user):
             thumbnail_filename = f"thumb_{safe_filename}"
             thumbnail_path = os.path.join(upload_dir, thumbnail_filename)
             if create_thumbnail(file_path, thumbnail_path):
+                storage.track_write(thumbnail_path)
                 thumbnail_path = thumbnail_filename
             else:
                 thumbnail_path = None
@@ -269,13 +273,9 @@ def delete_file(current_user, file_id):
         db.session.add(trash_item)
         
         # 删除物理文件
-        try:
-            if os.path.exists(file.path):
-                os.remove(file.path)
-            if file.thumbnail_path and os.path.exists(os.path.join(os.path.dirname(file.path), file.thumbnail_path)):
-                os.remove(os.path.join(os.path.dirname(file.path), file.thumbnail_path))
-        except Exception:
-            pass  # 忽略文件删除错误
+        storage.remove_blob(file.path)
+        if file.thumbnail_path:
+            storage.remove_blob(os.path.join(os.path.dirname(file.path), file.thumbnail_path))
         
         db.session.delete(file)
         db.session.commit()
@@ -331,13 +331,9 @@ def delete_files(current_user):
             db.session.add(trash_item)
             
             # 删除物理文件
-            try:
-                if os.path.exists(file.path):
-                    os.remove(file.path)
-                if file.thumbnail_path and os.path.exists(os.path.join(os.path.dirname(file.path), file.thumbnail_path)):
-                    os.remove(os.path.join(os.path.dirname(file.path), file.thumbnail_path))
-            except Exception:
-                pass
+            storage.remove_blob(file.path)
+            if file.thumbnail_path:
+                storage.remove_blob(os.path.join(os.path.dirname(file.path), file.thumbnail_path))
             
             db.session.delete(file)
         
@@ -549,13 +545,11 @@ def move_files(current_user):
         }), 500
 
 @files_bp.route('/<file_id>/download', methods=['GET'])
-@jwt_required_with_user
+@signed_url_or_jwt
 def download_file(current_user, file_id):
     """下载文件"""
     try:
-        user_id = current_user.id
-        
-        file = File.query.filter_by(id=file_id, user_id=user_id).first()
+        file = _find_file(current_user, file_id)
         if not file:
             return jsonify({
                 'success': False,
@@ -582,13 +576,11 @@ def download_file(current_user, file_id):
         }), 500
 
 @files_bp.route('/<file_id>/preview', methods=['GET'])
-@jwt_required_with_user
+@signed_url_or_jwt
 def preview_file(current_user, file_id):
     """预览文件"""
     try:
-        user_id = current_user.id
-        
-        file = File.query.filter_by(id=file_id, user_id=user_id).first()
+        file = _find_file(current_user, file_id)
         if not file:
             return jsonify({
                 'success': False,
@@ -634,13 +626,11 @@ def preview_file(current_user, file_id):
         }), 500
 
 @files_bp.route('/<file_id>/thumbnail', methods=['GET'])
-@jwt_required_with_user
+@signed_url_or_jwt
 def get_thumbnail(current_user, file_id):
     """获取缩略图"""
     try:
-        user_id = current_user.id
-        
-        file = File.query.filter_by(id=file_id, user_id=user_id).first()
+        file = _find_file(current_user, file_id)
         if not file or not file.thumbnail_path:
             return jsonify({
                 'success': False,
@@ -679,11 +669,18 @@ def search_files(current_user):
         sort_order = request.args.get('sortOrder', 'desc')
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 20))
+        # 按相关度排序时使用模糊索引，可容忍拼写错误
+        fuzzy = request.args.get('fuzzy', 'false').lower() == 'true' or sort_by == 'relevance'
         
         # 构建查询
         query = File.query.filter_by(user_id=user_id)
         
-        if query_text:
+        scores = {}
+        if query_text and fuzzy:
+            matches = search_index.fuzzy_search(user_id, query_text, limit=500, kind='file')
+            scores = {match.id: match.score for match in matches}
+            query = query.filter(File.id.in_(list(scores)))
+        elif query_text:
             query = query.filter(File.name.contains(query_text))
         
         if file_type and file_type != 'all':
@@ -701,6 +698,40 @@ def search_files(current_user):
         if folder_id:
             query = query.filter_by(folder_id=folder_id)
         
+        # 按标签筛选，tagMode=all 要求包含全部标签，any 只需包含任一标签
+        tag_names = normalize_tags((request.args.get('tags') or '').split(','))
+        if tag_names:
+            tag_mode = request.args.get('tagMode', 'all')
+            tagged_files = db.session.query(file_tags.c.file_id).join(
+                Tag, Tag.id == file_tags.c.tag_id
+            ).filter(
+                Tag.user_id == user_id,
+                Tag.name.in_(tag_names)
+            ).group_by(file_tags.c.file_id)
+            if tag_mode != 'any':
+                tagged_files = tagged_files.having(
+                    func.count(file_tags.c.tag_id) == len(tag_names)
+                )
+            query = query.filter(File.id.in_(tagged_files))
+        
+        if scores:
+            # 模糊匹配结果最多 500 条，直接在内存中按相似度排序分页
+            ranked = sorted(query.all(), key=lambda f: (-scores[f.id], f.name))
+            page_files = ranked[(page - 1) * limit:page * limit]
+            results = []
+            for file in page_files:
+                file_data = file.to_dict(signed_urls=True)
+                file_data['score'] = scores[file.id]
+                results.append(file_data)
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'files': results,
+                    'total': len(ranked)
+                }
+            })
+        
         # 排序
         if sort_by == 'name':
             order_column = File.name
@@ -721,7 +752,7 @@ def search_files(current_user):
         return jsonify({
             'success': True,
             'data': {
-                'files': [file.to_dict() for file in files],
+                'files': [file.to_dict(signed_urls=True) for file in files],
                 'total': total
             }
         })
@@ -732,6 +763,196 @@ def search_files(current_user):
             'error': str(e)
         }), 500
 
+@files_bp.route('/suggest', methods=['GET'])
+@jwt_required_with_user
+def suggest_names(current_user):
+    """文件/文件夹名称输入联想"""
+    try:
+        prefix = request.args.get('query', '').strip()
+        limit = min(request.args.get('limit', 10, type=int), 50)
+        kind = request.args.get('kind')
+        
+        if not prefix:
+            return jsonify({
+                'success': True,
+                'data': []
+            })
+        
+        matches = search_index.suggest(
+            current_user.id, prefix, limit=limit,
+            kind=kind if kind in ('file', 'folder') else None
+        )
+        
+        return jsonify({
+            'success': True,
+            'data': [{
+                'id': match.id,
+                'kind': match.kind,
+                'name': match.name,
+                'parentId': match.parent_id,
+                'score': match.score
+            } for match in matches]
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@files_bp.route('/tags', methods=['GET'])
+@jwt_required_with_user
+def get_tag_cloud(current_user):
+    """获取标签云（每个标签关联的文件数）"""
+    try:
+        limit = request.args.get('limit', type=int)
+        
+        query = db.session.query(
+            Tag.name,
+            func.count(file_tags.c.file_id).label('count')
+        ).join(
+            file_tags, file_tags.c.tag_id == Tag.id
+        ).filter(
+            Tag.user_id == current_user.id
+        ).group_by(Tag.id, Tag.name).order_by(
+            func.count(file_tags.c.file_id).desc(), Tag.name
+        )
+        
+        if limit:
+            query = query.limit(limit)
+        
+        return jsonify({
+            'success': True,
+            'data': [{'name': row.name, 'count': row.count} for row in query.all()]
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@files_bp.route('/<file_id>/tags', methods=['PUT'])
+@jwt_required_with_user
+def update_file_tags(current_user, file_id):
+    """设置文件标签"""
+    try:
+        data = request.get_json() or {}
+        
+        file = File.query.filter_by(id=file_id, user_id=current_user.id).first()
+        if not file:
+            return jsonify({
+                'success': False,
+                'error': '文件不存在'
+            }), 404
+        
+        tags = data.get('tags')
+        if not isinstance(tags, list):
+            return jsonify({
+                'success': False,
+                'error': '标签必须是列表'
+            }), 400
+        
+        file.set_tags(tags)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'data': file.to_dict()
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@files_bp.route('/batch/tags', methods=['PUT'])
+@jwt_required_with_user
+def batch_update_tags(current_user):
+    """批量添加/移除标签"""
+    try:
+        user_id = current_user.id
+        data = request.get_json() or {}
+        
+        file_ids = data.get('ids', [])
+        add_names = normalize_tags(data.get('add'))
+        remove_names = normalize_tags(data.get('remove'))
+        
+        if not file_ids:
+            return jsonify({
+                'success': False,
+                'error': '没有指定要操作的文件'
+            }), 400
+        
+        if not add_names and not remove_names:
+            return jsonify({
+                'success': False,
+                'error': '没有指定要添加或移除的标签'
+            }), 400
+        
+        added = _bulk_add_tags(user_id, file_ids, add_names) if add_names else 0
+        removed = _bulk_remove_tags(user_id, file_ids, remove_names) if remove_names else 0
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'added': added,
+                'removed': removed
+            }
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _bulk_add_tags(user_id, file_ids, names):
+    """用一条 INSERT ... SELECT 为选中的文件添加标签，返回新增关联数"""
+    existing = {name for (name,) in db.session.query(Tag.name).filter(
+        Tag.user_id == user_id,
+        Tag.name.in_(names)
+    ).all()}
+    missing = [name for name in names if name not in existing]
+    if missing:
+        db.session.bulk_insert_mappings(Tag, [
+            {'id': str(uuid.uuid4()), 'user_id': user_id, 'name': name, 'created_at': datetime.now()}
+            for name in missing
+        ])
+    
+    linked = exists().where(and_(
+        file_tags.c.file_id == File.id,
+        file_tags.c.tag_id == Tag.id
+    ))
+    selection = select(File.id, Tag.id).join(
+        Tag, Tag.user_id == File.user_id
+    ).where(
+        File.id.in_(file_ids),
+        File.user_id == user_id,
+        Tag.name.in_(names),
+        ~linked
+    )
+    result = db.session.execute(
+        file_tags.insert().from_select(['file_id', 'tag_id'], selection)
+    )
+    return result.rowcount
+
+def _bulk_remove_tags(user_id, file_ids, names):
+    """用一条 DELETE 移除选中文件上的标签，返回删除的关联数"""
+    owned_files = select(File.id).where(File.id.in_(file_ids), File.user_id == user_id)
+    tag_ids = select(Tag.id).where(Tag.user_id == user_id, Tag.name.in_(names))
+    result = db.session.execute(
+        file_tags.delete().where(
+            file_tags.c.file_id.in_(owned_files),
+            file_tags.c.tag_id.in_(tag_ids)
+        )
+    )
+    return result.rowcount
+
 def _get_file_folder_path(file):
     """获取文件所在文件夹的完整路径"""
     folder = file.folder
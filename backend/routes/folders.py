@@ -7,6 +7,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models import db, Folder, File, TrashItem
 from utils import jwt_required_with_user, validate_folder_path
 from sqlalchemy import and_
+import logging
+
+logger = logging.getLogger(__name__)
 
 folders_bp = Blueprint('folders', __name__)
 
@@ -16,11 +19,11 @@ def get_folders(current_user):
     """获取用户的所有文件夹"""
     try:
         user_id = current_user.id
-        print(f"[DEBUG] 获取文件夹列表 - 用户ID: {user_id}")
+        logger.debug("获取文件夹列表 - 用户ID: %s", user_id)
         
         # 获取所有文件夹
         folders = Folder.query.filter_by(user_id=user_id).order_by(Folder.created_at).all()
-        print(f"[DEBUG] 查询到 {len(folders)} 个文件夹")
+        logger.debug("查询到 %s 个文件夹", len(folders))
         
         # 转换为字典格式，让前端构建树形结构
         folder_list = []
@@ -34,7 +37,7 @@ def get_folders(current_user):
                 'updatedAt': folder.updated_at.isoformat() if folder.updated_at else None
             }
             folder_list.append(folder_data)
-            print(f"[DEBUG] 文件夹: {folder.name}, ID: {folder.id}, 父ID: {folder.parent_id}")
+            logger.debug("文件夹: %s, ID: %s, 父ID: %s", folder.name, folder.id, folder.parent_id)
         
         return jsonify({
             'success': True,
@@ -42,7 +45,7 @@ def get_folders(current_user):
         })
         
     except Exception as e:
-        print(f"[ERROR] 获取文件夹列表失败: {str(e)}")
+        logger.error("获取文件夹列表失败: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -81,13 +84,13 @@ def create_folder(current_user):
         user_id = current_user.id
         data = request.get_json()
         
-        print(f"[DEBUG] 创建文件夹请求 - 用户ID: {user_id}, 数据: {data}")
+        logger.debug("创建文件夹请求 - 用户ID: %s, 数据: %s", user_id, data)
         
         name = data.get('name')
         parent_id = data.get('parentId')
         
         if not name:
-            print(f"[DEBUG] 文件夹名称为空")
+            logger.debug("文件夹名称为空")
             return jsonify({
                 'success': False,
                 'error': '文件夹名称不能为空'
@@ -108,10 +111,10 @@ def create_folder(current_user):
                 parent_id=parent_id, 
                 user_id=user_id
             ).first()
-            print(f"[DEBUG] 检查同级文件夹重复 - 名称: {name}, 父ID: {parent_id}, 用户ID: {user_id}")
-            print(f"[DEBUG] 查询结果: {existing}")
+            logger.debug("检查同级文件夹重复 - 名称: %s, 父ID: %s, 用户ID: %s", name, parent_id, user_id)
+            logger.debug("查询结果: %s", existing)
             if existing:
-                print(f"[DEBUG] 发现重复文件夹: ID={existing.id}, 名称={existing.name}")
+                logger.debug("发现重复文件夹: ID=%s, 名称=%s", existing.id, existing.name)
                 return jsonify({
                     'success': False,
                     'error': '同级目录下已存在同名文件夹'
@@ -143,12 +146,12 @@ def create_folder(current_user):
             is_parent=is_parent
         )
         
-        print(f"[DEBUG] 准备创建文件夹: {folder.name}, 父ID: {folder.parent_id}")
+        logger.debug("准备创建文件夹: %s, 父ID: %s", folder.name, folder.parent_id)
         
         db.session.add(folder)
         db.session.commit()
         
-        print(f"[DEBUG] 文件夹创建成功: ID={folder.id}, 名称={folder.name}")
+        logger.debug("文件夹创建成功: ID=%s, 名称=%s", folder.id, folder.name)
         
         return jsonify({
             'success': True,
@@ -156,7 +159,7 @@ def create_folder(current_user):
         }), 201
         
     except Exception as e:
-        print(f"[DEBUG] 创建文件夹异常: {str(e)}")
+        logger.error("创建文件夹异常: %s", e)
         db.session.rollback()
         return jsonify({
             'success': False,
@@ -171,7 +174,7 @@ def update_folder(current_user, folder_id):
         user_id = current_user.id
         data = request.get_json()
         
-        print(f"[DEBUG] 更新文件夹请求 - 用户ID: {user_id}, 文件夹ID: {folder_id}, 数据: {data}")
+        logger.debug("更新文件夹请求 - 用户ID: %s, 文件夹ID: %s, 数据: %s", user_id, folder_id, data)
         
         folder = Folder.query.filter_by(id=folder_id, user_id=user_id).first()
         if not folder:
@@ -211,7 +214,7 @@ def update_folder(current_user, folder_id):
         
         # 如果是移动文件夹
         elif 'parentId' in data:
-            print(f"[DEBUG] 移动文件夹 - 从 {folder.parent_id} 到 {parent_id}")
+            logger.debug("移动文件夹 - 从 %s 到 %s", folder.parent_id, parent_id)
             
             # 验证目标父文件夹
             if parent_id:
@@ -256,7 +259,7 @@ def update_folder(current_user, folder_id):
         folder.updated_at = datetime.utcnow()
         db.session.commit()
         
-        print(f"[DEBUG] 文件夹更新成功 - ID: {folder_id}")
+        logger.debug("文件夹更新成功 - ID: %s", folder_id)
         
         return jsonify({
             'success': True,
@@ -265,7 +268,7 @@ def update_folder(current_user, folder_id):
         
     except Exception as e:
         db.session.rollback()
-        print(f"[ERROR] 更新文件夹失败: {str(e)}")
+        logger.error("更新文件夹失败: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -2,10 +2,11 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import sys
 import os
-import shutil
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models import db, User, Friendship, FriendFileShare, File, Folder
 from utils import jwt_required_with_user
+import storage
+import push
 from sqlalchemy import or_, and_, desc
 
 friend_shares_bp = Blueprint('friend_shares', __name__)
@@ -75,9 +76,12 @@ def share_file_to_friend(current_user):
         db.session.add(file_share)
         db.session.commit()
         
+        data = file_share.to_dict()
+        push.publish(receiver_id, 'friend_share', data)
+        
         return jsonify({
             'success': True,
-            'data': file_share.to_dict()
+            'data': data
         }), 201
         
     except Exception as e:
@@ -291,12 +295,10 @@ def save_shared_file(current_user, share_id):
         import uuid
         new_filename = str(uuid.uuid4()) + os.path.splitext(original_file.filename)[1]
         user_upload_dir = os.path.join('uploads', current_user.id)
-        os.makedirs(user_upload_dir, exist_ok=True)
-        
         new_file_path = os.path.join(user_upload_dir, new_filename)
         
         try:
-            shutil.copy2(original_file.path, new_file_path)
+            storage.copy_blob(original_file.path, new_file_path)
         except Exception as copy_error:
             return jsonify({
                 'success': False,
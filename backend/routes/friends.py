@@ -5,7 +5,11 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models import db, User, Friendship, ChatMessage, FriendFileShare, File, Folder
 from utils import jwt_required_with_user
+import push
 from sqlalchemy import or_, and_
+import logging
+
+logger = logging.getLogger(__name__)
 
 friends_bp = Blueprint('friends', __name__)
 
@@ -74,17 +78,17 @@ def send_friend_request(current_user):
         data = request.get_json()
         friend_id = data.get('friendId')
         
-        print(f"[DEBUG] 发送好友请求 - 当前用户: {current_user.id}, 目标用户: {friend_id}")
+        logger.debug("发送好友请求 - 当前用户: %s, 目标用户: %s", current_user.id, friend_id)
         
         if not friend_id:
-            print(f"[DEBUG] 好友ID为空")
+            logger.debug("好友ID为空")
             return jsonify({
                 'success': False,
                 'error': '好友ID不能为空'
             }), 400
         
         if friend_id == current_user.id:
-            print(f"[DEBUG] 尝试添加自己为好友")
+            logger.debug("尝试添加自己为好友")
             return jsonify({
                 'success': False,
                 'error': '不能添加自己为好友'
@@ -93,13 +97,13 @@ def send_friend_request(current_user):
         # 检查目标用户是否存在
         target_user = User.query.get(friend_id)
         if not target_user:
-            print(f"[DEBUG] 目标用户不存在: {friend_id}")
+            logger.debug("目标用户不存在: %s", friend_id)
             return jsonify({
                 'success': False,
                 'error': '用户不存在'
             }), 404
         
-        print(f"[DEBUG] 目标用户存在: {target_user.username}")
+        logger.debug("目标用户存在: %s", target_user.username)
         
         # 检查是否已经存在好友关系
         existing_friendship = Friendship.query.filter(
@@ -110,7 +114,7 @@ def send_friend_request(current_user):
         ).first()
         
         if existing_friendship:
-            print(f"[DEBUG] 好友关系已存在 - ID: {existing_friendship.id}, 状态: {existing_friendship.status}")
+            logger.debug("好友关系已存在 - ID: %s, 状态: %s", existing_friendship.id, existing_friendship.status)
             if existing_friendship.status == 'pending':
                 error_msg = '好友关系已存在 - pending'
             elif existing_friendship.status == 'accepted':
@@ -123,7 +127,7 @@ def send_friend_request(current_user):
                 'error': error_msg
             }), 409
         
-        print(f"[DEBUG] 没有现有好友关系，创建新的好友请求")
+        logger.debug("没有现有好友关系，创建新的好友请求")
         
         # 创建好友请求
         friendship = Friendship(
@@ -135,9 +139,12 @@ def send_friend_request(current_user):
         db.session.add(friendship)
         db.session.commit()
         
+        data = friendship.to_dict()
+        push.publish(friend_id, 'friend_request', data)
+        
         return jsonify({
             'success': True,
-            'data': friendship.to_dict()
+            'data': data
         }), 201
         
     except Exception as e:
@@ -198,9 +205,12 @@ def accept_friend_request(current_user, request_id):
         friendship.status = 'accepted'
         db.session.commit()
         
+        data = friendship.to_dict()
+        push.publish(friendship.user_id, 'friend_request_accepted', data)
+        
         return jsonify({
             'success': True,
-            'data': friendship.to_dict()
+            'data': data
         })
         
     except Exception as e:
@@ -248,7 +258,7 @@ def reject_friend_request(current_user, request_id):
 def get_friends_list(current_user):
     """获取好友列表"""
     try:
-        print(f"[DEBUG] 获取好友列表 - 用户ID: {current_user.id}")
+        logger.debug("获取好友列表 - 用户ID: %s", current_user.id)
         
         # 获取所有已接受的好友关系
         friendships = Friendship.query.filter(
@@ -258,7 +268,7 @@ def get_friends_list(current_user):
             )
         ).all()
         
-        print(f"[DEBUG] 找到 {len(friendships)} 个好友关系")
+        logger.debug("找到 %s 个好友关系", len(friendships))
         
         friends = []
         for friendship in friendships:
@@ -274,14 +284,14 @@ def get_friends_list(current_user):
                         'friend': friend_user.to_dict(),
                         'createdAt': friendship.created_at.isoformat() if friendship.created_at else None
                     })
-                    print(f"[DEBUG] 添加好友: {friend_user.username}")
+                    logger.debug("添加好友: %s", friend_user.username)
                 else:
-                    print(f"[DEBUG] 警告: 好友用户对象为空, friendship_id: {friendship.id}")
+                    logger.warning("好友用户对象为空, friendship_id: %s", friendship.id)
             except Exception as friend_error:
-                print(f"[DEBUG] 处理好友关系时出错: {str(friend_error)}")
+                logger.error("处理好友关系时出错: %s", friend_error)
                 continue
         
-        print(f"[DEBUG] 最终返回 {len(friends)} 个好友")
+        logger.debug("最终返回 %s 个好友", len(friends))
         
         return jsonify({
             'success': True,
@@ -289,9 +299,7 @@ def get_friends_list(current_user):
         })
         
     except Exception as e:
-        print(f"[DEBUG] 获取好友列表失败: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("获取好友列表失败: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -7,6 +7,9 @@ import json
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models import db, User
 from utils import jwt_required_with_user
+import logging
+
+logger = logging.getLogger(__name__)
 
 settings_bp = Blueprint('settings', __name__)
 
@@ -110,7 +113,7 @@ def save_user_settings(user_id, settings):
             json.dump(settings, f, ensure_ascii=False, indent=2)
         return True
     except Exception as e:
-        print(f"保存设置失败: {e}")
+        logger.error("保存设置失败: %s", e)
         return False
 
 @settings_bp.route('', methods=['GET'])
@@ -12,6 +12,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models import db, User, File, PublicShare
 from utils import jwt_required_with_user, get_file_path, check_file_exists
+import storage
 
 shares_bp = Blueprint('shares', __name__, url_prefix='/shares')
 
@@ -813,15 +814,12 @@ def save_public_share_to_folder(current_user, token):
         
         # 复制文件到用户的上传目录
         import uuid
-        import shutil
         new_filename = str(uuid.uuid4()) + os.path.splitext(original_file.filename)[1]
         user_upload_dir = os.path.join('uploads', current_user.id)
-        os.makedirs(user_upload_dir, exist_ok=True)
-        
         new_file_path = os.path.join(user_upload_dir, new_filename)
         
         try:
-            shutil.copy2(original_file.path, new_file_path)
+            storage.copy_blob(original_file.path, new_file_path)
         except Exception as copy_error:
             return jsonify({
                 'success': False,
@@ -7,46 +7,118 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models import db, File, Folder, User
 from utils import jwt_required_with_user, get_file_size_str
+import rollups
+import stats_cache
 
 statistics_bp = Blueprint('statistics', __name__)
 
-@statistics_bp.route('', methods=['GET'])
-@jwt_required()
-def get_statistics():
-    """获取统计数据"""
+# 存储限制（这里设置为10GB，实际应该从配置或用户设置中获取）
+STORAGE_LIMIT = 10 * 1024 * 1024 * 1024  # 10GB
+
+def compute_dashboard(user_id, trend_days=30, activity_days=7, popular_limit=5):
+    """一次性计算统计页面的全部面板
+
+    按类型分组的一次聚合同时给出总数、总大小、类型分布和热门类型，
+    时间相关的面板全部读取活动汇总表。
+    """
+    now = datetime.now()
+    
+    # 按文件类型统计数量和大小
+    type_rows = db.session.query(
+        File.type,
+        func.count(File.id).label('count'),
+        func.sum(File.size).label('size')
+    ).filter(File.user_id == user_id).group_by(File.type).all()
+    
+    distribution = [{
+        'type': row.type,
+        'count': row.count,
+        'size': row.size or 0
+    } for row in type_rows]
+    total_files = sum(row['count'] for row in distribution)
+    total_size = sum(row['size'] for row in distribution)
+    popular_types = [{'type': row['type'], 'count': row['count']}
+                     for row in sorted(distribution, key=lambda row: -row['count'])[:popular_limit]]
+    
+    total_folders = db.session.query(func.count(Folder.id)).filter(Folder.user_id == user_id).scalar()
+    
+    # 最大文件和最新文件
+    largest_file = File.query.filter_by(user_id=user_id).order_by(File.size.desc()).first()
+    latest_file = File.query.filter_by(user_id=user_id).order_by(File.uploaded_at.desc()).first()
+    
+    # 最近7天上传的文件数
+    recent_uploads, _, _ = rollups.sum_activity(user_id, now - timedelta(days=7))
+    
+    # 上传趋势：从按天汇总表读取，每天最多一行
+    end_date = rollups.bucket_start(now, 'day')
+    start_date = end_date - timedelta(days=trend_days - 1)
+    buckets = rollups.query_buckets(user_id, 'day', start_date)
+    trend_data = []
+    current_date = start_date
+    while current_date <= end_date:
+        bucket = buckets.get(current_date)
+        trend_data.append({
+            'date': current_date.date().isoformat(),
+            'count': bucket.uploads if bucket else 0,
+            'size': bucket.upload_bytes if bucket else 0
+        })
+        current_date += timedelta(days=1)
+    
+    # 活动统计：期间内按小时汇总求和，以及最近24小时的小时序列
+    uploads, _, folders_created = rollups.sum_activity(user_id, now - timedelta(days=activity_days))
+    hourly_activity = rollups.hourly_series(user_id, hours=24, now=now)
+    
+    percentage = (total_size / STORAGE_LIMIT * 100) if STORAGE_LIMIT > 0 else 0
+    
+    return {
+        'statistics': {
+            'totalFiles': total_files,
+            'totalFolders': total_folders,
+            'totalSize': total_size,
+            'recentUploads': recent_uploads,
+            'storageUsed': total_size,
+            'storageLimit': STORAGE_LIMIT
+        },
+        'storage': {
+            'used': total_size,
+            'total': STORAGE_LIMIT,
+            'percentage': round(percentage, 2)
+        },
+        'fileTypes': distribution,
+        'uploadTrend': trend_data,
+        'popularTypes': popular_types,
+        'activity': {
+            'uploads': uploads,
+            'foldersCreated': folders_created,
+            'hourlyActivity': hourly_activity
+        },
+        'summary': {
+            'totalFiles': total_files,
+            'totalFolders': total_folders,
+            'totalSize': total_size,
+            'averageFileSize': total_size / total_files if total_files > 0 else 0,
+            'largestFile': largest_file.to_dict() if largest_file else None,
+            'latestFile': latest_file.to_dict() if latest_file else None
+        }
+    }
+
+def get_dashboard(user_id, trend_days=30, activity_days=7, popular_limit=5):
+    """读取缓存的统计面板；参数相同的请求共享同一份结果"""
+    params = (trend_days, activity_days, popular_limit)
+    return stats_cache.cached(
+        user_id, 'dashboard',
+        lambda: compute_dashboard(user_id, *params),
+        params=params
+    )
+
+def _panel_response(panel, **args):
+    """返回单个面板的接口响应，args 为 {参数名: (查询参数, 默认值)}"""
     try:
         user_id = get_jwt_identity()
-        
-        # 总文件数
-        total_files = File.query.filter_by(user_id=user_id).count()
-        
-        # 总文件夹数
-        total_folders = Folder.query.filter_by(user_id=user_id).count()
-        
-        # 总存储大小
-        total_size_result = db.session.query(func.sum(File.size)).filter_by(user_id=user_id).scalar()
-        total_size = total_size_result or 0
-        
-        # 最近7天上传的文件数
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        recent_uploads = File.query.filter(
-            File.user_id == user_id,
-            File.uploaded_at >= seven_days_ago
-        ).count()
-        
-        # 存储限制（这里设置为10GB，实际应该从配置或用户设置中获取）
-        storage_limit = 10 * 1024 * 1024 * 1024  # 10GB
-        
+        params = {name: int(request.args.get(arg, default)) for name, (arg, default) in args.items()}
         return jsonify({
             'success': True,
-            'data': {
-                'totalFiles': total_files,
-                'totalFolders': total_folders,
-                'totalSize': total_size,
-                'recentUploads': recent_uploads,
-                'storageUsed': total_size,
-                'storageLimit': storage_limit
-            }
+            'data': get_dashboard(user_id, **params)[panel]
         })
         
     except Exception as e:
@@ -55,30 +127,19 @@ def get_statistics():
             'error': str(e)
         }), 500
 
-@statistics_bp.route('/storage', methods=['GET'])
+@statistics_bp.route('/dashboard', methods=['GET'])
 @jwt_required()
-def get_storage_usage():
-    """获取存储使用情况"""
+def get_dashboard_statistics():
+    """一次返回统计页面的全部面板"""
     try:
         user_id = get_jwt_identity()
-        
-        # 计算已使用存储
-        used_result = db.session.query(func.sum(File.size)).filter_by(user_id=user_id).scalar()
-        used = used_result or 0
-        
-        # 存储限制（这里设置为10GB）
-        total = 10 * 1024 * 1024 * 1024  # 10GB
-        
-        # 计算使用百分比
-        percentage = (used / total * 100) if total > 0 else 0
+        trend_days = int(request.args.get('days', 30))
+        activity_days = int(request.args.get('activityDays', 7))
+        popular_limit = int(request.args.get('limit', 5))
         
         return jsonify({
             'success': True,
-            'data': {
-                'used': used,
-                'total': total,
-                'percentage': round(percentage, 2)
-            }
+            'data': get_dashboard(user_id, trend_days, activity_days, popular_limit)
         })
         
     except Exception as e:
@@ -87,88 +148,29 @@ def get_storage_usage():
             'error': str(e)
         }), 500
 
+@statistics_bp.route('', methods=['GET'])
+@jwt_required()
+def get_statistics():
+    """获取统计数据"""
+    return _panel_response('statistics')
+
+@statistics_bp.route('/storage', methods=['GET'])
+@jwt_required()
+def get_storage_usage():
+    """获取存储使用情况"""
+    return _panel_response('storage')
+
 @statistics_bp.route('/file-types', methods=['GET'])
 @jwt_required()
 def get_file_type_distribution():
     """获取文件类型分布"""
-    try:
-        user_id = get_jwt_identity()
-        
-        # 按文件类型统计数量和大小
-        results = db.session.query(
-            File.type,
-            func.count(File.id).label('count'),
-            func.sum(File.size).label('size')
-        ).filter_by(user_id=user_id).group_by(File.type).all()
-        
-        distribution = []
-        for result in results:
-            distribution.append({
-                'type': result.type,
-                'count': result.count,
-                'size': result.size or 0
-            })
-        
-        return jsonify({
-            'success': True,
-            'data': distribution
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return _panel_response('fileTypes')
 
 @statistics_bp.route('/upload-trend', methods=['GET'])
 @jwt_required()
 def get_upload_trend():
     """获取上传趋势"""
-    try:
-        user_id = get_jwt_identity()
-        days = int(request.args.get('days', 30))
-        
-        # 计算日期范围
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=days-1)
-        
-        # 按日期统计上传数量和大小
-        results = db.session.query(
-            func.date(File.uploaded_at).label('date'),
-            func.count(File.id).label('count'),
-            func.sum(File.size).label('size')
-        ).filter(
-            File.user_id == user_id,
-            func.date(File.uploaded_at) >= start_date,
-            func.date(File.uploaded_at) <= end_date
-        ).group_by(func.date(File.uploaded_at)).all()
-        
-        # 创建完整的日期序列
-        trend_data = []
-        current_date = start_date
-        
-        # 将查询结果转换为字典以便快速查找
-        results_dict = {result.date: result for result in results}
-        
-        while current_date <= end_date:
-            result = results_dict.get(current_date)
-            trend_data.append({
-                'date': current_date.isoformat(),
-                'count': result.count if result else 0,
-                'size': result.size if result and result.size else 0
-            })
-            current_date += timedelta(days=1)
-        
-        return jsonify({
-            'success': True,
-            'data': trend_data
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return _panel_response('uploadTrend', trend_days=('days', 30))
 
 @statistics_bp.route('/recent-files', methods=['GET'])
 @jwt_required()
@@ -197,35 +199,7 @@ def get_recent_files():
 @jwt_required()
 def get_popular_file_types():
     """获取热门文件类型"""
-    try:
-        user_id = get_jwt_identity()
-        limit = int(request.args.get('limit', 5))
-        
-        # 按文件类型统计数量，按数量降序排列
-        results = db.session.query(
-            File.type,
-            func.count(File.id).label('count')
-        ).filter_by(user_id=user_id).group_by(
-            File.type
-        ).order_by(desc('count')).limit(limit).all()
-        
-        popular_types = []
-        for result in results:
-            popular_types.append({
-                'type': result.type,
-                'count': result.count
-            })
-        
-        return jsonify({
-            'success': True,
-            'data': popular_types
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return _panel_response('popularTypes', popular_limit=('limit', 5))
 
 @statistics_bp.route('/folder-stats', methods=['GET'])
 @jwt_required()
@@ -233,29 +207,59 @@ def get_folder_statistics():
     """获取文件夹统计信息"""
     try:
         user_id = get_jwt_identity()
-        
-        # 获取所有文件夹及其文件统计
-        folders = Folder.query.filter_by(user_id=user_id).all()
+        sort_by = request.args.get('sortBy')
+        top = request.args.get('top', type=int)
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('per_page', 50, type=int)
+        
+        # 一次查询得到所有文件夹的直接统计和递归统计
+        query = Folder.stats_query(user_id)
+        
+        # 排序：top 参数默认按递归大小取前 K 个
+        if sort_by == 'size' or (top and sort_by is None):
+            query = query.order_by(desc('recursive_size'), Folder.name)
+        elif sort_by == 'fileCount':
+            query = query.order_by(desc('recursive_file_count'), Folder.name)
+        else:
+            query = query.order_by(Folder.created_at)
+        
+        pagination = None
+        if top:
+            query = query.limit(top)
+        elif page:
+            total = Folder.query.filter_by(user_id=user_id).count()
+            query = query.offset((page - 1) * per_page).limit(per_page)
+            pages = (total + per_page - 1) // per_page if per_page > 0 else 0
+            pagination = {
+                'page': page,
+                'pages': pages,
+                'per_page': per_page,
+                'total': total,
+                'has_next': page < pages,
+                'has_prev': page > 1
+            }
         
         folder_stats = []
-        for folder in folders:
-            file_count = File.query.filter_by(folder_id=folder.id).count()
-            total_size_result = db.session.query(func.sum(File.size)).filter_by(folder_id=folder.id).scalar()
-            total_size = total_size_result or 0
-            
+        for row in query.all():
             folder_stats.append({
-                'id': folder.id,
-                'name': folder.name,
-                'isParent': folder.is_parent,
-                'fileCount': file_count,
-                'totalSize': total_size,
-                'parentId': folder.parent_id
+                'id': row.id,
+                'name': row.name,
+                'isParent': row.is_parent,
+                'fileCount': row.file_count,
+                'totalSize': row.total_size,
+                'recursiveFileCount': row.recursive_file_count,
+                'recursiveSize': row.recursive_size,
+                'parentId': row.parent_id
             })
         
-        return jsonify({
+        result = {
             'success': True,
             'data': folder_stats
-        })
+        }
+        if pagination:
+            result['pagination'] = pagination
+        
+        return jsonify(result)
         
     except Exception as e:
         return jsonify({
@@ -267,95 +271,10 @@ def get_folder_statistics():
 @jwt_required()
 def get_activity_stats():
     """获取活动统计"""
-    try:
-        user_id = get_jwt_identity()
-        days = int(request.args.get('days', 7))
-        
-        # 计算日期范围
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        
-        # 统计期间内的活动
-        uploads = File.query.filter(
-            File.user_id == user_id,
-            File.uploaded_at >= start_date
-        ).count()
-        
-        folders_created = Folder.query.filter(
-            Folder.user_id == user_id,
-            Folder.created_at >= start_date
-        ).count()
-        
-        # 按小时统计活动（最近24小时）
-        twenty_four_hours_ago = datetime.now() - timedelta(hours=24)
-        hourly_activity = []
-        
-        for i in range(24):
-            hour_start = twenty_four_hours_ago + timedelta(hours=i)
-            hour_end = hour_start + timedelta(hours=1)
-            
-            hour_uploads = File.query.filter(
-                File.user_id == user_id,
-                File.uploaded_at >= hour_start,
-                File.uploaded_at < hour_end
-            ).count()
-            
-            hourly_activity.append({
-                'hour': hour_start.hour,
-                'uploads': hour_uploads
-            })
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'uploads': uploads,
-                'foldersCreated': folders_created,
-                'hourlyActivity': hourly_activity
-            }
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return _panel_response('activity', activity_days=('days', 7))
 
 @statistics_bp.route('/summary', methods=['GET'])
 @jwt_required()
 def get_summary():
     """获取统计摘要"""
-    try:
-        user_id = get_jwt_identity()
-        
-        # 基本统计
-        total_files = File.query.filter_by(user_id=user_id).count()
-        total_folders = Folder.query.filter_by(user_id=user_id).count()
-        total_size_result = db.session.query(func.sum(File.size)).filter_by(user_id=user_id).scalar()
-        total_size = total_size_result or 0
-        
-        # 最大文件
-        largest_file = File.query.filter_by(user_id=user_id).order_by(File.size.desc()).first()
-        
-        # 最新文件
-        latest_file = File.query.filter_by(user_id=user_id).order_by(File.uploaded_at.desc()).first()
-        
-        # 平均文件大小
-        avg_file_size = total_size / total_files if total_files > 0 else 0
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'totalFiles': total_files,
-                'totalFolders': total_folders,
-                'totalSize': total_size,
-                'averageFileSize': avg_file_size,
-                'largestFile': largest_file.to_dict() if largest_file else None,
-                'latestFile': latest_file.to_dict() if latest_file else None
-            }
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
\ No newline at end of file
+    return _panel_response('summary')
@@ -1,6 +1,7 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
+from sqlalchemy import text
 import os
 import psutil
 import shutil
@@ -9,8 +10,16 @@ import platform
 import json
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from models import db, File, Folder, User, TrashItem
+from models import db, File, Folder, User, TrashItem, MaintenanceJob
 from utils import jwt_required_with_user, admin_required, get_file_size_str
+import usage
+import storage
+import host_metrics
+import reconciler
+import backup
+import app_logging
+import sql_profiler
+import slow_queries
 
 system_bp = Blueprint('system', __name__)
 
@@ -27,31 +36,28 @@ def get_system_info():
             'architecture': platform.architecture()[0]
         }
         
-        # 获取存储信息
-        upload_dir = 'uploads'
-        if os.path.exists(upload_dir):
-            # 计算上传目录大小
-            total_size = 0
-            for dirpath, dirnames, filenames in os.walk(upload_dir):
-                for filename in filenames:
-                    filepath = os.path.join(dirpath, filename)
-                    if os.path.exists(filepath):
-                        total_size += os.path.getsize(filepath)
+        # 获取存储信息：上传目录占用读取存储层维护的分片计数
+        if os.path.exists(storage.UPLOAD_ROOT):
+            totals = storage.disk_totals()
             
             # 获取磁盘使用情况
             disk_usage = psutil.disk_usage('.')
             storage_info = {
-                'used': total_size,
+                'used': totals['bytes'],
                 'total': disk_usage.total,
                 'free': disk_usage.free,
-                'upload_dir_size': total_size
+                'upload_dir_size': totals['bytes'],
+                'upload_dir_files': totals['files'],
+                'reconciled_at': totals['reconciledAt']
             }
         else:
             storage_info = {
                 'used': 0,
                 'total': 0,
                 'free': 0,
-                'upload_dir_size': 0
+                'upload_dir_size': 0,
+                'upload_dir_files': 0,
+                'reconciled_at': None
             }
         
         # 获取系统运行时间（这里简化为应用启动时间）
@@ -78,16 +84,17 @@ def health_check():
     """健康检查"""
     try:
         # 检查数据库连接
-        db.session.execute('SELECT 1')
+        db.session.execute(text('SELECT 1'))
         
         # 检查上传目录
         upload_dir = 'uploads'
         upload_dir_accessible = os.path.exists(upload_dir) and os.access(upload_dir, os.W_OK)
         
-        # 获取系统资源使用情况
-        memory_usage = psutil.virtual_memory().percent
-        cpu_usage = psutil.cpu_percent(interval=1)
-        disk_usage = psutil.disk_usage('.').percent
+        # 读取后台采样的最近一次系统资源使用情况
+        sample = host_metrics.latest()
+        memory_usage = sample['memory']['percent']
+        cpu_usage = sample['cpu']['usage']
+        disk_usage = round(sample['disk']['percent'], 1)
         
         # 判断系统健康状态
         status = 'healthy'
@@ -150,47 +157,35 @@ def get_system_stats():
                 'error': '权限不足'
             }), 403
         
-        # 系统级统计
-        total_users = User.query.count()
-        total_files = File.query.count()
-        total_folders = Folder.query.count()
-        
-        # 计算总存储使用量
-        from sqlalchemy import func
-        total_storage_result = db.session.query(func.sum(File.size)).scalar()
-        total_storage = total_storage_result or 0
-        
-        # 活跃用户（最近30天有上传活动的用户）
-        from datetime import timedelta
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        active_users = db.session.query(File.user_id).filter(
-            File.uploaded_at >= thirty_days_ago
-        ).distinct().count()
-        
-        # 按用户统计
-        user_stats = db.session.query(
-            User.username,
-            func.count(File.id).label('file_count'),
-            func.sum(File.size).label('storage_used')
-        ).outerjoin(File).group_by(User.id, User.username).all()
-        
-        user_statistics = []
-        for stat in user_stats:
-            user_statistics.append({
-                'username': stat.username,
-                'fileCount': stat.file_count or 0,
-                'storageUsed': stat.storage_used or 0
-            })
+        # 全局统计读取按用户物化的用量表
+        thirty_days_ago = datetime.now() - timedelta(days=30)
+        totals = usage.global_totals(thirty_days_ago)
+        
+        # 按用户统计（分页排行榜）
+        sort_by = request.args.get('sortBy', 'storageUsed')
+        order = request.args.get('order', 'desc')
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 50, type=int)
+        user_statistics, total_users = usage.leaderboard(sort_by, order, page, per_page)
+        pages = (total_users + per_page - 1) // per_page if per_page > 0 else 0
         
         return jsonify({
             'success': True,
             'data': {
                 'totalUsers': total_users,
-                'totalFiles': total_files,
-                'totalFolders': total_folders,
-                'totalStorage': total_storage,
-                'activeUsers': active_users,
+                'totalFiles': totals['totalFiles'],
+                'totalFolders': totals['totalFolders'],
+                'totalStorage': totals['totalStorage'],
+                'activeUsers': totals['activeUsers'],
                 'userStatistics': user_statistics
+            },
+            'pagination': {
+                'page': page,
+                'pages': pages,
+                'per_page': per_page,
+                'total': total_users,
+                'has_next': page < pages,
+                'has_prev': page > 1
             }
         })
         
@@ -221,42 +216,30 @@ def cleanup_system():
         cleaned_count = 0
         cleaned_size = 0
         
-        if cleanup_type == 'orphaned_files':
-            # 清理孤立文件（数据库中不存在但物理文件存在）
-            upload_dir = 'uploads'
-            if os.path.exists(upload_dir):
-                for root, dirs, files in os.walk(upload_dir):
-                    for filename in files:
-                        filepath = os.path.join(root, filename)
-                        # 检查文件是否在数据库中存在
-                        file_record = File.query.filter_by(filename=filename).first()
-                        if not file_record:
-                            try:
-                                file_size = os.path.getsize(filepath)
-                                os.remove(filepath)
-                                cleaned_count += 1
-                                cleaned_size += file_size
-                            except Exception:
-                                pass
-        
-        elif cleanup_type == 'missing_files':
-            # 清理数据库中存在但物理文件不存在的记录
-            files = File.query.all()
-            for file in files:
-                if not os.path.exists(file.path):
-                    cleaned_size += file.size
-                    db.session.delete(file)
-                    cleaned_count += 1
-            
-            db.session.commit()
+        if cleanup_type in ('orphaned_files', 'missing_files'):
+            # 孤立文件：磁盘上存在但数据库中没有记录；缺失文件：记录存在但物理文件不存在
+            job = reconciler.create_job([cleanup_type], created_by=user_id)
+            job = reconciler.run_job(job.id)
+            if job.status == 'failed':
+                raise Exception(job.error)
+            # 报告实际删除的数量（删除前会再次确认，可能少于扫描到的数量）
+            section = job.report['orphanedFiles' if cleanup_type == 'orphaned_files' else 'missingFiles']
+            cleaned_count = section.get('deleted', 0)
+            cleaned_size = section.get('deletedSize', 0)
         
         elif cleanup_type == 'empty_folders':
-            # 清理空文件夹（没有文件的文件夹）
-            folders = Folder.query.all()
+            # 清理空文件夹（没有文件也没有子文件夹的文件夹），一次查询找出全部
+            from sqlalchemy import exists
+            from sqlalchemy.orm import aliased
+            child = aliased(Folder)
+            folders = Folder.query.filter(
+                Folder.is_parent.isnot(True),
+                ~exists().where(File.folder_id == Folder.id),
+                ~exists().where(child.parent_id == Folder.id)
+            ).all()
             for folder in folders:
-                if len(folder.files) == 0 and len(folder.children) == 0 and not folder.is_parent:
-                    db.session.delete(folder)
-                    cleaned_count += 1
+                db.session.delete(folder)
+                cleaned_count += 1
             
             db.session.commit()
         
@@ -276,6 +259,123 @@ def cleanup_system():
             'error': str(e)
         }), 500
 
+@system_bp.route('/reconcile', methods=['POST'])
+@jwt_required()
+def start_reconcile():
+    """启动存储校对任务（后台执行）"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        # 检查是否为管理员
+        if not user or user.role != 'admin':
+            return jsonify({
+                'success': False,
+                'error': '权限不足'
+            }), 403
+        
+        data = request.get_json(silent=True) or {}
+        types = data.get('types') or list(reconciler.TYPES)
+        dry_run = bool(data.get('dryRun', False))
+        
+        job = reconciler.create_job(types, dry_run=dry_run, created_by=user_id)
+        reconciler.start_job(current_app._get_current_object(), job.id)
+        
+        return jsonify({
+            'success': True,
+            'data': job.to_dict()
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@system_bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job_status(job_id):
+    """获取后台任务状态"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        # 检查是否为管理员
+        if not user or user.role != 'admin':
+            return jsonify({
+                'success': False,
+                'error': '权限不足'
+            }), 403
+        
+        job = db.session.get(MaintenanceJob, job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': '任务不存在'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': job.to_dict()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@system_bp.route('/jobs/<job_id>/resume', methods=['POST'])
+@jwt_required()
+def resume_job(job_id):
+    """继续执行中断或失败的任务"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        # 检查是否为管理员
+        if not user or user.role != 'admin':
+            return jsonify({
+                'success': False,
+                'error': '权限不足'
+            }), 403
+        
+        job = db.session.get(MaintenanceJob, job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': '任务不存在'
+            }), 404
+        
+        # 按任务类型交给对应的模块继续执行
+        runner = {reconciler.JOB_TYPE: reconciler, backup.JOB_TYPE: backup}.get(job.job_type)
+        if runner is None:
+            return jsonify({
+                'success': False,
+                'error': '该任务不支持继续执行'
+            }), 400
+        
+        if not runner.prepare_resume(job):
+            return jsonify({
+                'success': False,
+                'error': '任务已完成或正在运行'
+            }), 409
+        
+        runner.start_job(current_app._get_current_object(), job.id)
+        
+        return jsonify({
+            'success': True,
+            'data': job.to_dict()
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @system_bp.route('/backup', methods=['POST'])
 @jwt_required()
 def create_backup():
@@ -291,19 +391,115 @@ def create_backup():
                 'error': '权限不足'
             }), 403
         
-        # 这里应该实现实际的备份逻辑
-        # 例如：备份数据库、备份上传的文件等
+        data = request.get_json(silent=True) or {}
+        target = data.get('target', 'dir')
+        if target not in backup.TARGETS:
+            return jsonify({
+                'success': False,
+                'error': '不支持的备份目标'
+            }), 400
         
-        backup_filename = f"backup_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.sql"
+        # 备份在后台执行，进度通过 /api/system/jobs/<id> 查询
+        job = backup.create_job(target, created_by=user_id)
+        backup.start_job(current_app._get_current_object(), job.id)
         
-        # 简化的备份信息返回
         return jsonify({
             'success': True,
-            'data': {
-                'backupFile': backup_filename,
-                'timestamp': datetime.utcnow().isoformat(),
-                'message': '备份创建成功（演示版本）'
-            }
+            'data': job.to_dict(),
+            'message': '备份任务已开始'
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@system_bp.route('/backups', methods=['GET'])
+@jwt_required()
+def list_backups():
+    """列出备份还原点"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        # 检查是否为管理员
+        if not user or user.role != 'admin':
+            return jsonify({
+                'success': False,
+                'error': '权限不足'
+            }), 403
+        
+        return jsonify({
+            'success': True,
+            'data': backup.list_restore_points()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@system_bp.route('/sql-stats', methods=['GET'])
+@jwt_required()
+def get_sql_stats():
+    """按接口返回 SQL 语句数、数据库耗时和疑似 N+1 查询（仅统计当前工作进程）"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        # 检查是否为管理员
+        if not user or user.role != 'admin':
+            return jsonify({
+                'success': False,
+                'error': '权限不足'
+            }), 403
+        
+        sort_by = request.args.get('sortBy', 'queries')
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+        
+        return jsonify({
+            'success': True,
+            'data': sql_profiler.worst_offenders(sort_by, limit)
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@system_bp.route('/slow-queries', methods=['GET', 'DELETE'])
+@jwt_required()
+def slow_query_log():
+    """慢查询日志（GET 列出，DELETE 清空）"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        # 检查是否为管理员
+        if not user or user.role != 'admin':
+            return jsonify({
+                'success': False,
+                'error': '权限不足'
+            }), 403
+        
+        if request.method == 'DELETE':
+            slow_queries.clear()
+            return jsonify({
+                'success': True,
+                'message': '慢查询日志已清空'
+            })
+        
+        sort_by = request.args.get('sortBy', 'maxDuration')
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        
+        return jsonify({
+            'success': True,
+            'data': slow_queries.list_slow_queries(sort_by, limit),
+            'thresholdMs': slow_queries.THRESHOLD_MS
         })
         
     except Exception as e:
@@ -327,26 +523,28 @@ def get_system_logs():
                 'error': '权限不足'
             }), 403
         
-        # 这里应该实现实际的日志读取逻辑
-        # 简化的日志信息返回
-        logs = [
-            {
-                'timestamp': datetime.now().isoformat(),
-                'level': 'INFO',
-                'message': 'System started successfully',
-                'module': 'system'
-            },
-            {
-                'timestamp': (datetime.now() - timedelta(minutes=5)).isoformat(),
-                'level': 'INFO',
-                'message': 'User logged in',
-                'module': 'auth'
-            }
-        ]
+        # 从内存环形缓冲区查询，按时间倒序，before 为上一页返回的 nextCursor
+        levels = [level.strip().upper() for level in request.args.get('level', '').split(',') if level.strip()]
+        module = request.args.get('module', '').strip() or None
+        try:
+            start = request.args.get('start')
+            end = request.args.get('end')
+            start = datetime.fromisoformat(start).timestamp() if start else None
+            end = datetime.fromisoformat(end).timestamp() if end else None
+            before = request.args.get('before', type=int)
+            limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': '时间格式无效'
+            }), 400
+
+        logs, next_cursor = app_logging.ring_buffer.query(levels, module, start, end, before, limit)
         
         return jsonify({
             'success': True,
-            'data': logs
+            'data': logs,
+            'nextCursor': next_cursor
         })
         
     except Exception as e:
@@ -370,39 +568,63 @@ def get_performance_stats():
                 'error': '权限不足'
             }), 403
         
-        # 获取系统性能数据
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('.')
+        # 返回后台采样的最近一次性能数据
+        sample = host_metrics.latest()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'timestamp': datetime.fromtimestamp(sample['timestamp']).isoformat(),
+                'cpu': sample['cpu'],
+                'memory': sample['memory'],
+                'disk': sample['disk'],
+                'network': sample['network'],
+                'process': sample['process']
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@system_bp.route('/performance/history', methods=['GET'])
+@jwt_required()
+def get_performance_history():
+    """获取性能采样历史，用于绘制图表"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
         
-        # 获取网络统计
-        network = psutil.net_io_counters()
+        # 检查是否为管理员
+        if not user or user.role != 'admin':
+            return jsonify({
+                'success': False,
+                'error': '权限不足'
+            }), 403
+        
+        window = request.args.get('window', 3600, type=int)  # 最近多少秒
+        step = request.args.get('step', 1, type=int)  # 每隔几个采样取一个
+        
+        history = []
+        for sample in host_metrics.history(window, step):
+            history.append({
+                'timestamp': datetime.fromtimestamp(sample['timestamp']).isoformat(),
+                'cpu': sample['cpu']['usage'],
+                'memory': sample['memory']['percent'],
+                'disk': round(sample['disk']['percent'], 2),
+                'networkSent': sample['network']['sent_per_sec'],
+                'networkRecv': sample['network']['recv_per_sec'],
+                'processMemory': sample['process']['memory_rss'],
+                'processCpu': sample['process']['cpu_percent']
+            })
         
         return jsonify({
             'success': True,
             'data': {
-                'cpu': {
-                    'usage': cpu_percent,
-                    'cores': psutil.cpu_count()
-                },
-                'memory': {
-                    'total': memory.total,
-                    'available': memory.available,
-                    'used': memory.used,
-                    'percent': memory.percent
-                },
-                'disk': {
-                    'total': disk.total,
-                    'used': disk.used,
-                    'free': disk.free,
-                    'percent': (disk.used / disk.total) * 100
-                },
-                'network': {
-                    'bytes_sent': network.bytes_sent,
-                    'bytes_recv': network.bytes_recv,
-                    'packets_sent': network.packets_sent,
-                    'packets_recv': network.packets_recv
-                }
+                'interval': host_metrics.SAMPLE_INTERVAL,
+                'samples': history
             }
         })
         
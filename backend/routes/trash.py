@@ -3,6 +3,9 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, TrashItem, File, Folder
 from datetime import datetime
 import os
+import logging
+
+logger = logging.getLogger(__name__)
 
 trash_bp = Blueprint('trash', __name__)
 
@@ -12,11 +15,11 @@ def get_trash_items():
     """获取回收站列表"""
     try:
         user_id = get_jwt_identity()
-        print(f"获取回收站数据，用户ID: {user_id}")
+        logger.debug("获取回收站数据，用户ID: %s", user_id)
         
         # 获取用户的回收站项目
         trash_items = TrashItem.query.filter_by(user_id=user_id).order_by(TrashItem.deleted_at.desc()).all()
-        print(f"找到 {len(trash_items)} 个回收站项目")
+        logger.debug("找到 %s 个回收站项目", len(trash_items))
         
         items = []
         for item in trash_items:
@@ -39,7 +42,7 @@ def get_trash_items():
         })
         
     except Exception as e:
-        print(f"获取回收站数据失败: {str(e)}")
+        logger.error("获取回收站数据失败: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+备份脚本
+在前台创建一个还原点，适合由 cron 等定时任务调用
+
+用法: python run_backup.py [dir|tar]
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app
+import backup
+
+def run_backup(target='dir'):
+    """创建还原点"""
+    with app.app_context():
+        try:
+            print(f"正在创建还原点（{target}）...")
+            report = backup.create_restore_point(target)
+            print(f"✓ 还原点 {report['restorePoint']}：{report['files']} 个文件，"
+                  f"新复制 {report['copiedFiles']} 个（{report['copiedBytes']} 字节）")
+            if report['archive']:
+                print(f"✓ 归档文件 {report['archive']}")
+            if report['missingFiles']:
+                print(f"⚠ {len(report['missingFiles'])} 个文件在磁盘上不存在")
+            print("\n备份完成！")
+            return True
+        except Exception as e:
+            print(f"备份失败: {str(e)}")
+            return False
+
+if __name__ == '__main__':
+    run_backup(sys.argv[1] if len(sys.argv) > 1 else 'dir')
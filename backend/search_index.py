@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件名模糊搜索索引
+
+为每个用户在内存中维护文件和文件夹名称的 n-gram 倒排索引：
+拉丁字母和数字按三元组（trigram）切分，中日韩文字按二元组（bigram）切分。
+索引在首次查询时懒加载，之后随上传、重命名、移动和删除增量更新，
+超过 SEARCH_INDEX_TTL 秒后自动重建，以同步其它工作进程的写入。
+"""
+
+import os
+import re
+import time
+import heapq
+import threading
+from collections import namedtuple, Counter
+from hooks import on_commit
+
+# 索引最长存活时间（秒），多进程部署时用于兜底同步
+INDEX_TTL = int(os.getenv('SEARCH_INDEX_TTL', 600))
+# 内存中最多保留的用户索引数量
+MAX_INDEXES = int(os.getenv('SEARCH_INDEX_MAX_USERS', 256))
+# 默认最低相似度
+DEFAULT_THRESHOLD = 0.3
+
+Entry = namedtuple('Entry', ['kind', 'id', 'name', 'parent_id', 'grams'])
+Match = namedtuple('Match', ['kind', 'id', 'name', 'parent_id', 'score'])
+
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_TOKEN_RE = re.compile(r'[' + _CJK + r']+|[^\W_' + _CJK + r']+', re.UNICODE)
+_CJK_RE = re.compile(r'[' + _CJK + r']')
+
+def tokenize(text):
+    """将名称切分为中日韩文字串和字母数字串"""
+    return _TOKEN_RE.findall((text or '').lower())
+
+def make_grams(text, prefix=False):
+    """生成名称的 n-gram 集合
+
+    prefix=True 时最后一个词不补尾部空白，用于输入过程中的前缀匹配。
+    """
+    grams = set()
+    tokens = tokenize(text)
+    for i, token in enumerate(tokens):
+        if _CJK_RE.match(token):
+            if len(token) == 1:
+                grams.add(token)
+            for j in range(len(token) - 1):
+                grams.add(token[j:j + 2])
+        else:
+            tail = '' if prefix and i == len(tokens) - 1 else ' '
+            padded = '  ' + token + tail
+            for j in range(len(padded) - 2):
+                grams.add(padded[j:j + 3])
+    return grams
+
+class NameIndex:
+    """单个用户的名称倒排索引"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built_at = time.time()
+        self.entries = {}        # 槽位 -> Entry
+        self.slots = {}          # (kind, id) -> 槽位
+        self.postings = {}       # gram -> 槽位集合
+        self.sort_keys = {}      # 槽位 -> (名称长度, 小写名称)，用于同分排序
+        self._next_slot = 0
+
+    def add(self, kind, item_id, name, parent_id=None):
+        """添加或更新一条记录"""
+        with self.lock:
+            self._remove(kind, item_id)
+            slot = self._next_slot
+            self._next_slot += 1
+            grams = frozenset(make_grams(name))
+            self.entries[slot] = Entry(kind, item_id, name, parent_id, grams)
+            self.slots[(kind, item_id)] = slot
+            self.sort_keys[slot] = (len(name), name.lower())
+            for gram in grams:
+                self.postings.setdefault(gram, set()).add(slot)
+
+    def remove(self, kind, item_id):
+        """删除一条记录"""
+        with self.lock:
+            self._remove(kind, item_id)
+
+    def _remove(self, kind, item_id):
+        slot = self.slots.pop((kind, item_id), None)
+        if slot is None:
+            return
+        entry = self.entries.pop(slot)
+        del self.sort_keys[slot]
+        for gram in entry.grams:
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(slot)
+                if not posting:
+                    del self.postings[gram]
+
+    def move(self, kind, item_id, parent_id):
+        """更新记录的所属文件夹"""
+        with self.lock:
+            slot = self.slots.get((kind, item_id))
+            if slot is not None:
+                self.entries[slot] = self.entries[slot]._replace(parent_id=parent_id)
+
+    def search(self, query, limit=20, kind=None, threshold=DEFAULT_THRESHOLD, prefix=False):
+        """按相似度返回匹配项
+
+        普通模式的相似度为查询与名称 n-gram 集合的 Dice 系数，名称包含查询
+        子串时视为强匹配；前缀模式（输入联想）的相似度为查询 n-gram 被名称
+        覆盖的比例。同分时名称越短越靠前。
+        """
+        query_lower = (query or '').strip().lower()
+        query_grams = make_grams(query_lower, prefix=prefix)
+        if not query_grams:
+            return []
+        total = len(query_grams)
+        # Dice 系数要达到阈值 t，公共 n-gram 数至少为 t*|q|/(2-t)
+        min_common = max(1, int(threshold * total / (2 - threshold)))
+
+        with self.lock:
+            overlap = Counter()
+            for gram in query_grams:
+                posting = self.postings.get(gram)
+                if posting:
+                    overlap.update(posting)
+            if kind:
+                overlap = Counter({slot: common for slot, common in overlap.items()
+                                   if self.entries[slot].kind == kind})
+            if not overlap:
+                return []
+
+            if prefix:
+                # 完全覆盖查询的候选已够数时，只在这一档内按名称排序即可
+                best = max(overlap.values())
+                top = [slot for slot, common in overlap.items() if common == best]
+                if len(top) >= limit and best / total >= threshold:
+                    slots = heapq.nsmallest(limit, top, key=self.sort_keys.__getitem__)
+                    return [self._match(slot, best / total) for slot in slots]
+                scored = [(common / total, slot) for slot, common in overlap.items()
+                          if common >= min_common]
+            else:
+                entries = self.entries
+                scored = [(2.0 * common / (total + len(entries[slot].grams)), slot)
+                          for slot, common in overlap.items() if common >= min_common]
+                # 只有覆盖全部查询 n-gram 的名称才可能包含查询子串
+                sort_keys = self.sort_keys
+                scored = [(0.9, slot) if score < 0.9 and overlap[slot] == total
+                          and query_lower in sort_keys[slot][1] else (score, slot)
+                          for score, slot in scored]
+
+            scored = [item for item in scored if item[0] >= threshold]
+            if len(scored) > limit:
+                # 先按分数取出前 limit 名的分数线，再只对分数线以上的候选排序
+                cutoff = heapq.nlargest(limit, scored)[-1][0]
+                scored = [item for item in scored if item[0] >= cutoff]
+            best = heapq.nsmallest(limit, scored, key=lambda item: (-item[0], self.sort_keys[item[1]]))
+            return [self._match(slot, score) for score, slot in best]
+
+    def _match(self, slot, score):
+        entry = self.entries[slot]
+        return Match(entry.kind, entry.id, entry.name, entry.parent_id, round(score, 4))
+
+    def __len__(self):
+        return len(self.entries)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def _build_index(user_id):
+    """从数据库加载用户的全部文件和文件夹名称"""
+    from models import db, File, Folder
+
+    index = NameIndex()
+    files = db.session.query(File.id, File.name, File.folder_id).filter(File.user_id == user_id)
+    for file_id, name, folder_id in files:
+        index.add('file', file_id, name, folder_id)
+    folders = db.session.query(Folder.id, Folder.name, Folder.parent_id).filter(Folder.user_id == user_id)
+    for folder_id, name, parent_id in folders:
+        index.add('folder', folder_id, name, parent_id)
+    index.built_at = time.time()
+    return index
+
+def get_index(user_id):
+    """获取用户索引，不存在或已过期时重建"""
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is not None and time.time() - index.built_at < INDEX_TTL:
+            # 重新插入以维持 LRU 顺序
+            _indexes[user_id] = _indexes.pop(user_id)
+            return index
+
+    index = _build_index(user_id)
+
+    with _indexes_lock:
+        _indexes[user_id] = index
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.pop(next(iter(_indexes)))
+    return index
+
+def fuzzy_search(user_id, query, limit=20, kind=None, threshold=DEFAULT_THRESHOLD):
+    """模糊搜索文件/文件夹名称"""
+    return get_index(user_id).search(query, limit=limit, kind=kind, threshold=threshold)
+
+def suggest(user_id, prefix, limit=10, kind=None):
+    """输入联想：按前缀相似度返回候选名称"""
+    return get_index(user_id).search(prefix, limit=limit, kind=kind, prefix=True)
+
+def invalidate(user_id=None):
+    """丢弃用户（或全部）索引，下次查询时重建"""
+    with _indexes_lock:
+        if user_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(user_id, None)
+
+@on_commit
+def _apply_changes(changes):
+    """把已提交的文件/文件夹变更增量同步到已加载的索引"""
+    for change in changes:
+        index = _indexes.get(change.user_id)
+        if index is None:
+            # 索引尚未加载，下次查询时会完整构建
+            continue
+        parent_id = change.data['folder_id'] if change.kind == 'file' else change.data['parent_id']
+        if change.action == 'delete':
+            index.remove(change.kind, change.id)
+        elif change.action == 'insert' or 'name' in change.changed:
+            index.add(change.kind, change.id, change.data['name'], parent_id)
+        else:
+            index.move(change.kind, change.id, parent_id)
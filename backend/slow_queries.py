@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+慢查询日志
+
+sql_profiler 发现耗时超过 SLOW_QUERY_MS 毫秒的语句时调用 record()，这里只把
+语句、参数类型、路由和耗时放入队列，由后台线程写入 slow_queries 表：
+- 同一指纹（规范化后的 SQL）只占一行，累计次数、总耗时和最大耗时
+- 新指纹第一次出现时用原始参数执行 EXPLAIN QUERY PLAN 并保存执行计划，
+  计划中出现 SCAN 即表示缺少索引
+- 表中最多保留 SLOW_QUERY_MAX_ROWS 行，超出时删除最久未出现的语句
+
+后台线程自己执行的语句不会再被记录，队列满时直接丢弃新的记录。
+"""
+
+import os
+import queue
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import case, delete, func, select
+from flask import has_request_context, request
+from database import upsert
+from models import db, SlowQuery
+
+logger = logging.getLogger(__name__)
+
+# 慢查询阈值（毫秒），0 表示关闭
+THRESHOLD_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+# 表中保留的语句数
+MAX_ROWS = int(os.getenv('SLOW_QUERY_MAX_ROWS', 500))
+QUEUE_SIZE = 1000
+# 每写入多少条记录检查一次行数上限
+TRIM_EVERY = 50
+
+SORT_FIELDS = {
+    'maxDuration': SlowQuery.max_duration,
+    'totalDuration': SlowQuery.total_duration,
+    'count': SlowQuery.count,
+    'lastSeen': SlowQuery.last_seen
+}
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_local = threading.local()
+_lock = threading.Lock()
+_worker_pid = None
+_app = None
+# 已确认保存了执行计划的语句指纹，按最近使用淘汰，最多 MAX_ROWS 个（与表中保留的语句数一致）
+_explained = OrderedDict()
+
+def fingerprint(statement):
+    return hashlib.sha1(' '.join(statement.split()).encode('utf-8')).hexdigest()
+
+def _shape(parameters):
+    """只保留参数的类型，避免把用户数据写进日志"""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return []
+
+def record(statement, parameters, executemany, elapsed):
+    """记录一次慢查询（在执行语句的线程中调用，只入队）"""
+    if _app is None or getattr(_local, 'in_worker', False):
+        return
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    method = route = None
+    if has_request_context():
+        method = request.method
+        route = request.url_rule.rule if request.url_rule is not None else None
+    _ensure_worker()
+    try:
+        _queue.put_nowait((statement, parameters, method, route, elapsed * 1000, datetime.now()))
+    except queue.Full:
+        pass
+
+def _explain(conn, statement, parameters):
+    if conn.dialect.name != 'sqlite':
+        return None
+    try:
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        return [row[-1] for row in rows]
+    except Exception as e:
+        return [f'EXPLAIN 失败: {e}']
+
+def _trim(conn):
+    excess = conn.execute(select(func.count()).select_from(SlowQuery.__table__)).scalar() - MAX_ROWS
+    if excess > 0:
+        oldest = select(SlowQuery.fingerprint).order_by(SlowQuery.last_seen).limit(excess)
+        conn.execute(delete(SlowQuery.__table__).where(SlowQuery.fingerprint.in_(oldest)))
+
+def _write(conn, item):
+    statement, parameters, method, route, duration, seen = item
+    key = fingerprint(statement)
+    table = SlowQuery.__table__
+    upsert(conn, table, [{
+        'fingerprint': key, 'statement': statement, 'param_shape': _shape(parameters),
+        'method': method, 'route': route, 'count': 1, 'total_duration': duration,
+        'max_duration': duration, 'first_seen': seen, 'last_seen': seen
+    }], ['fingerprint'], lambda old, new: {
+        'count': old.count + 1,
+        'total_duration': old.total_duration + new.total_duration,
+        'max_duration': case((new.max_duration > old.max_duration, new.max_duration), else_=old.max_duration),
+        'method': new.method,
+        'route': new.route,
+        'last_seen': new.last_seen
+    })
+
+    with _lock:
+        explained = key in _explained
+        if explained:
+            _explained.move_to_end(key)
+    if not explained:
+        has_plan = conn.execute(select(SlowQuery.plan.isnot(None)).where(SlowQuery.fingerprint == key)).scalar()
+        if not has_plan:
+            conn.execute(table.update().where(table.c.fingerprint == key).values(
+                plan=_explain(conn, statement, parameters)
+            ))
+        with _lock:
+            _explained[key] = True
+            while len(_explained) > MAX_ROWS:
+                _explained.popitem(last=False)
+
+def _worker_loop():
+    _local.in_worker = True
+    written = 0
+    with _app.app_context():
+        while True:
+            item = _queue.get()
+            try:
+                with db.engine.begin() as conn:
+                    _write(conn, item)
+                    written += 1
+                    if written % TRIM_EVERY == 0:
+                        _trim(conn)
+            except Exception as e:
+                logger.exception("写入慢查询日志失败: %s", e)
+
+def _ensure_worker():
+    """当前进程中尚未启动写入线程时启动（fork 后的子进程需要重新启动）"""
+    global _worker_pid
+    pid = os.getpid()
+    if _worker_pid == pid:
+        return
+    with _lock:
+        if _worker_pid == pid:
+            return
+        _worker_pid = pid
+    threading.Thread(target=_worker_loop, daemon=True).start()
+
+def is_slow(elapsed):
+    return THRESHOLD_MS > 0 and elapsed * 1000 >= THRESHOLD_MS
+
+def list_slow_queries(sort_by='maxDuration', limit=50):
+    column = SORT_FIELDS.get(sort_by, SlowQuery.max_duration)
+    rows = SlowQuery.query.order_by(column.desc()).limit(limit).all()
+    return [row.to_dict() for row in rows]
+
+def clear():
+    SlowQuery.query.delete()
+    db.session.commit()
+    with _lock:
+        _explained.clear()
+
+def init_app(app):
+    global _app
+    _app = app
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQL 统计
+
+通过 SQLAlchemy 的 before/after_cursor_execute 事件统计每个请求执行的语句数和
+数据库耗时。同一请求内相同的 SQL 文本（参数不同）执行超过
+SQL_N_PLUS_ONE_THRESHOLD 次时视为疑似 N+1 查询，记录警告日志。
+
+每个请求结束后按接口累计到进程内的汇总表中，/api/system/sql-stats 从这里
+返回查询最多的接口。设置 SQL_PROFILE_HEADERS=1（或调试模式）时，响应会带上
+Server-Timing 头，浏览器开发者工具中可以直接看到数据库耗时。
+
+所有线程中超过慢查询阈值的语句都会交给 slow_queries 记录。
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from flask import current_app, g, has_request_context, request
+import slow_queries
+
+logger = logging.getLogger(__name__)
+
+# 同一请求内相同语句执行次数达到该值时视为疑似 N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', 5))
+# 是否输出 Server-Timing 头，未设置时跟随调试模式
+PROFILE_HEADERS = os.getenv('SQL_PROFILE_HEADERS')
+# 汇总表中保存的语句示例长度
+SAMPLE_LENGTH = 300
+
+SORT_FIELDS = {
+    'queries': 'maxQueries',
+    'avgQueries': 'avgQueries',
+    'dbTime': 'totalDbTime',
+    'nPlusOne': 'nPlusOneRequests'
+}
+
+_lock = threading.Lock()
+# (方法, 路由模板) -> 汇总
+_endpoints = {}
+
+def fingerprint(statement):
+    """参数化 SQL 的指纹：只合并空白，相同文本即相同语句"""
+    return ' '.join(statement.split())
+
+def repeated_statements(statements, threshold=N_PLUS_ONE_THRESHOLD):
+    """从 {指纹: [次数, 耗时]} 中找出执行次数不少于 threshold 的语句，按次数倒序"""
+    repeated = [(sql, count) for sql, (count, _) in statements.items() if count >= threshold]
+    return sorted(repeated, key=lambda item: item[1], reverse=True)
+
+@contextmanager
+def capture(engine):
+    """记录块内在 engine 上执行的语句，得到 [(语句, 参数, 是否 executemany)]"""
+    statements = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters, executemany))
+
+    event.listen(engine, 'before_cursor_execute', before)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._sql_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_sql_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if slow_queries.is_slow(elapsed):
+        slow_queries.record(statement, parameters, executemany, elapsed)
+    if not has_request_context():
+        return
+    stats = g.get('sql_stats')
+    if stats is None:
+        stats = g.sql_stats = {'count': 0, 'time': 0.0, 'statements': {}}
+    stats['count'] += 1
+    stats['time'] += elapsed
+    entry = stats['statements'].setdefault(fingerprint(statement), [0, 0.0])
+    entry[0] += 1
+    entry[1] += elapsed
+
+def _record(endpoint, stats, repeated):
+    with _lock:
+        summary = _endpoints.get(endpoint)
+        if summary is None:
+            summary = _endpoints[endpoint] = {
+                'requests': 0, 'totalQueries': 0, 'maxQueries': 0, 'totalDbTime': 0.0,
+                'maxDbTime': 0.0, 'nPlusOneRequests': 0, 'nPlusOneSample': None
+            }
+        summary['requests'] += 1
+        summary['totalQueries'] += stats['count']
+        summary['maxQueries'] = max(summary['maxQueries'], stats['count'])
+        summary['totalDbTime'] += stats['time']
+        summary['maxDbTime'] = max(summary['maxDbTime'], stats['time'])
+        if repeated:
+            sql, count = repeated[0]
+            summary['nPlusOneRequests'] += 1
+            summary['nPlusOneSample'] = {'statement': sql[:SAMPLE_LENGTH], 'count': count}
+
+def _after_request(response):
+    stats = g.get('sql_stats')
+    if stats is None:
+        return response
+    rule = request.url_rule
+    endpoint = (request.method, rule.rule if rule is not None else 'unmatched')
+    repeated = repeated_statements(stats['statements'])
+    if repeated:
+        logger.warning('疑似 N+1 查询: %s %s 中同一语句执行了 %s 次: %s',
+                       endpoint[0], endpoint[1], repeated[0][1], repeated[0][0][:SAMPLE_LENGTH])
+    _record(endpoint, stats, repeated)
+
+    if _headers_enabled():
+        timing = f'db;dur={stats["time"] * 1000:.2f};desc="{stats["count"]} queries"'
+        if repeated:
+            timing += f', n1;desc="{len(repeated)} repeated statements"'
+        response.headers.add('Server-Timing', timing)
+    return response
+
+def _headers_enabled():
+    if PROFILE_HEADERS is None:
+        return current_app.debug
+    return PROFILE_HEADERS.lower() in ('1', 'true', 'yes')
+
+def worst_offenders(sort_by='queries', limit=20):
+    """按指定指标返回最差的接口"""
+    with _lock:
+        rows = []
+        for (method, route), summary in _endpoints.items():
+            row = dict(summary, method=method, route=route)
+            row['avgQueries'] = round(summary['totalQueries'] / summary['requests'], 2)
+            row['avgDbTime'] = round(summary['totalDbTime'] * 1000 / summary['requests'], 2)
+            row['totalDbTime'] = round(summary['totalDbTime'] * 1000, 2)
+            row['maxDbTime'] = round(summary['maxDbTime'] * 1000, 2)
+            rows.append(row)
+    field = SORT_FIELDS.get(sort_by, 'maxQueries')
+    rows.sort(key=lambda row: row[field], reverse=True)
+    return rows[:limit]
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+
+def init_app(app):
+    """注册请求结束时的统计钩子并启用慢查询日志"""
+    app.after_request(_after_request)
+    slow_queries.init_app(app)
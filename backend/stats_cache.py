@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统计结果缓存
+
+每个用户在 stats_versions 表中有一个版本号，文件/文件夹的新增、修改和
+删除会在同一事务内把它加一。缓存条目记录计算时的版本号：版本一致且未
+超过 STATS_CACHE_TTL 秒即直接返回；版本一致、已过期但未超过 STATS_CACHE_MAX_STALE
+秒时先返回旧结果，同时在后台线程中重新计算（stale-while-revalidate）；
+版本号变化说明数据已修改，同步重新计算。
+版本号存放在数据库中，多个工作进程之间也能正确失效。
+"""
+
+import os
+import time
+import threading
+from collections import namedtuple
+from flask import current_app
+from hooks import on_flush
+from database import upsert
+from models import db, StatsVersion
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 缓存结果视为新鲜的时间（秒），用于按时间变化的面板（最近 7 天、24 小时等）
+FRESH_TTL = int(os.getenv('STATS_CACHE_TTL', 60))
+# 过期结果最多可继续返回的时间（秒），超过后同步重新计算
+MAX_STALE = int(os.getenv('STATS_CACHE_MAX_STALE', 300))
+# 内存中最多保留的缓存条目数
+MAX_ENTRIES = int(os.getenv('STATS_CACHE_MAX_ENTRIES', 1024))
+
+Entry = namedtuple('Entry', ['version', 'computed_at', 'value'])
+
+_entries = {}
+_refreshing = set()
+_lock = threading.Lock()
+
+def current_version(user_id):
+    """读取用户当前的统计版本号"""
+    version = db.session.query(StatsVersion.version).filter(StatsVersion.user_id == user_id).scalar()
+    return version or 0
+
+def bump_versions(conn, user_ids):
+    """把一组用户的统计版本号加一"""
+    if not user_ids:
+        return
+    table = StatsVersion.__table__
+    rows = [{'user_id': user_id, 'version': 1} for user_id in sorted(user_ids)]
+
+    upsert(conn, table, rows, ['user_id'], lambda old, new: {'version': old.version + 1})
+
+@on_flush
+def _bump_on_change(session, changes):
+    """文件/文件夹发生变更时递增所属用户的版本号"""
+    bump_versions(session.connection(), {change.user_id for change in changes})
+
+def _store(key, version, value):
+    with _lock:
+        _entries.pop(key, None)
+        _entries[key] = Entry(version, time.time(), value)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.pop(next(iter(_entries)))
+
+def _refresh(app, key, compute):
+    """在后台线程中重新计算并写回缓存"""
+    try:
+        with app.app_context():
+            version = current_version(key[0])
+            _store(key, version, compute())
+    except Exception as e:
+        logger.exception("统计缓存刷新失败: %s", e)
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+def _refresh_async(key, compute):
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    app = current_app._get_current_object()
+    threading.Thread(target=_refresh, args=(app, key, compute), daemon=True).start()
+
+def cached(user_id, name, compute, params=()):
+    """返回缓存的统计结果，必要时调用 compute() 计算
+
+    compute 不能依赖请求上下文，后台刷新时只有应用上下文。
+    """
+    key = (user_id, name, tuple(params))
+    version = current_version(user_id)
+    with _lock:
+        entry = _entries.get(key)
+
+    # 版本号变化（有写入）时同步重新计算；版本一致、只是超过 TTL 时才先返回旧结果
+    if entry is not None and entry.version == version:
+        age = time.time() - entry.computed_at
+        if age < FRESH_TTL:
+            return entry.value
+        if age < MAX_STALE:
+            _refresh_async(key, compute)
+            return entry.value
+
+    value = compute()
+    _store(key, version, value)
+    return value
+
+def invalidate(user_id=None):
+    """丢弃用户（或全部）缓存条目"""
+    with _lock:
+        if user_id is None:
+            _entries.clear()
+        else:
+            for key in [key for key in _entries if key[0] == user_id]:
+                del _entries[key]
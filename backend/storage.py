@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上传文件存储与磁盘占用统计
+
+所有写入、复制和删除上传目录中文件的操作都经过这里，同时把字节数和文件数
+的变化累加到 disk_usage 表中对应的分片（上传目录下的子目录，即每个用户的
+目录）。系统信息接口直接读取这些计数，不再遍历目录。
+
+计数随请求事务提交；事务回滚或绕过存储层的文件改动造成的偏差由校对任务
+修正：校对用 os.scandir 统计各分片，并记录目录修改时间，目录未变化的分片
+直接跳过，不必重新 stat 其中的文件。每次累加都会清除分片记录的目录修改时间：
+文件先写入磁盘、计数随后才提交，校对恰好在两者之间统计时，计数会被重复累加，
+清除修改时间后下次校对会重新统计该分片。
+"""
+
+import os
+import time
+import shutil
+import threading
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import func
+from database import upsert
+from models import db, DiskUsage
+import logging
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ROOT = 'uploads'
+# 后台校对间隔（秒），0 表示不启动后台校对
+RECONCILE_INTERVAL = int(os.getenv('DISK_RECONCILE_INTERVAL', 0))
+# 后台校对时每个分片之间的停顿（秒），降低对磁盘的压力
+RECONCILE_PAUSE = float(os.getenv('DISK_RECONCILE_PAUSE', 0.05))
+
+def _dir_shard(directory):
+    """返回目录相对上传根目录的分片名，不在上传目录内时返回 None"""
+    rel = os.path.relpath(os.path.abspath(directory), os.path.abspath(UPLOAD_ROOT))
+    if rel == os.curdir:
+        return ''
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        return None
+    return rel.replace(os.sep, '/')
+
+def shard_of(path):
+    """返回文件所在分片"""
+    return _dir_shard(os.path.dirname(path))
+
+def _shard_owner(shard):
+    return shard.split('/')[0] or None
+
+def _record(path, size, files):
+    """在当前事务中累加分片计数，并让下次校对重新统计该分片"""
+    shard = shard_of(path)
+    if shard is None:
+        return
+    upsert(db.session.connection(), DiskUsage.__table__, [{
+        'shard': shard,
+        'user_id': _shard_owner(shard),
+        'bytes': size,
+        'files': files
+    }], ['shard'], lambda old, new: {
+        'bytes': old.bytes + new.bytes,
+        'files': old.files + new.files,
+        'dir_mtime': None
+    })
+
+def save_upload(file_storage, path):
+    """保存上传的文件，返回文件大小"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_storage.save(path)
+    size = os.path.getsize(path)
+    _record(path, size, 1)
+    return size
+
+def copy_blob(src, dst):
+    """复制文件，返回新文件大小"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    shutil.copy2(src, dst)
+    size = os.path.getsize(dst)
+    _record(dst, size, 1)
+    return size
+
+def track_write(path):
+    """登记由其它代码写入的新文件（例如缩略图）"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    _record(path, size, 1)
+
+def remove_blob(path):
+    """删除文件，返回释放的字节数；文件不存在或删除失败时返回 None"""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+    except OSError:
+        return None
+    _record(path, -size, -1)
+    return size
+
+def disk_totals():
+    """上传目录的总字节数、文件数和最早的校对时间"""
+    row = db.session.query(
+        func.coalesce(func.sum(DiskUsage.bytes), 0),
+        func.coalesce(func.sum(DiskUsage.files), 0),
+        func.min(DiskUsage.reconciled_at)
+    ).one()
+    return {
+        'bytes': row[0],
+        'files': row[1],
+        'reconciledAt': row[2].isoformat() if row[2] else None
+    }
+
+def _scan_dir(directory):
+    """统计目录下（不含子目录）文件的字节数和个数，并返回子目录列表"""
+    size = files = 0
+    subdirs = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                size += entry.stat(follow_symlinks=False).st_size
+                files += 1
+    return size, files, subdirs
+
+def reconcile(force=False, pause=0):
+    """按实际文件校对全部分片计数
+
+    目录修改时间与上次校对时一致的分片直接跳过（文件名均为 UUID，写入后
+    不会原地修改）。force=True 时重新统计全部分片。
+    """
+    if not os.path.isdir(UPLOAD_ROOT):
+        return {'scanned': 0, 'skipped': 0, 'removed': 0}
+
+    known = {row.shard: row.dir_mtime for row in DiskUsage.query.all()}
+    children = defaultdict(list)
+    for shard in known:
+        if shard:
+            parent = shard.rsplit('/', 1)[0] if '/' in shard else ''
+            children[parent].append(shard)
+
+    table = DiskUsage.__table__
+    seen = set()
+    scanned = skipped = 0
+    pending = [UPLOAD_ROOT]
+    while pending:
+        directory = pending.pop()
+        shard = _dir_shard(directory)
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            continue
+        seen.add(shard)
+
+        if not force and shard in known and known[shard] == mtime:
+            # 目录项没有变化，子目录集合也没有变化
+            pending.extend(os.path.join(UPLOAD_ROOT, *child.split('/')) for child in children[shard])
+            skipped += 1
+            continue
+
+        size, files, subdirs = _scan_dir(directory)
+        try:
+            unchanged = os.stat(directory).st_mtime == mtime
+        except OSError:
+            unchanged = False
+        upsert(db.session.connection(), table, [{
+            'shard': shard,
+            'user_id': _shard_owner(shard),
+            'bytes': size,
+            'files': files,
+            # 统计期间目录有变化时不记录修改时间，下次校对重新统计
+            'dir_mtime': mtime if unchanged else None,
+            'reconciled_at': datetime.now()
+        }], ['shard'], lambda old, new: {
+            'bytes': new.bytes,
+            'files': new.files,
+            'dir_mtime': new.dir_mtime,
+            'reconciled_at': new.reconciled_at
+        })
+        db.session.commit()
+        pending.extend(subdirs)
+        scanned += 1
+        if pause:
+            time.sleep(pause)
+
+    # 已不存在的目录
+    removed = [shard for shard in known if shard not in seen]
+    if removed:
+        DiskUsage.query.filter(DiskUsage.shard.in_(removed)).delete(synchronize_session=False)
+        db.session.commit()
+    return {'scanned': scanned, 'skipped': skipped, 'removed': len(removed)}
+
+def _reconcile_loop(app):
+    while True:
+        time.sleep(RECONCILE_INTERVAL)
+        try:
+            with app.app_context():
+                reconcile(pause=RECONCILE_PAUSE)
+        except Exception as e:
+            logger.exception("磁盘占用校对失败: %s", e)
+
+def start_reconciler(app):
+    """按 DISK_RECONCILE_INTERVAL 启动后台校对线程"""
+    if RECONCILE_INTERVAL <= 0:
+        return None
+    thread = threading.Thread(target=_reconcile_loop, args=(app,), daemon=True)
+    thread.start()
+    return thread
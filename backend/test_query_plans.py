@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+接口查询预算（pytest 入口）
+
+与 python check_query_plans.py 相同的检查，每个接口一个用例：语句数不超过上限，
+且没有不在白名单内的全表扫描。种子数据、接口列表和上限见 check_query_plans.py。
+"""
+
+from collections import defaultdict
+import pytest
+# 必须先于 app 导入：切换到临时数据库和上传目录
+import check_query_plans as plans
+
+# 收集用例时只需要接口名称，对象 ID 在用例执行时才生成
+ENDPOINTS = plans.endpoints(defaultdict(str))
+
+@pytest.fixture(scope='module')
+def seeded():
+    client, tokens, ids = plans.prepare()
+    yield client, tokens, plans.endpoints(ids), plans.engine()
+    plans.cleanup()
+
+@pytest.mark.parametrize('index', range(len(ENDPOINTS)), ids=[endpoint[0] for endpoint in ENDPOINTS])
+def test_endpoint(seeded, query_budget, index):
+    client, tokens, endpoints, engine = seeded
+    name, method, url, body, as_admin, allowed, budget = endpoints[index]
+    with query_budget(budget, engine=engine) as statements:
+        response = plans.call(client, tokens, method, url, body, as_admin)
+    assert response.status_code < 500, f'{method} {url}: HTTP {response.status_code}'
+    scans = plans.full_scans(statements, allowed)
+    assert not scans, '\n'.join(f'{detail}: {" ".join(statement.split())}' for detail, statement in scans)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+令牌注销
+
+注销的令牌按 JTI 写入 revoked_tokens 表，保留到令牌过期。每个请求都要检查令牌
+是否已注销，为了不让每个请求都查一次表，每个工作进程在内存中维护一个布隆过滤器：
+- 过滤器中没有的 JTI 一定没有被注销，直接放行（绝大多数请求）
+- 命中过滤器时才按 JTI 精确查询一次，确认注销的 JTI 记在内存中
+- 每隔 REVOCATION_REFRESH_INTERVAL 秒按自增ID增量读取其它进程新注销的令牌
+- 每隔 REVOCATION_REBUILD_INTERVAL 秒删除已过期的记录并重建过滤器，去掉过期令牌占用的位
+
+本进程注销的令牌立即加入过滤器；其它进程最迟在下一次增量同步后拒绝该令牌。
+"""
+
+import os
+import time
+import hashlib
+import threading
+from datetime import datetime
+from sqlalchemy import delete, select
+from models import db, RevokedToken
+
+# 布隆过滤器位数和哈希函数个数（默认 128KB，10 万个令牌时误判率约 1%）
+BLOOM_BITS = int(os.getenv('REVOCATION_BLOOM_BITS', 1 << 20))
+BLOOM_HASHES = int(os.getenv('REVOCATION_BLOOM_HASHES', 7))
+# 增量同步间隔（秒）
+REFRESH_INTERVAL = float(os.getenv('REVOCATION_REFRESH_INTERVAL', 5))
+# 清理过期记录并重建过滤器的间隔（秒）
+REBUILD_INTERVAL = float(os.getenv('REVOCATION_REBUILD_INTERVAL', 3600))
+
+class BloomFilter:
+    """只支持添加和查询的布隆过滤器"""
+
+    def __init__(self, bits=BLOOM_BITS, hashes=BLOOM_HASHES):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray((bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.array[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+_lock = threading.Lock()
+_pid = None
+_bloom = BloomFilter()
+# 已确认注销的 JTI
+_revoked = set()
+# 已同步的最大记录ID
+_last_id = 0
+_refreshed_at = 0.0
+_rebuilt_at = 0.0
+
+def _rebuild():
+    global _bloom, _revoked, _last_id, _rebuilt_at
+    db.session.execute(delete(RevokedToken).where(RevokedToken.expires_at < datetime.now()))
+    db.session.commit()
+    bloom = BloomFilter()
+    last_id = 0
+    for row_id, jti in db.session.execute(select(RevokedToken.id, RevokedToken.jti)):
+        bloom.add(jti)
+        last_id = max(last_id, row_id)
+    _bloom, _revoked, _last_id = bloom, set(), last_id
+    _rebuilt_at = time.monotonic()
+
+def _refresh():
+    global _last_id
+    rows = db.session.execute(
+        select(RevokedToken.id, RevokedToken.jti).where(RevokedToken.id > _last_id).order_by(RevokedToken.id)
+    ).all()
+    for row_id, jti in rows:
+        _bloom.add(jti)
+        _last_id = row_id
+
+def sync():
+    """到期时同步过滤器（fork 后的子进程重新构建）"""
+    global _pid, _refreshed_at
+    now = time.monotonic()
+    if _pid == os.getpid() and now - _refreshed_at < REFRESH_INTERVAL:
+        return
+    with _lock:
+        if _pid == os.getpid() and now - _refreshed_at < REFRESH_INTERVAL:
+            return
+        if _pid != os.getpid() or now - _rebuilt_at >= REBUILD_INTERVAL:
+            _rebuild()
+            _pid = os.getpid()
+        else:
+            _refresh()
+        _refreshed_at = now
+
+def is_revoked(jti):
+    """检查令牌是否已注销；只有命中布隆过滤器时才查询数据库"""
+    sync()
+    if jti not in _bloom:
+        return False
+    if jti in _revoked:
+        return True
+    if db.session.execute(select(RevokedToken.id).where(RevokedToken.jti == jti)).first() is None:
+        return False
+    _revoked.add(jti)
+    return True
+
+def revoke(jti, user_id, expires_at):
+    """注销令牌（expires_at 为令牌的过期时间），调用方负责提交"""
+    if db.session.execute(select(RevokedToken.id).where(RevokedToken.jti == jti)).first() is None:
+        db.session.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+    with _lock:
+        _bloom.add(jti)
+        _revoked.add(jti)
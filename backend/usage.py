@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户存储用量物化表
+
+文件/文件夹的新增、删除和大小变化会在同一事务内累加到 user_usage 表中
+对应用户的一行。管理员统计从这张表读取：全局总量是对每个用户一行求和，
+排行榜按已建索引的列排序分页，查询代价与文件总数无关。
+每个用户单独一行，避免所有写入争抢同一行全局计数。
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import func, case
+from hooks import on_flush
+from database import upsert
+from models import db, User, File, Folder, UserUsage
+
+# 排行榜支持的排序字段
+SORT_FIELDS = {
+    'storageUsed': UserUsage.storage_used,
+    'fileCount': UserUsage.file_count,
+    'folderCount': UserUsage.folder_count,
+    'lastUploadAt': UserUsage.last_upload_at,
+}
+
+def _later(old, new):
+    """两个可能为空的时间中较晚的一个"""
+    return case(
+        (new.is_(None), old),
+        (old.is_(None), new),
+        (new > old, new),
+        else_=old
+    )
+
+def apply_usage(conn, deltas):
+    """把 {user_id: [文件数, 文件夹数, 字节数, 最近上传时间]} 累加到用量表"""
+    if not deltas:
+        return
+    rows = [{
+        'user_id': user_id,
+        'file_count': files,
+        'folder_count': folders,
+        'storage_used': size,
+        'last_upload_at': last_upload
+    } for user_id, (files, folders, size, last_upload) in deltas.items()]
+
+    upsert(conn, UserUsage.__table__, rows, ['user_id'], lambda old, new: {
+        'file_count': old.file_count + new.file_count,
+        'folder_count': old.folder_count + new.folder_count,
+        'storage_used': old.storage_used + new.storage_used,
+        'last_upload_at': _later(old.last_upload_at, new.last_upload_at)
+    })
+
+@on_flush
+def _record_usage(session, changes):
+    """根据本次 flush 的变更累加用量"""
+    deltas = defaultdict(lambda: [0, 0, 0, None])
+    for change in changes:
+        delta = deltas[change.user_id]
+        if change.kind == 'folder':
+            if change.action == 'insert':
+                delta[1] += 1
+            elif change.action == 'delete':
+                delta[1] -= 1
+            continue
+
+        size = change.data['size'] or 0
+        if change.action == 'insert':
+            delta[0] += 1
+            delta[2] += size
+            uploaded_at = change.data['uploaded_at'] or datetime.now()
+            if delta[3] is None or uploaded_at > delta[3]:
+                delta[3] = uploaded_at
+        elif change.action == 'delete':
+            delta[0] -= 1
+            delta[2] -= size
+        elif 'size' in change.changed:
+            delta[2] += size - (change.data['previous']['size'] or 0)
+
+    deltas = {user_id: delta for user_id, delta in deltas.items() if any(delta)}
+    if deltas:
+        apply_usage(session.connection(), deltas)
+
+def rebuild_usage(user_id=None):
+    """根据 files / folders 表重新计算用量，返回写入的用户数"""
+    delete = UserUsage.query
+    if user_id:
+        delete = delete.filter_by(user_id=user_id)
+    delete.delete(synchronize_session=False)
+
+    # 没有文件的用户也写入一行全零的用量，排行榜按用量表内连接
+    deltas = defaultdict(lambda: [0, 0, 0, None])
+    users = db.session.query(User.id)
+    if user_id:
+        users = users.filter(User.id == user_id)
+    for (owner,) in users:
+        deltas[owner]
+    files = db.session.query(
+        File.user_id, func.count(File.id), func.coalesce(func.sum(File.size), 0), func.max(File.uploaded_at)
+    )
+    if user_id:
+        files = files.filter(File.user_id == user_id)
+    for owner, count, size, last_upload in files.group_by(File.user_id):
+        deltas[owner][0] = count
+        deltas[owner][2] = size
+        deltas[owner][3] = last_upload
+
+    folders = db.session.query(Folder.user_id, func.count(Folder.id))
+    if user_id:
+        folders = folders.filter(Folder.user_id == user_id)
+    for owner, count in folders.group_by(Folder.user_id):
+        deltas[owner][1] = count
+
+    apply_usage(db.session.connection(), deltas)
+    db.session.commit()
+    return len(deltas)
+
+def global_totals(active_since):
+    """全局文件数、文件夹数、存储量，以及 active_since 之后有上传的用户数"""
+    row = db.session.query(
+        func.coalesce(func.sum(UserUsage.file_count), 0),
+        func.coalesce(func.sum(UserUsage.folder_count), 0),
+        func.coalesce(func.sum(UserUsage.storage_used), 0),
+        func.count(case((UserUsage.last_upload_at >= active_since, 1)))
+    ).one()
+    return {
+        'totalFiles': row[0],
+        'totalFolders': row[1],
+        'totalStorage': row[2],
+        'activeUsers': row[3]
+    }
+
+def leaderboard(sort_by='storageUsed', order='desc', page=1, per_page=50):
+    """按用量排序的用户列表，返回 (当前页数据, 用户总数)"""
+    if sort_by == 'username':
+        ordering = User.username
+    else:
+        # 每个用户都有一行用量（注册时创建），直接按已建索引的列排序
+        ordering = SORT_FIELDS.get(sort_by, UserUsage.storage_used)
+    ordering = ordering.asc() if order == 'asc' else ordering.desc()
+
+    query = db.session.query(User.id, User.username, UserUsage).join(
+        UserUsage, UserUsage.user_id == User.id
+    ).order_by(ordering, User.username)
+    # 总数与分页使用同一个连接，尚未回填用量行的用户不计入
+    total = db.session.query(func.count(User.id)).join(UserUsage, UserUsage.user_id == User.id).scalar()
+    rows = query.offset((page - 1) * per_page).limit(per_page).all()
+
+    statistics = []
+    for user_id, username, usage in rows:
+        statistics.append({
+            'userId': user_id,
+            'username': username,
+            'fileCount': usage.file_count,
+            'folderCount': usage.folder_count,
+            'storageUsed': usage.storage_used,
+            'lastUploadAt': usage.last_upload_at.isoformat() if usage.last_upload_at else None
+        })
+    return statistics, total
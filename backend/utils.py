@@ -2,11 +2,14 @@ import os
 import hashlib
 import mimetypes
 from functools import wraps
-from flask import jsonify, request
-from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask import g, jsonify, make_response, request
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
 from PIL import Image
 import io
 import base64
+import logging
+
+logger = logging.getLogger(__name__)
 
 def allowed_file(filename, allowed_extensions=None):
     """检查文件扩展名是否允许"""
@@ -97,11 +100,14 @@ def create_thumbnail(file_path, max_size=(200, 200)):
             img_str = base64.b64encode(buffer.getvalue()).decode()
             return f"data:image/jpeg;base64,{img_str}"
     except Exception as e:
-        print(f"创建缩略图失败: {e}")
+        logger.error("创建缩略图失败: %s", e)
         return None
 
 def jwt_required_with_user(f):
-    """JWT认证装饰器，同时返回用户信息，支持URL参数token"""
+    """JWT认证装饰器，同时返回用户信息，支持URL参数token
+
+    用户信息来自 identity_cache，缓存命中时不查询数据库。
+    """
     @wraps(f)
     def decorated_function(*args, **kwargs):
         try:
@@ -109,6 +115,7 @@ def jwt_required_with_user(f):
             try:
                 verify_jwt_in_request()
                 current_user_id = get_jwt_identity()
+                claims = get_jwt()
             except:
                 # 如果头部认证失败，尝试从URL参数获取token
                 from flask import request
@@ -119,24 +126,65 @@ def jwt_required_with_user(f):
                     return jsonify({'error': '认证失败'}), 401
                 
                 try:
-                    decoded_token = decode_token(token)
-                    current_user_id = decoded_token['sub']
+                    claims = decode_token(token)
+                    current_user_id = claims['sub']
                 except:
                     return jsonify({'error': '无效的token'}), 401
+                
+                import token_revocation
+                if token_revocation.is_revoked(claims['jti']):
+                    return jsonify({'error': 'Token已注销'}), 401
             
             # 导入放在函数内部避免循环导入
-            from models import User
-            current_user = User.query.get(current_user_id)
+            import identity_cache
+            current_user, error = identity_cache.resolve(current_user_id, claims)
             
             if not current_user:
-                return jsonify({'error': '用户不存在'}), 401
-                
+                return jsonify({'error': error}), 401
+            
+            # 供 asset_urls.sign 把签名链接绑定到本次请求的令牌
+            g.jwt_claims = claims
             return f(current_user, *args, **kwargs)
         except Exception as e:
             return jsonify({'error': '认证失败'}), 401
     
     return decorated_function
 
+def signed_url_or_jwt(f):
+    """资源接口装饰器：带 sig 参数时校验签名链接，否则按 jwt_required_with_user 认证
+
+    签名链接绑定到签发时的令牌：令牌已注销或版本号已过期时拒绝，通过校验时传入签发链接的用户，
+    视图仍只返回该用户自己的文件。响应可以被浏览器（不含共享缓存）缓存到链接过期为止。
+    """
+    authenticated = jwt_required_with_user(f)
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'sig' not in request.args:
+            return authenticated(*args, **kwargs)
+
+        import asset_urls
+        import identity_cache
+        import token_revocation
+        verified = asset_urls.verify(request.path, request.args)
+        if verified is None:
+            return jsonify({'error': '链接已过期或无效'}), 403
+        remaining, claims = verified
+        if token_revocation.is_revoked(claims['jti']):
+            return jsonify({'error': '链接已过期或无效'}), 403
+        current_user, error = identity_cache.resolve(claims['sub'], claims)
+        if not current_user:
+            return jsonify({'error': '链接已过期或无效'}), 403
+
+        response = make_response(f(current_user, *args, **kwargs))
+        if response.status_code == 200:
+            response.cache_control.no_cache = None
+            response.cache_control.private = True
+            response.cache_control.max_age = remaining
+        return response
+
+    return decorated_function
+
 def admin_required(f):
     """管理员权限装饰器"""
     @wraps(f)
@@ -145,8 +193,8 @@ def admin_required(f):
             verify_jwt_in_request()
             current_user_id = get_jwt_identity()
             
-            from models import User
-            current_user = User.query.get(current_user_id)
+            import identity_cache
+            current_user, error = identity_cache.resolve(current_user_id, get_jwt())
             
             if not current_user or current_user.role != 'admin':
                 return jsonify({'error': '需要管理员权限'}), 403
@@ -551,9 +551,9 @@ export function FilePreview({
 
     const fileType = getFileType(file.name)
     
-    // 对于媒体文件，我们需要使用带认证的URL
+    // 对于媒体文件，使用签名链接（或带认证的URL）
     if (['image', 'video', 'audio'].includes(fileType)) {
-      const fileUrl = fileAPI.getPreviewUrl(file.id)
+      const fileUrl = fileAPI.getPreviewUrl(file.id, file.previewUrl)
       
       if (fileType === 'image') {
         return <ImagePreview file={file} src={fileUrl} />
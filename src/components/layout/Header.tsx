@@ -20,6 +20,7 @@ import {
 } from '@/components/ui/dropdown-menu'
 import { useThemeStore, useUserStore, useNotificationStore } from '@/store'
 import { cn } from '@/lib/utils'
+import { authAPI } from '@/services/api'
 
 interface HeaderProps {
   title?: string
@@ -49,7 +50,13 @@ export function Header({ title, breadcrumbs, className }: HeaderProps) {
     }
   }
 
-  const handleLogout = () => {
+  const handleLogout = async () => {
+    try {
+      await authAPI.logout()
+    } catch (error) {
+      console.error('注销令牌失败:', error)
+    }
+    localStorage.removeItem('token')
     logout()
     window.location.href = '/login'
   }
@@ -17,7 +17,7 @@ import { Input } from '@/components/ui/input';
 import { Card, CardContent } from '@/components/ui/card';
 
 import { useNotificationStore } from '@/store';
-import { chatAPI, userAPI, friendsAPI } from '@/services/api';
+import { chatAPI, userAPI, friendsAPI, openEventStream } from '@/services/api';
 import { User as UserType } from '@/types';
 
 interface ChatMessage {
@@ -29,7 +29,7 @@ interface ChatMessage {
   fileId?: string;
   isRead: boolean;
   createdAt: string;
-  sender: UserType;
+  sender?: UserType; // 仅旧格式（?format=full）内嵌，默认的 compact 格式只有 senderId
 }
 
 function Chat() {
@@ -117,9 +117,8 @@ function Chat() {
     try {
       const response = await chatAPI.getChatMessages(friendId);
       if (response.success && response.data) {
+        // 加载聊天记录时服务端已把会话标记为已读
         setMessages(response.data.messages || []);
-        // 标记消息为已读
-        await chatAPI.markAsRead(friendId);
       }
     } catch (error: any) {
       console.error('加载聊天记录失败:', error);
@@ -193,6 +192,28 @@ function Chat() {
     initializeData();
   }, [friendId]);
 
+  // 订阅实时推送，收到与当前好友的新消息时直接追加
+  useEffect(() => {
+    if (!friendId) return;
+    const source = openEventStream();
+    if (!source) return;
+    
+    const handleMessage = (event: MessageEvent) => {
+      const message: ChatMessage = JSON.parse(event.data);
+      if (message.senderId !== friendId && message.receiverId !== friendId) return;
+      setMessages((prev) => prev.some((m) => m.id === message.id) ? prev : [message, ...prev]);
+      if (message.senderId === friendId) {
+        chatAPI.markAsRead(message.id).catch(() => {});
+      }
+    };
+    source.addEventListener('chat_message', handleMessage as EventListener);
+    
+    return () => {
+      source.removeEventListener('chat_message', handleMessage as EventListener);
+      source.close();
+    };
+  }, [friendId]);
+
   useEffect(() => {
     scrollToBottom();
   }, [messages]);
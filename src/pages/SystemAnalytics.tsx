@@ -41,8 +41,8 @@ import {
 import { PageWrapper } from '@/components/layout/Layout'
 import { cn, formatFileSize, formatDate } from '@/lib/utils'
 import { useFileStore, useFolderStore, useUserStore } from '@/store'
-import { statisticsAPI } from '@/services/api'
-import type { File } from '@/types'
+import { statisticsAPI, systemAPI } from '@/services/api'
+import type { File, SlowQuery } from '@/types'
 
 type TimeRange = '7d' | '30d' | '90d' | '1y'
 type AnalysisView = 'overview' | 'storage' | 'usage'
@@ -405,7 +405,10 @@ export function SystemAnalytics() {
   const [fileTypeData, setFileTypeData] = useState<ChartData[]>([])
   const [recentFiles, setRecentFiles] = useState<File[]>([])
   const [storageData, setStorageData] = useState<{ used: number; total: number; percentage: number } | null>(null)
+  const [slowQueries, setSlowQueries] = useState<SlowQuery[]>([])
+  const [slowQueryThreshold, setSlowQueryThreshold] = useState<number | null>(null)
   const { user } = useUserStore()
+  const isAdmin = user?.role === 'admin'
   
   // 加载数据
   const loadData = async () => {
@@ -413,17 +416,15 @@ export function SystemAnalytics() {
       setLoading(true)
       
       // 并行加载所有数据
-      const [statsRes, storageRes, fileTypesRes, uploadTrendRes, recentFilesRes] = await Promise.all([
-        statisticsAPI.getStatistics(),
-        statisticsAPI.getStorageUsage(),
-        statisticsAPI.getFileTypeDistribution(),
-        statisticsAPI.getUploadTrend(getDaysFromTimeRange(timeRange)),
+      const [dashboardRes, recentFilesRes] = await Promise.all([
+        statisticsAPI.getDashboard(getDaysFromTimeRange(timeRange)),
         statisticsAPI.getRecentFiles(10)
       ])
+      const dashboard = dashboardRes.data
       
       // 处理基本统计数据
-      if (statsRes.success) {
-        const stats = statsRes.data
+      if (dashboardRes.success) {
+        const stats = dashboard.statistics
         const generatedMetrics: MetricCard[] = [
           {
             title: '总文件数',
@@ -484,12 +485,12 @@ export function SystemAnalytics() {
       }
       
       // 处理存储数据
-      if (storageRes.success) {
-        setStorageData(storageRes.data)
+      if (dashboardRes.success) {
+        setStorageData(dashboard.storage)
       }
       
       // 处理文件类型分布
-      if (fileTypesRes.success) {
+      if (dashboardRes.success) {
         const typeColors = {
           'image': '#3b82f6',
           'document': '#10b981',
@@ -499,8 +500,8 @@ export function SystemAnalytics() {
           'other': '#6b7280'
         }
         
-        const totalFiles = fileTypesRes.data.reduce((sum, item) => sum + item.count, 0)
-        const processedFileTypes = fileTypesRes.data.map(item => ({
+        const totalFiles = dashboard.fileTypes.reduce((sum, item) => sum + item.count, 0)
+        const processedFileTypes = dashboard.fileTypes.map(item => ({
           name: getFileTypeDisplayName(item.type),
           value: item.count,
           color: typeColors[item.type as keyof typeof typeColors] || typeColors.other,
@@ -510,8 +511,8 @@ export function SystemAnalytics() {
       }
       
       // 处理上传趋势数据
-      if (uploadTrendRes.success) {
-        const processedTrendData = uploadTrendRes.data.map(item => ({
+      if (dashboardRes.success) {
+        const processedTrendData = dashboard.uploadTrend.map(item => ({
           date: item.date,
           uploads: item.count,
           downloads: 0, // 后端暂无下载统计
@@ -527,6 +528,15 @@ export function SystemAnalytics() {
         setRecentFiles(recentFilesRes.data)
       }
       
+      // 慢查询日志（仅管理员）
+      if (isAdmin) {
+        const slowQueriesRes = await systemAPI.getSlowQueries('maxDuration', 10)
+        if (slowQueriesRes.success) {
+          setSlowQueries(slowQueriesRes.data || [])
+          setSlowQueryThreshold(slowQueriesRes.thresholdMs ?? null)
+        }
+      }
+      
     } catch (error) {
       console.error('加载统计数据失败:', error)
       // 如果API调用失败，使用模拟数据作为后备
@@ -789,6 +799,65 @@ export function SystemAnalytics() {
                 </CardContent>
               </Card>
             </div>
+
+            {/* 慢查询 */}
+            {isAdmin && (
+              <Card>
+                <CardHeader>
+                  <CardTitle className="flex items-center">
+                    <Database className="h-5 w-5 mr-2" />
+                    慢查询
+                    {slowQueryThreshold !== null && (
+                      <span className="ml-2 text-sm font-normal text-muted-foreground">
+                        超过 {slowQueryThreshold} ms
+                      </span>
+                    )}
+                  </CardTitle>
+                </CardHeader>
+                <CardContent>
+                  <div className="space-y-3">
+                    {slowQueries.map((query) => (
+                      <div key={query.fingerprint} className="p-3 rounded-lg border bg-card space-y-2">
+                        <div className="flex items-center justify-between text-xs text-muted-foreground">
+                          <span>{query.method && query.route ? `${query.method} ${query.route}` : '后台任务'}</span>
+                          <span>
+                            {query.count} 次 · 平均 {query.avgDuration} ms · 最长 {query.maxDuration} ms
+                          </span>
+                        </div>
+                        <p className="text-xs font-mono break-all line-clamp-3">{query.statement}</p>
+                        {query.plan && (
+                          <div className="flex flex-wrap gap-1">
+                            {query.fullScan && (
+                              <span className="inline-flex items-center text-xs text-red-600">
+                                <AlertTriangle className="h-3 w-3 mr-1" />
+                                全表扫描
+                              </span>
+                            )}
+                            {query.plan.map((line, index) => (
+                              <span
+                                key={index}
+                                className={cn(
+                                  'text-xs font-mono px-2 py-0.5 rounded bg-muted',
+                                  line.startsWith('SCAN') && 'text-red-600'
+                                )}
+                              >
+                                {line}
+                              </span>
+                            ))}
+                          </div>
+                        )}
+                      </div>
+                    ))}
+                  </div>
+                  {slowQueries.length === 0 && (
+                    <div className="text-center py-8 text-muted-foreground">
+                      <CheckCircle className="h-12 w-12 mx-auto mb-4 opacity-50" />
+                      <p>暂无慢查询</p>
+                    </div>
+                  )}
+                </CardContent>
+              </Card>
+            )}
           </>
         )}
 
@@ -1,5 +1,5 @@
 import axios from 'axios'
-import type { ApiResponse, Folder, File, User, SearchParams, Statistics } from '@/types'
+import type { ApiResponse, Folder, File, User, SearchParams, Statistics, DashboardStatistics, SlowQuery } from '@/types'
 
 // 创建axios实例
 const api = axios.create({
@@ -100,8 +100,18 @@ export const userAPI = {
   },
   
   // 修改密码
-  changePassword: (data: { oldPassword: string; newPassword: string }): Promise<ApiResponse> => {
-    return api.put('/auth/password', data)
+  changePassword: async (data: { oldPassword: string; newPassword: string }): Promise<ApiResponse<{ token: string }>> => {
+    const response: ApiResponse<{ token: string }> = await api.put('/auth/password', data)
+    // 修改密码后旧令牌失效，改用返回的新令牌
+    if (response.success && response.data?.token) {
+      localStorage.setItem('token', response.data.token)
+    }
+    return response
+  },
+  
+  // 退出登录（注销当前令牌）
+  logout: (): Promise<ApiResponse> => {
+    return api.post('/auth/logout')
   },
   
   // 验证token
@@ -219,8 +229,11 @@ export const fileAPI = {
     })
   },
   
-  // 获取文件预览URL（带认证token）
-  getPreviewUrl: (id: string): string => {
+  // 获取文件预览URL：优先使用文件列表返回的签名链接，否则附带认证token
+  getPreviewUrl: (id: string, signedUrl?: string): string => {
+    if (signedUrl) {
+      return `${api.defaults.baseURL?.replace(/\/api$/, '')}${signedUrl}`
+    }
     const token = localStorage.getItem('token')
     const baseUrl = `${api.defaults.baseURL}/files/${id}/preview`
     return token ? `${baseUrl}?token=${encodeURIComponent(token)}` : baseUrl
@@ -238,6 +251,26 @@ export const fileAPI = {
   searchFiles: (params: SearchParams): Promise<ApiResponse<{ files: File[]; total: number }>> => {
     return api.get('/files/search', { params })
   },
+  
+  // 文件/文件夹名称输入联想
+  suggestNames: (query: string, limit: number = 10): Promise<ApiResponse<{ id: string; kind: 'file' | 'folder'; name: string; parentId?: string; score: number }[]>> => {
+    return api.get('/files/suggest', { params: { query, limit } })
+  },
+  
+  // 获取标签云
+  getTagCloud: (limit?: number): Promise<ApiResponse<{ name: string; count: number }[]>> => {
+    return api.get('/files/tags', { params: limit ? { limit } : {} })
+  },
+  
+  // 设置文件标签
+  updateFileTags: (id: string, tags: string[]): Promise<ApiResponse<File>> => {
+    return api.put(`/files/${id}/tags`, { tags })
+  },
+  
+  // 批量添加/移除标签
+  batchUpdateTags: (ids: string[], changes: { add?: string[]; remove?: string[] }): Promise<ApiResponse<{ added: number; removed: number }>> => {
+    return api.put('/files/batch/tags', { ids, ...changes })
+  },
 }
 
 // 统计相关API
@@ -273,8 +306,8 @@ export const statisticsAPI = {
   },
   
   // 获取文件夹统计
-  getFolderStats: (): Promise<ApiResponse<{ id: string; name: string; isParent: boolean; fileCount: number; totalSize: number; parentId?: string }[]>> => {
-    return api.get('/statistics/folder-stats')
+  getFolderStats: (params?: { sortBy?: 'size' | 'fileCount'; top?: number; page?: number; per_page?: number }): Promise<ApiResponse<{ id: string; name: string; isParent: boolean; fileCount: number; totalSize: number; recursiveFileCount: number; recursiveSize: number; parentId?: string }[]>> => {
+    return api.get('/statistics/folder-stats', { params })
   },
   
   // 获取活动统计
@@ -286,6 +319,11 @@ export const statisticsAPI = {
   getSummary: (): Promise<ApiResponse<{ totalFiles: number; totalFolders: number; totalSize: number; averageFileSize: number; largestFile?: File; latestFile?: File }>> => {
     return api.get('/statistics/summary')
   },
+  
+  // 一次获取统计页面的全部面板
+  getDashboard: (days: number = 30): Promise<ApiResponse<DashboardStatistics>> => {
+    return api.get('/statistics/dashboard', { params: { days } })
+  },
 }
 
 // 系统相关API
@@ -301,8 +339,8 @@ export const systemAPI = {
   },
 
   // 获取系统统计（管理员）
-  getSystemStats: (): Promise<ApiResponse<any>> => {
-    return api.get('/system/stats')
+  getSystemStats: (params?: { sortBy?: 'storageUsed' | 'fileCount' | 'folderCount' | 'lastUploadAt' | 'username'; order?: 'asc' | 'desc'; page?: number; per_page?: number }): Promise<ApiResponse<any>> => {
+    return api.get('/system/stats', { params })
   },
 
   // 获取性能统计
@@ -310,6 +348,11 @@ export const systemAPI = {
     return api.get('/system/performance')
   },
 
+  // 获取性能采样历史
+  getPerformanceHistory: (window: number = 3600, step: number = 1): Promise<ApiResponse<{ interval: number; samples: { timestamp: string; cpu: number; memory: number; disk: number; networkSent: number; networkRecv: number; processMemory: number; processCpu: number }[] }>> => {
+    return api.get('/system/performance/history', { params: { window, step } })
+  },
+
   // 获取系统配置
   getSystemConfig: (): Promise<ApiResponse<any>> => {
     return api.get('/system/config')
@@ -321,8 +364,18 @@ export const systemAPI = {
   },
 
   // 创建备份
-  createBackup: (): Promise<ApiResponse<any>> => {
-    return api.post('/system/backup')
+  createBackup: (target: 'dir' | 'tar' = 'dir'): Promise<ApiResponse<any>> => {
+    return api.post('/system/backup', { target })
+  },
+
+  // 列出备份还原点
+  listBackups: (): Promise<ApiResponse<{ name: string; createdAt: string; files: number; size: number; databaseSize: number; archive: string | null }[]>> => {
+    return api.get('/system/backups')
+  },
+
+  // 查询后台任务进度
+  getJob: (jobId: string): Promise<ApiResponse<any>> => {
+    return api.get(`/system/jobs/${jobId}`)
   },
 
   // 系统清理
@@ -330,9 +383,19 @@ export const systemAPI = {
     return api.post('/system/cleanup', { type })
   },
 
+  // 获取 SQL 统计（查询最多的接口）
+  getSqlStats: (sortBy: 'queries' | 'avgQueries' | 'dbTime' | 'nPlusOne' = 'queries', limit: number = 20): Promise<ApiResponse<any[]>> => {
+    return api.get('/system/sql-stats', { params: { sortBy, limit } })
+  },
+
+  // 获取慢查询日志
+  getSlowQueries: (sortBy: 'maxDuration' | 'totalDuration' | 'count' | 'lastSeen' = 'maxDuration', limit: number = 50): Promise<ApiResponse<SlowQuery[]> & { thresholdMs?: number }> => {
+    return api.get('/system/slow-queries', { params: { sortBy, limit } })
+  },
+
   // 获取系统日志
-  getSystemLogs: (): Promise<ApiResponse<any[]>> => {
-    return api.get('/system/logs')
+  getSystemLogs: (params?: { level?: string; module?: string; start?: string; end?: string; before?: number; limit?: number }): Promise<ApiResponse<any[]> & { nextCursor?: number | null }> => {
+    return api.get('/system/logs', { params })
   },
 }
 
@@ -431,11 +494,13 @@ export const chatAPI = {
     return api.get('/chat/sessions')
   },
 
-  // 获取聊天记录
-  getChatMessages: (friendId: string, page?: number, limit?: number): Promise<ApiResponse<any>> => {
+  // 获取聊天记录：before 加载更早的消息，after 拉取新消息（游标为消息ID，取自上次返回的 pagination）
+  getChatMessages: (friendId: string, page?: number, limit?: number, cursor?: { before?: string; after?: string }): Promise<ApiResponse<any>> => {
     const params = new URLSearchParams()
     if (page) params.append('page', page.toString())
     if (limit) params.append('limit', limit.toString())
+    if (cursor?.before) params.append('before', cursor.before)
+    if (cursor?.after) params.append('after', cursor.after)
     return api.get(`/chat/messages/${friendId}?${params.toString()}`)
   },
 
@@ -448,9 +513,17 @@ export const chatAPI = {
     })
   },
 
-  // 标记消息为已读
-  markAsRead: (friendId: string): Promise<ApiResponse> => {
-    return api.post(`/chat/read/${friendId}`)
+  // 标记消息为已读：已读水位推进到该消息（打开会话时 getChatMessages 已推进到最新消息）
+  markAsRead: (messageId: string): Promise<ApiResponse> => {
+    return api.post(`/chat/messages/${messageId}/read`)
+  },
+
+  // 搜索聊天记录：friendId 限定会话，cursor 为上一页返回的 nextCursor
+  searchMessages: (query: string, friendId?: string, cursor?: string): Promise<ApiResponse<any>> => {
+    const params = new URLSearchParams({ q: query })
+    if (friendId) params.append('friendId', friendId)
+    if (cursor) params.append('cursor', cursor)
+    return api.get(`/chat/search?${params.toString()}`)
   },
 
   // 获取未读消息数
@@ -459,6 +532,13 @@ export const chatAPI = {
   },
 }
 
+// 实时推送：返回 EventSource，事件类型有 chat_message / friend_request / friend_request_accepted / friend_share
+export const openEventStream = (): EventSource | null => {
+  const token = localStorage.getItem('token')
+  if (!token) return null
+  return new EventSource(`${api.defaults.baseURL}/events/stream?token=${encodeURIComponent(token)}`)
+}
+
 // 好友文件分享API
 export const friendShareAPI = {
   // 发送文件分享
@@ -21,6 +21,7 @@ export interface File {
   uploadedAt: string
   updatedAt: string
   url: string
+  previewUrl?: string
   thumbnailUrl?: string
   tags: string[]
 }
@@ -75,6 +76,9 @@ export interface SearchParams {
   sortOrder?: 'asc' | 'desc'
   dateRange?: string
   sizeRange?: string
+  tags?: string
+  tagMode?: 'all' | 'any'
+  fuzzy?: boolean
   page?: number
   limit?: number
 }
@@ -120,6 +124,17 @@ export interface Statistics {
   storageLimit: number
 }
 
+// 统计页面全部面板
+export interface DashboardStatistics {
+  statistics: Statistics
+  storage: { used: number; total: number; percentage: number }
+  fileTypes: { type: string; count: number; size: number }[]
+  uploadTrend: { date: string; count: number; size: number }[]
+  popularTypes: { type: string; count: number }[]
+  activity: { uploads: number; foldersCreated: number; hourlyActivity: { hour: number; uploads: number }[] }
+  summary: { totalFiles: number; totalFolders: number; totalSize: number; averageFileSize: number; largestFile?: File; latestFile?: File }
+}
+
 // 文件分享类型
 export interface FileShare {
   id: string
@@ -140,4 +155,20 @@ export interface SystemSettings {
   enableFileSharing: boolean
   enableFileVersioning: boolean
   autoDeleteExpiredShares: boolean
-}
\ No newline at end of file
+}
+
+// 慢查询日志
+export interface SlowQuery {
+  fingerprint: string
+  statement: string
+  paramShape: string[] | Record<string, string>
+  method: string | null
+  route: string | null
+  count: number
+  avgDuration: number
+  maxDuration: number
+  plan: string[] | null
+  fullScan: boolean
+  firstSeen: string
+  lastSeen: string
+}